@@ -0,0 +1,175 @@
+import asyncio
+import time
+import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import logging
+
+from model import StudentScorePredictorAPI
+
+logger = logging.getLogger(__name__)
+
+class PredictionBatcher:
+    """Coalesces concurrent single-student predictions into batched forward passes
+
+    Requests are queued and dispatched as one batch when either max_batch_size
+    requests are waiting or the oldest one has waited max_delay_ms. Batches run
+    on a single worker thread and are not awaited by the collector, so the
+    next batch is collected while the current one is scored; at most one
+    batch is scored at a time. Each request gets its own result or error.
+    """
+
+    def __init__(self, api: StudentScorePredictorAPI, max_batch_size: int = 64,
+                 max_delay_ms: float = 2.0, metrics_window: int = 10000):
+        self.api = api
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._scoring: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Futures taken off the queue whose result has not been set yet
+        self._unresolved = set()
+        self.batch_sizes = deque(maxlen=metrics_window)
+        self.queue_delays_ms = deque(maxlen=metrics_window)
+        self.batches_dispatched = 0
+        self.requests_served = 0
+
+    async def start(self):
+        """Start the background dispatch loop on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._executor = ThreadPoolExecutor(max_workers=1)
+            self._task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self):
+        """Stop dispatching; the batch being scored finishes, every other pending request is failed"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._scoring is not None:
+            await self._scoring
+            self._scoring = None
+        while self._queue is not None and not self._queue.empty():
+            self._unresolved.add(self._queue.get_nowait()[2])
+        for future in self._unresolved:
+            if not future.done():
+                future.set_result({"error": "Batcher stopped"})
+        self._unresolved.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def predict(self, student_id: str, previous_grades: Dict) -> Dict:
+        """Queue one prediction and wait for its batched result"""
+        if self._task is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((student_id, previous_grades, future, time.perf_counter()))
+        return await future
+
+    async def _dispatch_loop(self):
+        while True:
+            batch = await self._collect_batch()
+            # Keep one batch in flight: the previous one must finish before this one runs.
+            # Shielded, so stopping the loop here never cancels a batch that is being scored
+            if self._scoring is not None:
+                await asyncio.shield(self._scoring)
+            self._scoring = asyncio.create_task(self._score(batch))
+
+    async def _dequeue(self, timeout: Optional[float] = None):
+        item = await (asyncio.wait_for(self._queue.get(), timeout) if timeout is not None
+                      else self._queue.get())
+        self._unresolved.add(item[2])
+        return item
+
+    async def _collect_batch(self) -> List:
+        batch = [await self._dequeue()]
+        deadline = batch[0][3] + self.max_delay
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued before waiting on the clock
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+                self._unresolved.add(item[2])
+                batch.append(item)
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await self._dequeue(remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _score(self, batch: List):
+        dispatched_at = time.perf_counter()
+        self.batch_sizes.append(len(batch))
+        self.queue_delays_ms.extend((dispatched_at - item[3]) * 1000 for item in batch)
+        self.batches_dispatched += 1
+
+        # predict_student_scores isolates per-request failures itself
+        requests = [(student_id, grades) for student_id, grades, _, _ in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.api.predict_student_scores, requests)
+        except Exception as e:
+            logger.error(f"Error in batched prediction: {e}")
+            results = [{"error": str(e)} for _ in batch]
+
+        for (_, _, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+            self._unresolved.discard(future)
+        self.requests_served += len(batch)
+
+    def get_metrics(self) -> Dict:
+        """Batch size and queueing delay statistics over the recent window"""
+        if not self.batch_sizes:
+            return {"batches_dispatched": 0, "requests_served": 0}
+
+        sizes = np.array(self.batch_sizes)
+        delays = np.array(self.queue_delays_ms)
+        return {
+            "batches_dispatched": self.batches_dispatched,
+            "requests_served": self.requests_served,
+            "mean_batch_size": float(sizes.mean()),
+            "max_batch_size": int(sizes.max()),
+            "mean_queue_delay_ms": float(delays.mean()),
+            "p50_queue_delay_ms": float(np.percentile(delays, 50)),
+            "p99_queue_delay_ms": float(np.percentile(delays, 99)),
+            "max_delay_ms": self.max_delay * 1000,
+            "max_batch_size_limit": self.max_batch_size
+        }
+
+async def _demo(model_path: str, requests: List[Dict], max_batch_size: int, max_delay_ms: float):
+    api = StudentScorePredictorAPI(model_path)
+    batcher = PredictionBatcher(api, max_batch_size, max_delay_ms)
+    await batcher.start()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        batcher.predict(r["student_id"], r["previous_grades"]) for r in requests))
+    elapsed = time.perf_counter() - start
+    await batcher.stop()
+    return results, elapsed, batcher.get_metrics()
+
+if __name__ == "__main__":
+    import argparse, json, os
+
+    parser = argparse.ArgumentParser(description="Fire concurrent predictions through the batcher")
+    parser.add_argument("--model", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "student_predictor.pkl"))
+    parser.add_argument("--input", required=True, help="JSON list of {student_id, previous_grades}")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    results, elapsed, metrics = asyncio.run(
+        _demo(args.model, json.loads(args.input), args.max_batch_size, args.max_delay_ms))
+    print(json.dumps({"results": results, "elapsed_ms": elapsed * 1000, "metrics": metrics}))
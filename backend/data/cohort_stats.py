@@ -0,0 +1,312 @@
+import os
+import json
+import math
+import numpy as np
+from typing import Dict, List, Optional
+import logging
+
+from grade_validation import column_scales, normalize_score
+
+logger = logging.getLogger(__name__)
+
+class RunningSummary:
+    """Count, mean and variance (Welford) that also supports removing a value"""
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value: float):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        old_mean = self.mean
+        self.count -= 1
+        self.mean = (old_mean * (self.count + 1) - value) / self.count
+        self.m2 = max(self.m2 - (value - old_mean) * (value - self.mean), 0.0)
+
+    def merge(self, other: "RunningSummary"):
+        """Chan et al. parallel combination"""
+        total = self.count + other.count
+        if total == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+class QuantileSketch:
+    """Fixed-bin histogram over normalized scores [0, 1]
+
+    Adding, removing and merging are O(1) / O(bins); quantiles are
+    interpolated within a bin, so their error is at most 1 / bins.
+    Values outside [0, 1] land in the edge bins.
+    """
+
+    def __init__(self, bins: int = 100, counts: Optional[List[int]] = None):
+        self.bins = bins
+        self.counts = np.array(counts if counts is not None else np.zeros(bins), dtype=np.int64)
+
+    def _bin(self, value: float) -> int:
+        return min(max(int(value * self.bins), 0), self.bins - 1)
+
+    def add(self, value: float):
+        self.counts[self._bin(value)] += 1
+
+    def remove(self, value: float):
+        self.counts[self._bin(value)] -= 1
+
+    def merge(self, other: "QuantileSketch"):
+        if other.bins != self.bins:
+            raise ValueError("Sketches with different bin counts cannot be merged")
+        self.counts += other.counts
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.counts.sum()
+        if total == 0:
+            return None
+        cumulative = np.cumsum(self.counts)
+        rank = q * total
+        b = int(np.searchsorted(cumulative, rank, side='left'))
+        b = min(b, self.bins - 1)
+        below = cumulative[b] - self.counts[b]
+        fraction = (rank - below) / self.counts[b] if self.counts[b] else 0.0
+        return round(float((b + min(max(fraction, 0.0), 1.0)) / self.bins), 6)
+
+class _Aggregate:
+    def __init__(self, bins: int):
+        self.summary = RunningSummary()
+        self.sketch = QuantileSketch(bins)
+
+    def add(self, value: float):
+        self.summary.add(value)
+        self.sketch.add(value)
+
+    def remove(self, value: float):
+        self.summary.remove(value)
+        self.sketch.remove(value)
+
+    def report(self, quantiles: List[float]) -> Dict:
+        return {
+            "count": self.summary.count,
+            "mean": round(self.summary.mean, 6),
+            "std": round(self.summary.std, 6),
+            "quantiles": {str(q): self.sketch.quantile(q) for q in quantiles}
+        }
+
+class CohortStatistics:
+    """Incrementally maintained grade statistics per assessment, type and course
+
+    Every grade change touches a fixed number of aggregates: its assessment,
+    the assessment type, the course, and the student's weighted final grade
+    overall and within the course (weighted as in preprocess.py). Grades may
+    be raw marks or normalized scores; each assessment's scale is detected
+    as in grade_validation, from scales or from the grades passed to
+    load_grades.
+    """
+
+    SCOPES = ("assessment", "type", "course", "final_grade", "course_final_grade")
+
+    def __init__(self, assessments: List[Dict], default_course: str = "all",
+                 bins: int = 100, quantiles: List[float] = [0.1, 0.25, 0.5, 0.75, 0.9],
+                 scales: Optional[Dict[str, bool]] = None):
+        self.bins = bins
+        self.quantiles = list(quantiles)
+        self.assessment_list = list(assessments)
+        self.scales = dict(scales or {})  # assessment _id -> recorded in raw marks
+        self.assessments = {}
+        self._keys = {}
+        for assessment in assessments:
+            column = f"{assessment['type']}_{assessment['_id'][:5]}"
+            self.assessments[column] = {
+                "type": assessment["type"],
+                "weight": float(assessment.get("weightage", 0)) / 100.0,
+                "total": float(assessment["totalMarks"]),
+                "id": assessment["_id"],
+                "course": assessment.get("course_id") or assessment.get("course") or default_course
+            }
+            self._keys[assessment["_id"]] = column
+            self._keys[column] = column
+
+        self.course_weights = {}
+        for info in self.assessments.values():
+            self.course_weights[info["course"]] = self.course_weights.get(info["course"], 0.0) + info["weight"]
+        self.total_weight = sum(self.course_weights.values())
+
+        self.aggregates = {scope: {} for scope in self.SCOPES}
+        self.grades = {}  # student_id -> {assessment column: normalized score}
+        self.earned = {}  # (student_id, course) -> sum of weight * score
+        self.overall_earned = {}  # student_id -> sum of weight * score over all courses
+        self.course_counts = {}  # (student_id, course) -> number of grades
+
+    @classmethod
+    def from_files(cls, data_dir: str, **kwargs) -> "CohortStatistics":
+        """Build from assessments.json and load every grade in assessmentGrades.json"""
+        with open(os.path.join(data_dir, 'assessments.json')) as f:
+            assessments = json.load(f)
+        with open(os.path.join(data_dir, 'courses.json')) as f:
+            courses = json.load(f)
+        # Assessments carry no course link yet; with a single course it is unambiguous
+        if len(courses) == 1:
+            kwargs.setdefault("default_course", courses[0]["_id"])
+        stats = cls(assessments, **kwargs)
+        with open(os.path.join(data_dir, 'assessmentGrades.json')) as f:
+            stats.load_grades(json.load(f))
+        return stats
+
+    def _aggregate(self, scope: str, key: str) -> _Aggregate:
+        aggregates = self.aggregates[scope]
+        if key not in aggregates:
+            aggregates[key] = _Aggregate(self.bins)
+        return aggregates[key]
+
+    def _normalize(self, column: str, score: float) -> float:
+        info = self.assessments[column]
+        return normalize_score(float(score), info["total"], self.scales.get(info["id"], True))
+
+    def _final_grades(self, student_id: str, course: str):
+        earned = self.earned.get((student_id, course), 0.0)
+        overall = self.overall_earned.get(student_id, 0.0)
+        return (overall / self.total_weight if self.total_weight else 0.0,
+                earned / self.course_weights[course] if self.course_weights[course] else 0.0)
+
+    def _apply(self, student_id: str, column: str, old: Optional[float], new: Optional[float]):
+        info = self.assessments[column]
+        course = info["course"]
+        student_course = (student_id, course)
+        grade_count = len(self.grades.get(student_id, {}))
+        course_count = self.course_counts.get(student_course, 0)
+        count_change = (new is not None) - (old is not None)
+
+        for scope, key in (("assessment", column), ("type", info["type"]), ("course", course)):
+            aggregate = self._aggregate(scope, key)
+            if old is not None:
+                aggregate.remove(old)
+            if new is not None:
+                aggregate.add(new)
+
+        # Swap the student's final grades: remove the old values, add the updated ones.
+        # A student (or student and course) without grades left has no final grade at all
+        overall, course_grade = self._final_grades(student_id, course)
+        if grade_count:
+            self._aggregate("final_grade", "all").remove(overall)
+        if course_count:
+            self._aggregate("course_final_grade", course).remove(course_grade)
+        delta = info["weight"] * ((new or 0.0) - (old or 0.0))
+        self.earned[student_course] = self.earned.get(student_course, 0.0) + delta
+        self.overall_earned[student_id] = self.overall_earned.get(student_id, 0.0) + delta
+        self.course_counts[student_course] = course_count + count_change
+        overall, course_grade = self._final_grades(student_id, course)
+        if grade_count + count_change:
+            self._aggregate("final_grade", "all").add(overall)
+        else:
+            del self.overall_earned[student_id]
+        if self.course_counts[student_course]:
+            self._aggregate("course_final_grade", course).add(course_grade)
+        else:
+            del self.earned[student_course], self.course_counts[student_course]
+
+    def record_grade(self, student_id: str, assessment: str, score: float) -> bool:
+        """Insert or change one grade in O(1); returns False for unknown assessments"""
+        column = self._keys.get(assessment)
+        if column is None:
+            logger.warning(f"Unknown assessment {assessment}, grade ignored")
+            return False
+        new = self._normalize(column, score)
+        old = self.grades.get(student_id, {}).get(column)
+        self._apply(student_id, column, old, new)
+        self.grades.setdefault(student_id, {})[column] = new
+        return True
+
+    def remove_grade(self, student_id: str, assessment: str) -> bool:
+        column = self._keys.get(assessment)
+        old = self.grades.get(student_id, {}).get(column)
+        if old is None:
+            return False
+        self._apply(student_id, column, old, None)
+        del self.grades[student_id][column]
+        if not self.grades[student_id]:
+            del self.grades[student_id]
+        return True
+
+    def load_grades(self, grades: Dict[str, Dict]):
+        """Record a batch of grades; assessments without a known scale take this batch's majority"""
+        self.scales = {**column_scales(grades, self.assessment_list), **self.scales}
+        for student_id, student_grades in grades.items():
+            for assessment, score in student_grades.items():
+                self.record_grade(student_id, assessment, score)
+
+    def summary(self, scope: str, key: str = "all") -> Optional[Dict]:
+        """Constant-time summary for one assessment column, type, course or final grade"""
+        aggregate = self.aggregates[scope].get(key)
+        return aggregate.report(self.quantiles) if aggregate is not None else None
+
+    def summaries(self, scope: str) -> Dict[str, Dict]:
+        return {key: aggregate.report(self.quantiles) for key, aggregate in self.aggregates[scope].items()}
+
+    def save(self, path: str):
+        state = {
+            "bins": self.bins,
+            "aggregates": {
+                scope: {key: {"count": a.summary.count, "mean": a.summary.mean, "m2": a.summary.m2,
+                              "histogram": a.sketch.counts.tolist()}
+                        for key, a in aggregates.items()}
+                for scope, aggregates in self.aggregates.items()
+            },
+            "grades": self.grades,
+            "scales": self.scales
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> "CohortStatistics":
+        """Restore saved aggregates and grades without replaying them"""
+        with open(path) as f:
+            state = json.load(f)
+        if state["bins"] != self.bins:
+            raise ValueError(f"Saved statistics use {state['bins']} bins, not {self.bins}")
+        self.aggregates = {scope: {} for scope in self.SCOPES}
+        for scope, aggregates in state["aggregates"].items():
+            for key, saved in aggregates.items():
+                aggregate = _Aggregate(self.bins)
+                aggregate.summary = RunningSummary(saved["count"], saved["mean"], saved["m2"])
+                aggregate.sketch = QuantileSketch(self.bins, saved["histogram"])
+                self.aggregates[scope][key] = aggregate
+        self.grades = state["grades"]
+        self.scales = {**state.get("scales", {}), **self.scales}
+        self.earned = {}
+        self.overall_earned = {}
+        self.course_counts = {}
+        for student_id, student_grades in self.grades.items():
+            for column, score in student_grades.items():
+                key = (student_id, self.assessments[column]["course"])
+                weighted = self.assessments[column]["weight"] * score
+                self.earned[key] = self.earned.get(key, 0.0) + weighted
+                self.course_counts[key] = self.course_counts.get(key, 0) + 1
+                self.overall_earned[student_id] = self.overall_earned.get(student_id, 0.0) + weighted
+        return self
+
+if __name__ == "__main__":
+    import argparse
+
+    DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Build and print cohort grade statistics")
+    parser.add_argument("--output", default=os.path.join(DATA_DIR, "cohort_stats.json"))
+    args = parser.parse_args()
+
+    stats = CohortStatistics.from_files(DATA_DIR)
+    stats.save(args.output)
+    print(json.dumps({scope: stats.summaries(scope) for scope in CohortStatistics.SCOPES}, indent=2))
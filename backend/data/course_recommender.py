@@ -0,0 +1,462 @@
+import os
+import io
+import json
+import time
+import pickle
+import hashlib
+import zipfile
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+from typing import Dict, List, Optional
+import logging
+
+from grade_validation import column_scales, normalize_grades
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_DIR = os.path.join(DATA_DIR, "..", "..", "__scrapdata", "datasets")
+CATALOG_PATHS = [os.path.join(CATALOG_DIR, "courses_dataset_udemy_3.7k.zip"),
+                 os.path.join(CATALOG_DIR, "courses_dataset_coursera_3.5k.zip")]
+INDEX_FILE = "course_index.pkl"
+
+LEVELS = ["beginner", "intermediate", "advanced", "all"]
+LEVEL_MAP = {
+    "beginner level": "beginner", "beginner": "beginner",
+    "intermediate level": "intermediate", "intermediate": "intermediate", "conversant": "intermediate",
+    "expert level": "advanced", "advanced": "advanced",
+    "all levels": "all", "not calibrated": "all"
+}
+# Study material that fits a weakness in each assessment type, added to the course topic
+TYPE_QUERIES = {
+    "Quiz": "practice exercises problems fundamentals",
+    "Assignment": "hands-on projects practical applications",
+    "Exam": "complete course comprehensive review",
+    "Miscellaneous": "introduction basics"
+}
+
+def _read_csv(path: str) -> pd.DataFrame:
+    """A catalog CSV, or the single CSV inside a scraped dataset zip"""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            name = next(n for n in archive.namelist() if n.endswith(".csv"))
+            return pd.read_csv(io.BytesIO(archive.read(name)), encoding_errors="replace")
+    return pd.read_csv(path, encoding_errors="replace")
+
+def _slug(value) -> str:
+    return "-".join(str(value).lower().split()) if isinstance(value, str) else ""
+
+def load_catalogs(paths: List[str] = CATALOG_PATHS) -> pd.DataFrame:
+    """Udemy and Coursera catalogs in one schema: key, provider, title, url, level, subject, text, rating"""
+    frames = []
+    for path in paths:
+        df = _read_csv(path)
+        if "course_id" in df.columns:
+            frames.append(pd.DataFrame({
+                "key": "udemy:" + df["course_id"].astype(str),
+                "provider": "udemy",
+                "title": df["course_title"],
+                "url": df["url"],
+                "level": df["level"],
+                "subject": df["subject"].map(_slug),
+                "text": df["course_title"].fillna("") + " " + df["subject"].fillna(""),
+                "rating": np.nan
+            }))
+        elif "Course URL" in df.columns:
+            skills = df["Skills"].fillna("")
+            frames.append(pd.DataFrame({
+                "key": "coursera:" + df["Course URL"].str.rstrip("/").str.rsplit("/", n=1).str[-1],
+                "provider": "coursera",
+                "title": df["Course Name"],
+                "url": df["Course URL"],
+                "level": df["Difficulty Level"],
+                # Skills end with the Coursera category slug, e.g. "data-analysis"
+                "subject": skills.str.split().str[-1].fillna(""),
+                "text": (df["Course Name"].fillna("") + " " + df["Course Description"].fillna("") +
+                         " " + skills),
+                "rating": pd.to_numeric(df["Course Rating"], errors="coerce")
+            }))
+        else:
+            raise ValueError(f"Unrecognized course catalog: {path}")
+
+    catalog = pd.concat(frames, ignore_index=True)
+    catalog["level"] = catalog["level"].str.lower().map(LEVEL_MAP).fillna("all")
+    return catalog.drop_duplicates("key", keep="last").reset_index(drop=True)
+
+def _fingerprints(catalog: pd.DataFrame) -> np.ndarray:
+    content = catalog["text"] + "\x1f" + catalog["level"] + "\x1f" + catalog["subject"]
+    return np.array([hashlib.md5(value.encode()).hexdigest() for value in content], dtype=object)
+
+def _source_fingerprint(paths: List[str]) -> List:
+    return [(os.path.basename(p), os.path.getsize(p), int(os.path.getmtime(p))) for p in paths]
+
+class CourseRecommender:
+    """Content-based course index with a precomputed top-k neighbour table
+
+    Each course is a row of TF-IDF text features, a subject one-hot and a
+    level one-hot, each block L2-normalized and weighted, then the row
+    normalized, so a dot product is a cosine similarity. similar() is a
+    lookup in the neighbour table; search() and recommend() score one
+    sparse query against the matrix.
+
+    update() applies catalog changes in place: changed and new rows are
+    re-encoded with the fitted vocabulary, their neighbour lists are
+    recomputed, and every other list is merged with scores against the
+    changed rows only. Once changes since the last build exceed
+    rebuild_fraction of the catalog, the vocabulary is refitted instead.
+    """
+
+    def __init__(self, k: int = 10, max_features: int = 20000, text_weight: float = 1.0,
+                 subject_weight: float = 0.35, level_weight: float = 0.25,
+                 rebuild_fraction: float = 0.1, chunk_rows: int = 512):
+        self.k = k
+        self.max_features = max_features
+        self.text_weight = text_weight
+        self.subject_weight = subject_weight
+        self.level_weight = level_weight
+        self.rebuild_fraction = rebuild_fraction
+        self.chunk_rows = chunk_rows
+        self.source = None
+
+    def build(self, catalog: pd.DataFrame) -> "CourseRecommender":
+        """Fit the vocabulary, encode every course and precompute the neighbour table"""
+        start = time.perf_counter()
+        self.catalog = catalog.reset_index(drop=True).copy()
+        self.vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True, min_df=2,
+                                          max_features=self.max_features, dtype=np.float32)
+        self.vectorizer.fit(self.catalog["text"])
+        self.subjects = {s: i for i, s in enumerate(sorted(set(self.catalog["subject"]) - {""}))}
+        self.matrix = self._encode(self.catalog)
+        self.active = np.ones(len(self.catalog), dtype=bool)
+        self.fingerprints = _fingerprints(self.catalog)
+        self.positions = {key: i for i, key in enumerate(self.catalog["key"])}
+        self.changes_since_build = 0
+
+        self.neighbours = np.full((len(self.catalog), self.k), -1, dtype=np.int32)
+        self.scores = np.full((len(self.catalog), self.k), -np.inf, dtype=np.float32)
+        self._recompute(np.arange(len(self.catalog)))
+        logger.info(f"Built course index over {len(self.catalog)} courses, "
+                    f"{self.matrix.shape[1]} features in {time.perf_counter() - start:.2f}s")
+        return self
+
+    def _encode(self, courses: pd.DataFrame) -> sp.csr_matrix:
+        n = len(courses)
+        text = normalize(self.vectorizer.transform(courses["text"])) * self.text_weight
+        subject_cols = np.array([self.subjects.get(s, -1) for s in courses["subject"]])
+        has_subject = subject_cols >= 0
+        subjects = sp.csr_matrix((np.full(has_subject.sum(), self.subject_weight, dtype=np.float32),
+                                  (np.flatnonzero(has_subject), subject_cols[has_subject])),
+                                 shape=(n, len(self.subjects)))
+        level_cols = np.array([LEVELS.index(level) for level in courses["level"]])
+        levels = sp.csr_matrix((np.full(n, self.level_weight, dtype=np.float32),
+                                (np.arange(n), level_cols)), shape=(n, len(LEVELS)))
+        return normalize(sp.hstack([text, subjects, levels], format="csr")).astype(np.float32)
+
+    def _top_k(self, similarity: np.ndarray, rows: np.ndarray, columns: np.ndarray):
+        """Top-k columns per row of a dense similarity block, best first"""
+        k = min(self.k, similarity.shape[1])
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarity, top, 1)
+        order = np.argsort(-top_scores, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, 1)
+        top_columns = np.where(np.isfinite(top_scores), columns[np.take_along_axis(top, order, 1)], -1)
+        self.neighbours[rows] = -1
+        self.scores[rows] = -np.inf
+        self.neighbours[rows, :k] = top_columns
+        self.scores[rows, :k] = top_scores
+
+    def _recompute(self, rows: np.ndarray):
+        """Full neighbour lists for rows, in chunks against the whole matrix"""
+        all_columns = np.arange(self.matrix.shape[0])
+        for start in range(0, len(rows), self.chunk_rows):
+            chunk = rows[start:start + self.chunk_rows]
+            similarity = (self.matrix[chunk] @ self.matrix.T).toarray()
+            similarity[:, ~self.active] = -np.inf
+            similarity[np.arange(len(chunk)), chunk] = -np.inf
+            self._top_k(similarity, chunk, all_columns)
+
+    def _merge(self, rows: np.ndarray, candidates: np.ndarray):
+        """Fold scores against candidate rows into the existing neighbour lists of rows"""
+        for start in range(0, len(rows), self.chunk_rows):
+            chunk = rows[start:start + self.chunk_rows]
+            similarity = (self.matrix[chunk] @ self.matrix[candidates].T).toarray()
+            similarity[chunk[:, None] == candidates[None, :]] = -np.inf
+            combined = np.hstack([self.scores[chunk], similarity])
+            columns = np.hstack([self.neighbours[chunk], np.broadcast_to(candidates, similarity.shape)])
+            k = min(self.k, combined.shape[1])
+            top = np.argsort(-combined, axis=1)[:, :k]
+            top_scores = np.take_along_axis(combined, top, 1)
+            self.scores[chunk, :k] = top_scores
+            self.neighbours[chunk, :k] = np.where(np.isfinite(top_scores),
+                                                  np.take_along_axis(columns, top, 1), -1)
+
+    def update(self, catalog: pd.DataFrame, removed: Optional[List[str]] = None) -> Dict:
+        """Apply new, changed and removed courses without a full rebuild"""
+        catalog = catalog.drop_duplicates("key", keep="last").reset_index(drop=True)
+        fingerprints = _fingerprints(catalog)
+        rows = np.array([self.positions.get(key, -1) for key in catalog["key"]], dtype=np.int64)
+        is_new = rows < 0
+        # A removed course that is back in the catalog is re-placed in its old row
+        is_restored = ~is_new & ~self.active[np.maximum(rows, 0)]
+        is_changed = ~is_new & ((fingerprints != self.fingerprints[np.maximum(rows, 0)]) | is_restored)
+        removed_rows = np.array([self.positions[key] for key in (removed or [])
+                                 if key in self.positions and self.active[self.positions[key]]],
+                                dtype=np.int64)
+        changes = {"new": int(is_new.sum()), "changed": int((is_changed & ~is_restored).sum()),
+                   "restored": int(is_restored.sum()), "removed": len(removed_rows)}
+
+        self.changes_since_build += sum(changes.values())
+        if self.changes_since_build > self.rebuild_fraction * self.active.sum():
+            kept = self.catalog[self.active & ~np.isin(np.arange(len(self.catalog)), removed_rows)]
+            merged = pd.concat([kept, catalog], ignore_index=True).drop_duplicates("key", keep="last")
+            self.build(merged)
+            return {"status": "success", "rebuilt": True, **changes}
+        if not any(changes.values()):
+            return {"status": "success", "rebuilt": False, **changes}
+
+        # Replace changed rows in place, append new ones, zero removed ones
+        changed_rows = rows[is_changed]
+        n_old = len(self.catalog)
+        new_rows = np.arange(n_old, n_old + is_new.sum())
+        self.catalog.loc[changed_rows, catalog.columns] = catalog[is_changed].values
+        self.catalog = pd.concat([self.catalog, catalog[is_new]], ignore_index=True)
+        for i, key in zip(new_rows, catalog["key"][is_new]):
+            self.positions[key] = i
+        self.fingerprints = np.concatenate([self.fingerprints, fingerprints[is_new]])
+        self.fingerprints[changed_rows] = fingerprints[is_changed]
+        self.active = np.concatenate([self.active, np.ones(len(new_rows), dtype=bool)])
+        self.active[changed_rows] = True
+        self.active[removed_rows] = False
+
+        replaced = np.concatenate([changed_rows, removed_rows])
+        keep = np.ones(n_old, dtype=np.float32)
+        keep[replaced] = 0.0
+        matrix = sp.vstack([sp.diags(keep) @ self.matrix,
+                            sp.csr_matrix((len(new_rows), self.matrix.shape[1]), dtype=np.float32)])
+        placed = np.concatenate([changed_rows, new_rows])
+        if len(placed):
+            encoded = self._encode(pd.concat([catalog[is_changed], catalog[is_new]]))
+            placement = sp.csr_matrix((np.ones(len(placed), dtype=np.float32),
+                                       (placed, np.arange(len(placed)))), shape=(matrix.shape[0], len(placed)))
+            matrix = matrix + placement @ encoded
+        self.matrix = matrix.tocsr()
+        self.neighbours = np.vstack([self.neighbours, np.full((len(new_rows), self.k), -1, dtype=np.int32)])
+        self.scores = np.vstack([self.scores, np.full((len(new_rows), self.k), -np.inf, dtype=np.float32)])
+
+        # Lists that held a changed or removed course may now be missing a better one: recompute
+        touched = np.isin(self.neighbours, replaced).any(axis=1)
+        dirty = np.zeros(len(self.catalog), dtype=bool)
+        dirty[placed] = True
+        dirty |= touched & self.active
+        dirty[removed_rows] = False
+        self.neighbours[removed_rows] = -1
+        self.scores[removed_rows] = -np.inf
+        self._recompute(np.flatnonzero(dirty))
+        # Everyone else only needs the changed and new courses as extra candidates
+        if len(placed):
+            self._merge(np.flatnonzero(self.active & ~dirty), placed)
+        logger.info(f"Course index updated: {changes}")
+        return {"status": "success", "rebuilt": False, **changes}
+
+    def _courses(self, rows: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        columns = {col: self.catalog[col].values[rows]
+                   for col in ("key", "title", "provider", "url", "level", "subject", "rating")}
+        results = []
+        for i, score in enumerate(scores):
+            course = {col: values[i] for col, values in columns.items()}
+            course["rating"] = None if pd.isna(course["rating"]) else float(course["rating"])
+            course["score"] = round(float(score), 4)
+            results.append(course)
+        return results
+
+    def similar(self, key: str, k: Optional[int] = None) -> List[Dict]:
+        """Nearest courses to a catalog course, straight from the neighbour table"""
+        row = self.positions.get(key)
+        if row is None or not self.active[row]:
+            raise KeyError(f"Unknown course: {key}")
+        neighbours = self.neighbours[row, :k or self.k]
+        found = neighbours >= 0
+        return self._courses(neighbours[found], self.scores[row, :k or self.k][found])
+
+    def _query(self, text: str, level: Optional[str] = None) -> np.ndarray:
+        """A dense unit query vector in the matrix's feature space; without a level the level block stays empty"""
+        query = np.zeros(self.matrix.shape[1], dtype=np.float32)
+        text_vector = self.vectorizer.transform([text])
+        if text_vector.nnz:
+            query[text_vector.indices] = text_vector.data / np.linalg.norm(text_vector.data) * self.text_weight
+        if level is not None:
+            query[self.matrix.shape[1] - len(LEVELS) + LEVELS.index(level)] = self.level_weight
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def _rank(self, query: np.ndarray, k: int, provider: Optional[str] = None) -> List[Dict]:
+        similarity = self.matrix @ query
+        similarity[~self.active] = -np.inf
+        if provider is not None:
+            similarity[(self.catalog["provider"] != provider).values] = -np.inf
+        # Courses sharing nothing with the query are not recommendations
+        k = min(k, int((similarity > 0).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-similarity, k - 1)[:k]
+        top = top[np.argsort(-similarity[top])]
+        return self._courses(top, similarity[top])
+
+    def search(self, text: str, k: int = 10, level: Optional[str] = None,
+               provider: Optional[str] = None) -> List[Dict]:
+        """Courses closest to free text, optionally preferring a level"""
+        return self._rank(self._query(text, level), k, provider)
+
+    def recommend(self, type_scores: Dict[str, float], topics: List[str], k: int = 5,
+                  threshold: float = 0.6, type_weight: float = 0.3) -> Dict:
+        """Courses for every assessment type a student scores (or is predicted to score) below threshold
+
+        type_scores are normalized (0-1) scores per assessment type; topics
+        are the titles of the student's courses. The query is the topic plus
+        type_weight of the type's study terms (TYPE_QUERIES), so the subject
+        stays in charge. Weakest types come first; very weak types (below
+        threshold - 0.2) get beginner material.
+        """
+        weak = sorted((score, assessment_type) for assessment_type, score in type_scores.items()
+                      if score is not None and score < threshold)
+        recommendations = []
+        for score, assessment_type in weak:
+            level = "beginner" if score < threshold - 0.2 else "intermediate"
+            query = self._query(" ".join(topics), level)
+            type_terms = TYPE_QUERIES.get(assessment_type)
+            if type_terms:
+                query = query + type_weight * self._query(type_terms, level)
+                query /= np.linalg.norm(query) or 1.0
+            recommendations.append({
+                "assessment_type": assessment_type,
+                "score": round(float(score), 4),
+                "level": level,
+                "courses": self._rank(query, k)
+            })
+        return {"status": "success", "weak_types": [t for _, t in weak],
+                "recommendations": recommendations}
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.__dict__, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Course index saved to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "CourseRecommender":
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        recommender = cls.__new__(cls)
+        recommender.__dict__.update(state)
+        return recommender
+
+    @classmethod
+    def load_or_build(cls, index_path: str = os.path.join(DATA_DIR, INDEX_FILE),
+                      catalog_paths: List[str] = CATALOG_PATHS, **kwargs) -> "CourseRecommender":
+        """The cached index, updated in place if the catalog files changed since it was saved"""
+        source = _source_fingerprint(catalog_paths)
+        if os.path.exists(index_path):
+            recommender = cls.load(index_path)
+            if recommender.source == source:
+                return recommender
+            catalog = load_catalogs(catalog_paths)
+            current = set(recommender.catalog["key"][recommender.active])
+            recommender.update(catalog, removed=sorted(current - set(catalog["key"])))
+        else:
+            recommender = cls(**kwargs).build(load_catalogs(catalog_paths))
+        recommender.source = source
+        recommender.save(index_path)
+        return recommender
+
+    def get_index_info(self) -> Dict:
+        return {
+            "courses": int(self.active.sum()),
+            "features": self.matrix.shape[1],
+            "nnz": int(self.matrix.nnz),
+            "k": self.k,
+            "changes_since_build": self.changes_since_build
+        }
+
+def type_scores_from_grades(student_grades: Dict, assessments: List[Dict], trainer=None,
+                            scales: Optional[Dict[str, bool]] = None) -> Dict[str, float]:
+    """Mean normalized score per assessment type; grades keyed by _id or column name
+
+    Grades are normalized with grade_validation (scales: the cohort's
+    column_scales). With a multi-target trainer from modular_torch_Code,
+    assessments the student has not taken yet count with the score its
+    predict_scores forecasts for them; targets that are not assessment
+    columns are ignored.
+    """
+    by_key = {}
+    for a in assessments:
+        by_key[a["_id"]] = a
+        by_key[f"{a['type']}_{a['_id'][:5]}"] = a
+    normalized = normalize_grades({"student": student_grades}, assessments, scales)["student"]
+    scores = {by_key[key]["_id"]: score for key, score in normalized.items()}
+
+    if trainer is not None:
+        # The model is fed normalized scores under their training column names
+        features = {f"{by_key[key]['type']}_{by_key[key]['_id'][:5]}": score
+                    for key, score in normalized.items()}
+        for column, predicted in trainer.predict_scores(features).items():
+            assessment = by_key.get(column)
+            if assessment is not None and assessment["_id"] not in scores:
+                scores[assessment["_id"]] = float(predicted)
+
+    types = {}
+    for assessment_id, score in scores.items():
+        types.setdefault(by_key[assessment_id]["type"], []).append(score)
+    return {assessment_type: float(np.mean(values)) for assessment_type, values in types.items()}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the course index and recommend courses")
+    parser.add_argument("--index", default=os.path.join(DATA_DIR, INDEX_FILE))
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the cached index")
+    parser.add_argument("--student-id", help="Recommend for a student's weak assessment types")
+    parser.add_argument("--query", help="Free-text course search")
+    parser.add_argument("--similar", help="Course key, e.g. udemy:1070968")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--model-name", help="Multi-target model (modular_torch_Code) that forecasts "
+                                             "the student's ungraded assessments")
+    parser.add_argument("--model-dir", default="models", help="ModelManager directory for --model-name")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.rebuild and os.path.exists(args.index):
+        os.remove(args.index)
+    start = time.perf_counter()
+    recommender = CourseRecommender.load_or_build(args.index)
+    logger.info(f"Index ready in {(time.perf_counter() - start) * 1000:.1f} ms: {recommender.get_index_info()}")
+
+    start = time.perf_counter()
+    if args.student_id:
+        with open(os.path.join(DATA_DIR, 'assessmentGrades.json')) as f:
+            grades = json.load(f)
+        with open(os.path.join(DATA_DIR, 'assessments.json')) as f:
+            assessments = json.load(f)
+        with open(os.path.join(DATA_DIR, 'courses.json')) as f:
+            topics = [course["title"] for course in json.load(f)]
+        trainer = None
+        if args.model_name:
+            import sys
+            # Ahead of this directory, whose model.py is the single-output API
+            sys.path.insert(0, os.path.join(DATA_DIR, "modular_torch_Code"))
+            from model_manager import ModelManager
+            trainer = ModelManager(args.model_dir).load_model(args.model_name)
+        type_scores = type_scores_from_grades(grades.get(args.student_id, {}), assessments, trainer,
+                                              column_scales(grades, assessments))
+        result = recommender.recommend(type_scores, topics, args.k, args.threshold)
+    elif args.similar:
+        result = recommender.similar(args.similar, args.k)
+    else:
+        result = recommender.search(args.query or "", args.k)
+    logger.info(f"Query answered in {(time.perf_counter() - start) * 1000:.2f} ms")
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,191 @@
+import json
+import numpy as np
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Robust z-score (median / MAD) above which a normalized score is an outlier
+OUTLIER_THRESHOLD = 3.5
+# Columns with fewer valid grades than this are not checked for outliers
+MIN_OUTLIER_COUNT = 30
+
+def _key_index(assessments: List[Dict]) -> Dict[str, int]:
+    """Position of each assessment under its _id and its column name ({type}_{id[:5]})"""
+    key_index = {a["_id"]: i for i, a in enumerate(assessments)}
+    key_index.update({f"{a['type']}_{a['_id'][:5]}": i for i, a in enumerate(assessments)})
+    return key_index
+
+def fraction_mask(values: np.ndarray, totals: np.ndarray) -> np.ndarray:
+    """Scores that look like normalized fractions: non-integers in [0, 1] out of more than one mark"""
+    return (values >= 0) & (values <= 1) & (values != np.round(values)) & (totals > 1)
+
+def raw_columns(fraction_count: np.ndarray, count: np.ndarray) -> np.ndarray:
+    """A column is recorded in raw marks unless most of its grades are fractions"""
+    return fraction_count * 2 <= count
+
+def column_scales(grades: Dict[str, Dict], assessments: List[Dict]) -> Dict[str, bool]:
+    """Whether each graded assessment (by _id) is recorded in raw marks, by majority"""
+    key_index = _key_index(assessments)
+    totals = np.array([float(a["totalMarks"]) for a in assessments])
+    columns, values = [], []
+    for student_grades in grades.values():
+        for key, value in student_grades.items():
+            column = key_index.get(key)
+            if column is None or not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            columns.append(column)
+            values.append(value)
+    columns = np.array(columns, dtype=np.int64)
+    values = np.array(values, dtype=np.float64)
+    valid = np.isfinite(values)
+    columns, values = columns[valid], values[valid]
+
+    count = np.bincount(columns, minlength=len(assessments))
+    fraction_count = np.bincount(columns[fraction_mask(values, totals[columns])], minlength=len(assessments))
+    is_raw = raw_columns(fraction_count, count)
+    return {a["_id"]: bool(is_raw[i]) for i, a in enumerate(assessments) if count[i]}
+
+def normalize_score(value: float, total: float, is_raw: bool = True) -> float:
+    """One grade as a 0-1 score, given whether its column is recorded in raw marks"""
+    keep = fraction_mask(np.float64(value), total) or (not is_raw and value <= 1)
+    return float(value) if keep or not total else float(value) / total
+
+def normalize_grades(grades: Dict[str, Dict], assessments: List[Dict],
+                     scales: Optional[Dict[str, bool]] = None) -> Dict[str, Dict[str, float]]:
+    """Grades as 0-1 scores under their original keys
+
+    Raw-mark columns are divided by totalMarks; fraction columns are kept.
+    A fraction in a raw-mark column stays a fraction, as validate_grades
+    repairs it. scales (from column_scales, e.g. over the whole cohort)
+    overrides the majority scale of these grades. Unknown assessments and
+    non-numeric values are dropped.
+    """
+    key_index = _key_index(assessments)
+    scales = {**column_scales(grades, assessments), **(scales or {})}
+    normalized = {}
+    for student_id, student_grades in grades.items():
+        student_scores = {}
+        for key, value in student_grades.items():
+            column = key_index.get(key)
+            if column is None or not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            assessment = assessments[column]
+            student_scores[key] = normalize_score(value, float(assessment["totalMarks"]),
+                                                  scales.get(assessment["_id"], True))
+        normalized[student_id] = student_scores
+    return normalized
+
+def validate_grades(grades: Dict[str, Dict], assessments: List[Dict],
+                    student_ids: Optional[List[str]] = None,
+                    outlier_threshold: float = OUTLIER_THRESHOLD,
+                    repair_scale: bool = False) -> Dict:
+    """Validate every grade at once, column by column, and split clean from quarantined
+
+    Grades may be keyed by assessment _id or by training column name
+    ({type}_{id[:5]}); clean grades are re-keyed by _id as raw marks, which
+    is what preprocess.py expects. Checks:
+      - unknown_student / unknown_assessment / duplicate_grade
+      - invalid_value: not a finite number
+      - out_of_range: below 0 or above totalMarks
+      - scale_mismatch: a normalized fraction in a column recorded in raw
+        marks (or the reverse); with repair_scale, fractions are converted
+        to marks instead of being quarantined
+      - outlier: robust z-score of the normalized score within its column
+    """
+    ids = [a["_id"] for a in assessments]
+    key_index = _key_index(assessments)
+    totals = np.array([float(a["totalMarks"]) for a in assessments])
+
+    # Flatten to one entry per (student, key); everything after this is array math
+    entry_students, entry_keys, raw_values = [], [], []
+    for student_id, student_grades in grades.items():
+        for key, value in student_grades.items():
+            entry_students.append(student_id)
+            entry_keys.append(key)
+            raw_values.append(value)
+    n = len(raw_values)
+    entry_students = np.array(entry_students, dtype=object)
+    columns = np.array([key_index.get(key, -1) for key in entry_keys], dtype=np.int64)
+    values = np.array([v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+                       for v in raw_values], dtype=np.float64)
+
+    reasons = {name: np.zeros(n, dtype=bool) for name in (
+        "unknown_student", "unknown_assessment", "duplicate_grade", "invalid_value",
+        "out_of_range", "scale_mismatch", "outlier")}
+
+    if student_ids is not None:
+        reasons["unknown_student"] = ~np.isin(entry_students, np.array(student_ids, dtype=object))
+    known = columns >= 0
+    reasons["unknown_assessment"] = ~known
+    reasons["invalid_value"] = ~np.isfinite(values)
+
+    # The same assessment under both its _id and its column name: keep the first
+    pair_keys = np.array([f"{s}\x1f{c}" for s, c in zip(entry_students, columns)], dtype=object)
+    is_first = np.zeros(n, dtype=bool)
+    is_first[np.unique(pair_keys, return_index=True)[1]] = True
+    reasons["duplicate_grade"] = known & ~is_first
+
+    total = np.where(known, totals[np.maximum(columns, 0)], np.nan)
+    valid = known & np.isfinite(values)
+    reasons["out_of_range"] = valid & ((values < 0) | (values > total))
+
+    # A column's scale is whichever its majority uses
+    is_fraction = valid & fraction_mask(values, total)
+    column_count = np.bincount(columns[valid], minlength=len(ids))
+    fraction_count = np.bincount(columns[is_fraction], minlength=len(ids))
+    column_is_raw = raw_columns(fraction_count, column_count)
+    raw_column = column_is_raw[np.maximum(columns, 0)]
+    mismatch = valid & np.where(raw_column, is_fraction, (values > 1) & (total > 1))
+
+    # Clean grades are raw marks, whatever scale their column was recorded in
+    marks = np.where(raw_column, values, values * total)
+    if repair_scale:
+        repairable = mismatch & raw_column
+        marks[repairable] = values[repairable] * total[repairable]
+        mismatch &= ~repairable
+    reasons["scale_mismatch"] = mismatch
+    normalized = marks / total
+
+    passing = valid & ~reasons["out_of_range"] & ~reasons["scale_mismatch"] & ~reasons["duplicate_grade"]
+    for column in np.unique(columns[passing]):
+        in_column = passing & (columns == column)
+        if in_column.sum() < MIN_OUTLIER_COUNT:
+            continue
+        column_scores = normalized[in_column]
+        median = np.median(column_scores)
+        mad = np.median(np.abs(column_scores - median))
+        if mad == 0:
+            continue
+        robust_z = 0.6745 * np.abs(column_scores - median) / mad
+        reasons["outlier"][np.flatnonzero(in_column)[robust_z > outlier_threshold]] = True
+
+    flagged = np.zeros(n, dtype=bool)
+    for mask in reasons.values():
+        flagged |= mask
+
+    clean = {student_id: {} for student_id in grades}
+    for i in np.flatnonzero(~flagged):
+        clean[entry_students[i]][ids[columns[i]]] = float(marks[i])
+
+    quarantine = [
+        {
+            "student_id": entry_students[i],
+            "assessment": entry_keys[i],
+            "value": raw_values[i],
+            "reasons": [name for name, mask in reasons.items() if mask[i]]
+        }
+        for i in np.flatnonzero(flagged)
+    ]
+
+    summary = {name: int(mask.sum()) for name, mask in reasons.items()}
+    summary.update({"total_grades": n, "clean_grades": int((~flagged).sum()),
+                    "quarantined_grades": len(quarantine)})
+    if quarantine:
+        logger.warning(f"Quarantined {len(quarantine)} of {n} grades")
+    return {"clean": clean, "quarantine": quarantine, "summary": summary}
+
+def write_quarantine(report: Dict, path: str):
+    """Write quarantined grades and the check summary for review"""
+    with open(path, 'w') as f:
+        json.dump({"summary": report["summary"], "quarantine": report["quarantine"]}, f, indent=2)
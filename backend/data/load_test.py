@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import copy
+import asyncio
+import threading
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_SCRIPT = os.path.join(DATA_DIR, "model.py")
+PERCENTILES = [50, 90, 95, 99]
+
+def load_capture(path: str, actions: Optional[List[str]] = None) -> List[Dict]:
+    """Read requests recorded by model.py with STUDENT_PREDICTOR_CAPTURE set"""
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if actions is None or record["action"] in actions:
+                    requests.append(record)
+    return requests
+
+class CliTarget:
+    """One model.py process per request, as index.js does"""
+
+    name = "cli"
+    actions = ("predict", "feedback")
+
+    def __init__(self, python: str = sys.executable, script: str = MODEL_SCRIPT):
+        self.python = python
+        self.script = script
+
+    async def send(self, action: str, payload: Dict) -> Dict:
+        process = await asyncio.create_subprocess_exec(
+            self.python, self.script, "--action", action, "--input", json.dumps(payload),
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+            env={**os.environ, "STUDENT_PREDICTOR_CAPTURE": ""})
+        stdout, _ = await process.communicate()
+        if process.returncode != 0:
+            return {"error": f"model.py exited with {process.returncode}"}
+        return json.loads(stdout)
+
+class InProcessTarget:
+    """A single loaded StudentScorePredictorAPI, called on worker threads
+
+    Feedback can trigger a reinforcement update, so it goes to a separate
+    copy of the model, one request at a time: predictions never run against
+    weights that are being trained.
+    """
+
+    name = "inprocess"
+    actions = ("predict", "feedback")
+
+    def __init__(self, model_path: str = os.path.join(DATA_DIR, "student_predictor.pkl"),
+                 workers: int = 1):
+        from model import StudentScorePredictorAPI
+        self.api = StudentScorePredictorAPI(model_path)
+        self.feedback_api = None
+        self.feedback_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _call(self, action: str, payload: Dict) -> Dict:
+        if action == "predict":
+            return self.api.predict_student_score(payload["student_id"], payload["previous_grades"],
+                                                  payload.get("mc_samples", 0),
+                                                  payload.get("interval", 0.9))
+        if action == "feedback":
+            with self.feedback_lock:
+                if self.feedback_api is None:
+                    self.feedback_api = copy.deepcopy(self.api)
+                return self.feedback_api.submit_feedback(payload["student_id"], payload["previous_grades"],
+                                                         payload["predicted_score"], payload["actual_score"],
+                                                         payload["teacher_feedback"])
+        return {"error": f"Unknown action: {action}"}
+
+    async def send(self, action: str, payload: Dict) -> Dict:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._call, action, payload)
+
+class HttpTarget:
+    """POSTs each payload to {base_url}/api/{action}; the Express server only routes /api/predict"""
+
+    name = "http"
+    actions = ("predict",)
+
+    def __init__(self, base_url: str = "http://localhost:5000", timeout: float = 30.0,
+                 workers: int = 32):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _post(self, action: str, payload: Dict) -> Dict:
+        request = urllib.request.Request(f"{self.base_url}/api/{action}",
+                                         data=json.dumps(payload).encode(),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def send(self, action: str, payload: Dict) -> Dict:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._post, action, payload)
+
+async def replay(target, requests: List[Dict], qps: Optional[float] = None,
+                 concurrency: int = 8, duration_s: Optional[float] = None) -> Dict:
+    """Replay captured requests open-loop at qps (or as fast as possible) with bounded concurrency
+
+    Latency is measured from each request's scheduled send time, so queueing
+    behind a slow server counts against it instead of being hidden by a
+    stalled sender. With duration_s the capture is looped until time runs out.
+    Actions the target does not serve are skipped.
+    """
+    supported = [record for record in requests if record["action"] in target.actions]
+    if len(supported) < len(requests):
+        logger.warning(f"Skipping {len(requests) - len(supported)} requests: "
+                       f"the {target.name} target only serves {', '.join(target.actions)}")
+    requests = supported
+    semaphore = asyncio.Semaphore(concurrency)
+    records = []
+
+    async def run_one(record: Dict, scheduled: float, holds_slot: bool):
+        if not holds_slot:
+            await semaphore.acquire()
+        try:
+            started = time.perf_counter()
+            try:
+                result = await target.send(record["action"], record["input"])
+                error = "error" in result
+            except Exception as e:
+                logger.error(f"Request failed: {e}")
+                error = True
+            finished = time.perf_counter()
+        finally:
+            semaphore.release()
+        records.append((record["action"], finished - scheduled, finished - started, error))
+
+    tasks = []
+    start = time.perf_counter()
+    i = 0
+    while requests:
+        if duration_s is None and i >= len(requests):
+            break
+        if qps:
+            scheduled = start + i / qps
+            if duration_s is not None and scheduled - start >= duration_s:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            # Closed loop: the next request is sent as soon as a slot frees up
+            await semaphore.acquire()
+            scheduled = time.perf_counter()
+            if duration_s is not None and scheduled - start >= duration_s:
+                semaphore.release()
+                break
+        tasks.append(asyncio.create_task(run_one(requests[i % len(requests)], scheduled, not qps)))
+        i += 1
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    report = _summarize(records, elapsed)
+    report.update({"target": target.name, "qps": qps, "concurrency": concurrency})
+    return report
+
+def _latency_stats(latencies: np.ndarray) -> Dict:
+    if len(latencies) == 0:
+        return {}
+    stats = {f"p{p}": float(np.percentile(latencies, p)) for p in PERCENTILES}
+    stats.update({"mean": float(latencies.mean()), "max": float(latencies.max())})
+    return {key: round(value * 1000, 3) for key, value in stats.items()}
+
+def _summarize(records: List, elapsed: float) -> Dict:
+    actions = np.array([r[0] for r in records])
+    latency = np.array([r[1] for r in records])
+    service = np.array([r[2] for r in records])
+    errors = np.array([r[3] for r in records], dtype=bool)
+
+    def summary(mask: np.ndarray) -> Dict:
+        return {
+            "requests": int(mask.sum()),
+            "errors": int(errors[mask].sum()),
+            "error_rate": float(errors[mask].mean()) if mask.any() else 0.0,
+            "latency_ms": _latency_stats(latency[mask]),
+            "service_time_ms": _latency_stats(service[mask])
+        }
+
+    everything = np.ones(len(records), dtype=bool)
+    report = summary(everything)
+    report.update({
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(records) / elapsed, 3) if elapsed > 0 else 0.0,
+        "by_action": {action: summary(actions == action) for action in np.unique(actions)}
+    })
+    return report
+
+def compare_reports(baseline: Dict, candidate: Dict) -> Dict:
+    """Relative change of throughput, error rate and latency percentiles between two builds"""
+    def change(old, new):
+        return round((new - old) / old, 4) if old else None
+
+    comparison = {
+        "throughput_rps": {"baseline": baseline["throughput_rps"], "candidate": candidate["throughput_rps"],
+                           "change": change(baseline["throughput_rps"], candidate["throughput_rps"])},
+        "error_rate": {"baseline": baseline["error_rate"], "candidate": candidate["error_rate"]},
+        "latency_ms": {}
+    }
+    for key, old in baseline["latency_ms"].items():
+        new = candidate["latency_ms"].get(key)
+        if new is not None:
+            comparison["latency_ms"][key] = {"baseline": old, "candidate": new, "change": change(old, new)}
+    return comparison
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay captured model.py requests and report latency")
+    parser.add_argument("--capture", help="JSONL capture written via STUDENT_PREDICTOR_CAPTURE")
+    parser.add_argument("--target", choices=["cli", "inprocess", "http"], default="inprocess")
+    parser.add_argument("--url", default="http://localhost:5000", help="Base URL for --target http")
+    parser.add_argument("--model", default=os.path.join(DATA_DIR, "student_predictor.pkl"))
+    parser.add_argument("--actions", nargs="+", help="Only replay these actions (default: predict)")
+    parser.add_argument("--include-feedback", action="store_true",
+                        help="Also replay feedback, which can retrain the target's model")
+    parser.add_argument("--qps", type=float, help="Open-loop request rate; omit for as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, help="Loop the capture for this many seconds")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="Compare two saved reports instead of running")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            candidate = json.load(f)
+        print(json.dumps(compare_reports(baseline, candidate), indent=2))
+        sys.exit(0)
+
+    if not args.capture:
+        parser.error("--capture is required unless --compare is given")
+    actions = args.actions or (["predict", "feedback"] if args.include_feedback else ["predict"])
+    if "feedback" in actions and not args.include_feedback:
+        parser.error("feedback replay can retrain the model; pass --include-feedback")
+    if args.target == "cli":
+        target = CliTarget()
+    elif args.target == "http":
+        target = HttpTarget(args.url, workers=args.concurrency)
+    else:
+        target = InProcessTarget(args.model, workers=args.concurrency)
+
+    report = asyncio.run(replay(target, load_capture(args.capture, actions), args.qps,
+                                args.concurrency, args.duration))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
@@ -11,6 +11,9 @@ from typing import Dict, List, Tuple, Optional
 import logging
 import os
 import sys
+import time
+
+from prediction_table import PredictionTable, TABLE_FILE, model_version
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -114,6 +117,50 @@ class ReinforcementLearningTrainer:
             logger.error(f"Error making prediction: {e}")
             return 0.0
     
+    def _features_tensor(self, students: List[Dict]) -> torch.Tensor:
+        features = np.array(
+            [[student.get(col, 0.0) for col in self.feature_columns] for student in students],
+            dtype=np.float64
+        ).reshape(len(students), len(self.feature_columns))
+        return torch.FloatTensor(self.scaler.transform(features))
+    
+    def predict_scores(self, students: List[Dict]) -> np.ndarray:
+        """Predict scores for many students with a single scale-and-forward call"""
+        features_tensor = self._features_tensor(students)
+        
+        self.model.eval()
+        with torch.no_grad():
+            predictions = self.model(features_tensor)
+        
+        return predictions[:, 0].numpy()
+    
+    def predict_scores_with_uncertainty(self, students: List[Dict], num_samples: int = 30,
+                                        interval: float = 0.9) -> Dict[str, np.ndarray]:
+        """Monte Carlo dropout: mean, std and a prediction interval per student
+        
+        The batch is tiled num_samples times and sent through the network once
+        with dropout active, so each layer is still a single matrix multiply.
+        """
+        features_tensor = self._features_tensor(students)
+        tiled = features_tensor.repeat(num_samples, 1)
+        
+        # train() only switches dropout on; the model has no batch statistics
+        self.model.train()
+        try:
+            with torch.no_grad():
+                samples = self.model(tiled)[:, 0].reshape(num_samples, len(students))
+        finally:
+            self.model.eval()
+        
+        tail = (1.0 - interval) / 2
+        bounds = torch.quantile(samples, torch.tensor([tail, 1.0 - tail]), dim=0)
+        return {
+            "mean": samples.mean(dim=0).numpy(),
+            "std": samples.std(dim=0).numpy(),
+            "lower": bounds[0].numpy(),
+            "upper": bounds[1].numpy()
+        }
+    
     def add_feedback(self, student_data: Dict, predicted_score: float, 
                     actual_score: float, teacher_feedback: str):
         """Add teacher feedback for reinforcement learning"""
@@ -153,12 +200,15 @@ class ReinforcementLearningTrainer:
         
         return accuracy_reward * feedback_modifier
     
-    def reinforcement_update(self, batch_size: int = 32):
-        """Update model based on accumulated feedback using policy gradient"""
+    def reinforcement_update(self, batch_size: int = 32) -> bool:
+        """Update model based on accumulated feedback using policy gradient
+        
+        Returns whether the weights changed; below batch_size samples nothing is trained.
+        """
         
         if len(self.feedback_buffer) < batch_size:
             logger.warning("Not enough feedback samples for update")
-            return
+            return False
         
         # Sample from feedback buffer
         sample_indices = np.random.choice(len(self.feedback_buffer), batch_size, replace=False)
@@ -203,6 +253,7 @@ class ReinforcementLearningTrainer:
         # Clear processed feedback
         for i in sorted(sample_indices, reverse=True):
             del self.feedback_buffer[i]
+        return True
     
     def save_model(self, filepath: str):
         """Save model and training components"""
@@ -234,12 +285,30 @@ class ReinforcementLearningTrainer:
 class StudentScorePredictorAPI:
     """API wrapper for web application integration"""
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None,
+                 prediction_table_path: Optional[str] = None, load_on_demand: bool = False):
         # Initialize with appropriate input size (will be set during training)
         self.trainer = None
+        self.model_version = None
+        self.pending_model_path = None
+        # Precomputed predictions (prediction_table.py), used only if the job has run
+        self.prediction_table = None
+        if prediction_table_path and os.path.exists(prediction_table_path):
+            self.prediction_table = PredictionTable(prediction_table_path)
         
-        if model_path:
+        if model_path and load_on_demand and os.path.exists(model_path):
+            # Requests answered from the prediction table never need the weights
+            self.pending_model_path = model_path
+            self.model_version = model_version(model_path)
+        elif model_path:
+            self.load_model(model_path)
+    
+    def _require_trainer(self) -> bool:
+        """Load a deferred model on first use"""
+        if self.trainer is None and self.pending_model_path:
+            model_path, self.pending_model_path = self.pending_model_path, None
             self.load_model(model_path)
+        return self.trainer is not None
     
     def train_initial_model(self, data_path: str, model_save_path: str = "data/student_predictor.pkl"):
         """Train initial model and save it"""
@@ -261,9 +330,30 @@ class StudentScorePredictorAPI:
         
         return {"status": "success", "message": f"Model trained and saved successfully as {model_save_path}"}
     
-    def predict_student_score(self, student_id: str, previous_grades: Dict) -> Dict:
-        """Predict score for a student"""
-        if not self.trainer:
+    def predict_student_score(self, student_id: str, previous_grades: Dict,
+                              mc_samples: int = 0, interval: float = 0.9) -> Dict:
+        """Predict score for a student
+        
+        With mc_samples > 0 the response also carries Monte Carlo dropout
+        uncertainty (mean, std and interval bounds).
+        """
+        if mc_samples > 0:
+            return self.predict_student_scores([(student_id, previous_grades)], mc_samples, interval)[0]
+        
+        if self.prediction_table and self.model_version:
+            try:
+                cached_score = self.prediction_table.lookup(student_id, self.model_version, previous_grades)
+                if cached_score is not None:
+                    return {
+                        "student_id": student_id,
+                        "predicted_score": cached_score,
+                        "status": "success",
+                        "source": "precomputed"
+                    }
+            except Exception as e:
+                logger.error(f"Prediction table lookup failed, using live inference: {e}")
+        
+        if not self._require_trainer():
             return {"error": "Model not loaded"}
         
         try:
@@ -272,17 +362,94 @@ class StudentScorePredictorAPI:
             return {
                 "student_id": student_id,
                 "predicted_score": round(predicted_score, 4),
-                "status": "success"
+                "status": "success",
+                "source": "live"
             }
             
         except Exception as e:
             return {"error": str(e)}
     
+    def predict_student_scores(self, requests: List[Tuple[str, Dict]],
+                               mc_samples: int = 0, interval: float = 0.9) -> List[Dict]:
+        """Predict scores for a batch of (student_id, previous_grades) requests
+        
+        Fresh prediction table entries are served as in predict_student_score
+        and the rest are scored in one forward pass. If that pass fails, the
+        requests are retried one by one so a malformed request fails alone.
+        """
+        results: List[Optional[Dict]] = [None] * len(requests)
+        if mc_samples == 0 and self.prediction_table and self.model_version:
+            try:
+                cached_scores = self.prediction_table.lookup_many(self.model_version, requests)
+            except Exception as e:
+                logger.error(f"Prediction table lookup failed, using live inference: {e}")
+                cached_scores = [None] * len(requests)
+            for i, ((student_id, _), cached_score) in enumerate(zip(requests, cached_scores)):
+                if cached_score is not None:
+                    results[i] = {
+                        "student_id": student_id,
+                        "predicted_score": cached_score,
+                        "status": "success",
+                        "source": "precomputed"
+                    }
+        
+        live = [i for i, result in enumerate(results) if result is None]
+        if not live:
+            return results
+        if not self._require_trainer():
+            for i in live:
+                results[i] = {"error": "Model not loaded"}
+            return results
+        
+        try:
+            live_results = self._score_batch([requests[i] for i in live], mc_samples, interval)
+        except Exception as e:
+            logger.warning(f"Batched prediction failed, retrying requests individually: {e}")
+            live_results = []
+            for i in live:
+                try:
+                    live_results.extend(self._score_batch([requests[i]], mc_samples, interval))
+                except Exception as item_error:
+                    live_results.append({"error": str(item_error)})
+        for i, result in zip(live, live_results):
+            results[i] = result
+        return results
+    
+    def _score_batch(self, requests: List[Tuple[str, Dict]], mc_samples: int,
+                     interval: float) -> List[Dict]:
+        """Live inference for a batch; raises if any request cannot be scored"""
+        students = [grades for _, grades in requests]
+        predicted_scores = self.trainer.predict_scores(students)
+        
+        results = [
+            {
+                "student_id": student_id,
+                "predicted_score": round(float(score), 4),
+                "status": "success",
+                "source": "live"
+            }
+            for (student_id, _), score in zip(requests, predicted_scores)
+        ]
+        
+        if mc_samples > 0:
+            uncertainty = self.trainer.predict_scores_with_uncertainty(students, mc_samples, interval)
+            for i, result in enumerate(results):
+                result["uncertainty"] = {
+                    "mean": round(float(uncertainty["mean"][i]), 4),
+                    "std": round(float(uncertainty["std"][i]), 4),
+                    "lower": round(float(uncertainty["lower"][i]), 4),
+                    "upper": round(float(uncertainty["upper"][i]), 4),
+                    "interval": interval,
+                    "samples": mc_samples
+                }
+        
+        return results
+    
     def submit_feedback(self, student_id: str, previous_grades: Dict, 
                        predicted_score: float, actual_score: float, 
                        teacher_feedback: str) -> Dict:
         """Submit teacher feedback for reinforcement learning"""
-        if not self.trainer:
+        if not self._require_trainer():
             return {"error": "Model not loaded"}
         
         try:
@@ -291,10 +458,15 @@ class StudentScorePredictorAPI:
             )
             
             # Trigger reinforcement update if we have enough feedback
+            updated = False
             if len(self.trainer.feedback_buffer) >= 10:  # Adjust threshold as needed
-                self.trainer.reinforcement_update()
+                updated = self.trainer.reinforcement_update()
+            if updated:
+                # Weights no longer match the saved model the table was computed with
+                self.model_version = None
             
-            return {"status": "success", "message": "Feedback submitted and model updated"}
+            message = "Feedback submitted and model updated" if updated else "Feedback submitted"
+            return {"status": "success", "message": message, "model_updated": updated}
             
         except Exception as e:
             return {"error": str(e)}
@@ -314,6 +486,7 @@ class StudentScorePredictorAPI:
             
             # Load saved state
             self.trainer.load_model(model_path)
+            self.model_version = model_version(model_path)
             
             return {"status": "success", "message": "Model loaded successfully"}
             
@@ -335,6 +508,17 @@ class StudentScorePredictorAPI:
 def data_path(filename):
     return os.path.join(DATA_DIR, filename)
 
+def capture_request(action: str, payload: Dict):
+    """Append a request to the capture file named by STUDENT_PREDICTOR_CAPTURE, if set"""
+    capture_path = os.environ.get("STUDENT_PREDICTOR_CAPTURE")
+    if not capture_path:
+        return
+    try:
+        with open(capture_path, 'a') as f:
+            f.write(json.dumps({"timestamp": time.time(), "action": action, "input": payload}) + "\n")
+    except Exception as e:
+        logger.error(f"Error capturing request: {e}")
+
 if __name__ == "__main__":
     import argparse, json
     parser = argparse.ArgumentParser()
@@ -343,10 +527,14 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     DATA_DIR = os.path.dirname(os.path.abspath(__file__))
-    api = StudentScorePredictorAPI(os.path.join(DATA_DIR, "student_predictor.pkl"))
+    api = StudentScorePredictorAPI(os.path.join(DATA_DIR, "student_predictor.pkl"),
+                                   os.path.join(DATA_DIR, TABLE_FILE),
+                                   load_on_demand=args.action == "predict")
     if args.action == "predict":
         data = json.loads(args.input)
-        result = api.predict_student_score(data["student_id"], data["previous_grades"])
+        capture_request(args.action, data)
+        result = api.predict_student_score(data["student_id"], data["previous_grades"],
+                                           data.get("mc_samples", 0), data.get("interval", 0.9))
         print(json.dumps(result))
         sys.stdout.flush()
         sys.exit(0)
@@ -354,6 +542,7 @@ if __name__ == "__main__":
         pass
     elif args.action == "feedback":
         data = json.loads(args.input)
+        capture_request(args.action, data)
         result = api.submit_feedback(
             data["student_id"],
             data["previous_grades"],
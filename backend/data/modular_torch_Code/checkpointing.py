@@ -0,0 +1,93 @@
+import os
+import copy
+import random
+import threading
+import numpy as np
+import torch
+from pathlib import Path
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+def capture_rng_state() -> Dict:
+    """Python, NumPy and torch RNG state, so dropout and sampling resume identically"""
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state()
+    }
+
+def restore_rng_state(state: Dict):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+
+def load_checkpoint(path: str) -> Optional[Dict]:
+    """Load a training checkpoint, or None if there is none yet"""
+    if not os.path.exists(path):
+        return None
+    # Checkpoints hold the fitted scaler, so they cannot be loaded weights-only
+    return torch.load(path, weights_only=False)
+
+class CheckpointWriter:
+    """Writes training checkpoints on a background thread
+
+    The training loop hands over a snapshot and continues immediately; only
+    the newest pending snapshot is kept, so a slow disk never queues up
+    stale epochs. Files are written to a temporary name and renamed into
+    place, so a run killed mid-write leaves the previous checkpoint intact.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._pending = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self._writing = False
+        self.checkpoints_written = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, state: Dict):
+        """Queue a checkpoint; tensors are copied here so training can keep mutating them"""
+        snapshot = copy.deepcopy(state)
+        with self._condition:
+            self._pending = snapshot
+            self._condition.notify()
+
+    def flush(self):
+        """Block until every queued checkpoint is on disk"""
+        with self._condition:
+            while self._pending is not None or self._writing:
+                self._condition.wait()
+
+    def close(self):
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                state, self._pending = self._pending, None
+                self._writing = True
+
+            try:
+                tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+                torch.save(state, tmp_path)
+                os.replace(tmp_path, self.path)
+                self.checkpoints_written += 1
+            except Exception as e:
+                logger.error(f"Error writing checkpoint {self.path}: {e}")
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
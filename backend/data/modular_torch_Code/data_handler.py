@@ -3,59 +3,252 @@ import numpy as np
 import torch
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 import logging
 
+from feature_pipeline import FeaturePipeline
+
 logger = logging.getLogger(__name__)
 
 class DataHandler:
     """Handles data loading, preprocessing, and feature management"""
     
-    def __init__(self):
+    def __init__(self, feature_pipeline: Optional[FeaturePipeline] = None):
         self.scaler = StandardScaler()
         self.feature_columns = []
+        self.target_columns = []
         self.is_fitted = False
+        # Optional encoder for mixed-type schemas such as students_scores_*.csv;
+        # pickled with the data handler, so it is saved with the model
+        self.feature_pipeline = feature_pipeline
     
-    def load_and_prepare_data(self, data_path: str) -> Tuple[torch.Tensor, torch.Tensor]:
-        """Load and prepare training data from CSV"""
+    def load_and_prepare_data(self, data_path: str,
+                              target_columns: Optional[List[str]] = None,
+                              scaler: Optional[StandardScaler] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Load and prepare training data from CSV
+
+        With target_columns, every listed assessment becomes one output of the
+        model and is excluded from the features, so all of them are forecast
+        from a single forward pass. A given scaler (e.g. from a checkpoint)
+        is used as fitted instead of fitting a new one.
+        """
+        if str(data_path).endswith('.npz'):
+            return self._prepare_from_histories(data_path, target_columns, scaler)
+        
         try:
             # Read CSV data
             df = pd.read_csv(data_path)
             logger.info(f"Loaded data with shape: {df.shape}")
             
+            if getattr(self, 'feature_pipeline', None) is not None:
+                return self._prepare_with_pipeline(df, target_columns, scaler)
+            
             # Store feature columns (excluding student_id and target columns)
-            excluded_cols = ['student_id', 'weighted_final_grade']
+            excluded_cols = ['student_id', 'weighted_final_grade'] + list(target_columns or [])
             self.feature_columns = [col for col in df.columns if col not in excluded_cols]
             
             # Prepare features (previous grades)
             X = df[self.feature_columns].values
             
+            if target_columns:
+                self.target_columns = list(target_columns)
+                y = df[self.target_columns].values
+                logger.info(f"Using {len(self.target_columns)} targets: {self.target_columns}")
             # Use weighted_final_grade as target if available, otherwise use last column
-            if 'weighted_final_grade' in df.columns:
+            elif 'weighted_final_grade' in df.columns:
+                self.target_columns = ['weighted_final_grade']
                 y = df['weighted_final_grade'].values
                 logger.info("Using weighted_final_grade as target")
             else:
+                self.target_columns = [self.feature_columns[-1]]
                 y = df[self.feature_columns[-1]].values
                 logger.info(f"Using {self.feature_columns[-1]} as target")
             
             # Scale features
-            X_scaled = self.scaler.fit_transform(X)
+            if scaler is not None:
+                self.scaler = scaler
+                X_scaled = self.scaler.transform(X)
+            else:
+                X_scaled = self.scaler.fit_transform(X)
             self.is_fitted = True
+            # Fingerprints of the rows seen so far, used by fine-tuning to find new data
+            self.row_hashes = self._hash_rows(df)
             
             logger.info(f"Features: {len(self.feature_columns)}")
             logger.info(f"Feature columns: {self.feature_columns}")
             
-            return torch.FloatTensor(X_scaled), torch.FloatTensor(y).unsqueeze(1)
+            y_tensor = torch.FloatTensor(y)
+            if y_tensor.dim() == 1:
+                y_tensor = y_tensor.unsqueeze(1)
+            return torch.FloatTensor(X_scaled), y_tensor
             
         except Exception as e:
             logger.error(f"Error preparing data: {e}")
             raise
     
+    def _prepare_with_pipeline(self, df: pd.DataFrame,
+                               target_columns: Optional[List[str]],
+                               scaler: Optional[StandardScaler] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Fit the feature pipeline and share its scaler with the rest of the handler"""
+        self.target_columns = list(target_columns) if target_columns else [df.columns[-1]]
+        overlap = set(self.target_columns) & set(self.feature_pipeline.input_columns)
+        if overlap:
+            raise ValueError(f"Target columns used as features: {sorted(overlap)}")
+        
+        self.feature_pipeline.fit(df)
+        if scaler is not None:
+            self.feature_pipeline.scaler = scaler
+        X_scaled = self.feature_pipeline.transform(df)
+        self.scaler = self.feature_pipeline.scaler
+        self.feature_columns = self.feature_pipeline.feature_names
+        self.is_fitted = True
+        self.row_hashes = None
+        
+        logger.info(f"Using {self.target_columns} as target")
+        logger.info(f"Features: {len(self.feature_columns)}")
+        
+        y = df[self.target_columns].values.astype(np.float32)
+        return torch.from_numpy(X_scaled), torch.from_numpy(y)
+    
+    @staticmethod
+    def load_grade_histories(histories_path: str) -> Dict[str, np.ndarray]:
+        """Load the CSR grade histories written by preprocess.py
+        
+        Student i's grades are assessment_indices[offsets[i]:offsets[i+1]]
+        (positions in columns) with the matching normalized scores;
+        assessments without a grade are implicit zeros.
+        """
+        with np.load(histories_path) as data:
+            histories = {key: data[key] for key in data.files}
+        histories["columns"] = histories["columns"].tolist()
+        histories["target_names"] = histories["target_names"].tolist()
+        return histories
+    
+    def _prepare_from_histories(self, histories_path: str,
+                                target_columns: Optional[List[str]],
+                                scaler: Optional[StandardScaler] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Fit the scaler from sparse grade histories in O(nnz) and build the model input
+        
+        Feature means and variances only touch the stored grades; the scaled
+        matrix starts from each column's scaled zero and the grades are
+        scattered into it.
+        """
+        histories = self.load_grade_histories(histories_path)
+        offsets = histories["offsets"]
+        indices = histories["assessment_indices"]
+        scores = histories["scores"].astype(np.float64)
+        num_students = len(offsets) - 1
+        num_features = len(histories["columns"])
+        logger.info(f"Loaded {len(scores)} grades for {num_students} students "
+                    f"({len(scores) / max(num_students * num_features, 1):.1%} dense)")
+        
+        target_names = histories["target_names"]
+        self.target_columns = list(target_columns) if target_columns else target_names[:1]
+        missing = [col for col in self.target_columns if col not in target_names]
+        if missing:
+            raise ValueError(f"Targets not stored in grade histories: {missing}")
+        y = histories["targets"][:, [target_names.index(col) for col in self.target_columns]]
+        self.feature_columns = histories["columns"]
+        
+        if scaler is not None:
+            self.scaler = scaler
+        else:
+            sums = np.bincount(indices, weights=scores, minlength=num_features)
+            squares = np.bincount(indices, weights=scores ** 2, minlength=num_features)
+            mean = sums / max(num_students, 1)
+            var = np.maximum(squares / max(num_students, 1) - mean ** 2, 0.0)
+            
+            # Same fitted attributes as StandardScaler.fit, so prediction requests scale identically
+            self.scaler = StandardScaler()
+            self.scaler.mean_ = mean
+            self.scaler.var_ = var
+            self.scaler.scale_ = np.where(var > 0, np.sqrt(var), 1.0)
+            self.scaler.n_samples_seen_ = num_students
+            self.scaler.n_features_in_ = num_features
+        mean = self.scaler.mean_
+        self.is_fitted = True
+        self.row_hashes = None
+        
+        X_scaled = np.tile((-mean / self.scaler.scale_).astype(np.float32), (num_students, 1))
+        rows = np.repeat(np.arange(num_students), np.diff(offsets))
+        X_scaled[rows, indices] = (scores - mean[indices]) / self.scaler.scale_[indices]
+        
+        logger.info(f"Features: {num_features}")
+        logger.info(f"Using {self.target_columns} as target")
+        return torch.from_numpy(X_scaled), torch.from_numpy(np.ascontiguousarray(y, dtype=np.float32))
+    
+    def prepare_incremental_data(self, data_path: str) -> Dict:
+        """Reload training data for fine-tuning and update the scaler
+
+        Rows whose fingerprint was not seen at the last fit are marked as new.
+        With an unchanged feature layout the scaler is updated with
+        partial_fit on the new rows only; when assessment columns were added
+        or removed it is refit on the current data.
+        """
+        if not self.is_fitted:
+            raise ValueError("DataHandler must be fitted on training data first")
+        if getattr(self, 'feature_pipeline', None) is not None:
+            raise ValueError("Incremental updates are not supported with a feature pipeline")
+        if str(data_path).endswith('.npz'):
+            raise ValueError("Incremental updates need the training CSV, not grade histories")
+        
+        df = pd.read_csv(data_path)
+        logger.info(f"Loaded data with shape: {df.shape}")
+        
+        old_columns = list(self.feature_columns)
+        target_columns = list(getattr(self, 'target_columns', []))
+        if not target_columns:
+            target_columns = (['weighted_final_grade'] if 'weighted_final_grade' in df.columns
+                              else [old_columns[-1]])
+        # A target that was also a feature (last-column fallback) stays a feature
+        excluded_cols = ['student_id', 'weighted_final_grade'] + [
+            col for col in target_columns if col not in old_columns]
+        self.feature_columns = [col for col in df.columns if col not in excluded_cols]
+        self.target_columns = target_columns
+        columns_changed = self.feature_columns != old_columns
+        
+        hashes = self._hash_rows(df)
+        previous_hashes = getattr(self, 'row_hashes', None)
+        if previous_hashes is None or columns_changed:
+            is_new = np.ones(len(df), dtype=bool)
+        else:
+            is_new = ~np.isin(hashes, previous_hashes)
+        
+        X = df[self.feature_columns].values
+        y = df[target_columns].values
+        if columns_changed:
+            added = [col for col in self.feature_columns if col not in old_columns]
+            removed = [col for col in old_columns if col not in self.feature_columns]
+            logger.info(f"Feature columns changed: added {added}, removed {removed}")
+            self.scaler = StandardScaler().fit(X)
+        elif is_new.any():
+            self.scaler.partial_fit(X[is_new])
+        self.row_hashes = hashes
+        
+        logger.info(f"{int(is_new.sum())} new or changed rows out of {len(df)}")
+        
+        return {
+            "X": torch.FloatTensor(self.scaler.transform(X)),
+            "y": torch.FloatTensor(y.astype(np.float32)),
+            "is_new": is_new,
+            "columns_changed": columns_changed
+        }
+    
+    def _hash_rows(self, df: pd.DataFrame) -> np.ndarray:
+        """Per-row fingerprints over the student id, features and targets"""
+        columns = ['student_id'] + self.feature_columns + [
+            col for col in self.target_columns if col not in self.feature_columns]
+        columns = [col for col in columns if col in df.columns]
+        return pd.util.hash_pandas_object(df[columns], index=False).values
+    
     def prepare_student_data(self, student_data: Dict) -> torch.Tensor:
         """Convert student data dictionary to scaled feature tensor"""
         if not self.is_fitted:
             raise ValueError("DataHandler must be fitted on training data first")
         
+        if getattr(self, 'feature_pipeline', None) is not None:
+            return torch.from_numpy(self.feature_pipeline.transform_one(student_data))
+        
         try:
             # Convert student data to feature vector
             features = []
@@ -74,6 +267,19 @@ class DataHandler:
             logger.error(f"Error preparing student data: {e}")
             raise
     
+    def prepare_batch_data(self, students: Union[List[Dict], pd.DataFrame]) -> torch.Tensor:
+        """Convert many student dictionaries (or a frame of them) to one scaled feature tensor"""
+        if not self.is_fitted:
+            raise ValueError("DataHandler must be fitted on training data first")
+        
+        df = pd.DataFrame(students)
+        if getattr(self, 'feature_pipeline', None) is not None:
+            return torch.from_numpy(self.feature_pipeline.transform(df))
+        
+        # Missing features default to 0.0, as in prepare_student_data
+        X = df.reindex(columns=self.feature_columns).fillna(0.0).values.astype(np.float64)
+        return torch.FloatTensor(self.scaler.transform(X))
+    
     def split_data(self, X: torch.Tensor, y: torch.Tensor, 
                    validation_split: float = 0.2, random_state: int = 42) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
         """Split data into training and validation sets"""
@@ -84,6 +290,9 @@ class DataHandler:
         return {
             "feature_columns": self.feature_columns,
             "num_features": len(self.feature_columns),
+            "feature_pipeline": (self.feature_pipeline.get_pipeline_info()
+                                 if getattr(self, 'feature_pipeline', None) is not None else None),
+            "target_columns": getattr(self, 'target_columns', []),
             "scaler_fitted": self.is_fitted,
             "scaler_mean": self.scaler.mean_.tolist() if self.is_fitted else None,
             "scaler_scale": self.scaler.scale_.tolist() if self.is_fitted else None
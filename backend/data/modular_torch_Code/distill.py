@@ -0,0 +1,215 @@
+import os
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from sklearn.model_selection import train_test_split
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from model import StudentScorePredictor
+
+logger = logging.getLogger(__name__)
+
+# Scores in students_scores_*.csv are percentages
+SCORE_SCALE = 100.0
+
+def build_windows(df: pd.DataFrame, window: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """Sliding windows over assessment_score_* columns, as in ai_project_students_score_predictor.py
+
+    Windows are ordered row-major (every offset of the first student, then
+    the next student), the order the training script appends them in, so
+    train_test_split with the same random_state picks the same windows.
+    """
+    assessment_cols = sorted([col for col in df.columns if col.startswith("assessment_score_")])
+    scores = df[assessment_cols].values.astype(np.float64)
+    if scores.shape[1] < window + 1:
+        raise ValueError("Not enough data to train the model.")
+    windows = np.lib.stride_tricks.sliding_window_view(scores, window + 1, axis=1).reshape(-1, window + 1)
+    return windows[:, :window].copy(), windows[:, window].copy()
+
+def check_forest_split(df: pd.DataFrame, X_test: np.ndarray, window: int = 4,
+                       test_size: float = 0.2, random_state: int = 42):
+    """Raise if X_test differs from the test windows of the forest's training script"""
+    assessment_cols = sorted([col for col in df.columns if col.startswith("assessment_score_")])
+    # The training script's own loop, kept verbatim as the reference order
+    X, y = [], []
+    for row in df[assessment_cols].values:
+        for i in range(len(row) - window):
+            X.append(row[i:i + window])
+            y.append(row[i + window])
+    _, reference_test = train_test_split(np.array(X), test_size=test_size, random_state=random_state)
+    if reference_test.shape != X_test.shape or not np.array_equal(reference_test, X_test):
+        raise ValueError("Test windows differ from the forest's training split")
+
+def augment_windows(X: np.ndarray, n_samples: int, noise_std: float = 3.0,
+                    random_state: int = 42) -> np.ndarray:
+    """Create synthetic windows by mixing pairs of real windows and adding jitter"""
+    rng = np.random.default_rng(random_state)
+    first = X[rng.integers(0, len(X), n_samples)]
+    second = X[rng.integers(0, len(X), n_samples)]
+    mix = rng.uniform(0.0, 1.0, size=(n_samples, 1))
+    samples = mix * first + (1 - mix) * second
+    samples += rng.normal(0.0, noise_std, size=samples.shape)
+    return np.clip(samples, 0.0, SCORE_SCALE)
+
+class DistilledScorePredictor:
+    """Small surrogate of the random forest for latency-critical serving"""
+
+    def __init__(self, kind: str, window: int, model: Optional[StudentScorePredictor] = None,
+                 coef: Optional[np.ndarray] = None, intercept: float = 0.0):
+        self.kind = kind
+        self.window = window
+        self.model = model
+        self.coef = coef
+        self.intercept = intercept
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predict next scores (percent) for windows of previous scores"""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.window) / SCORE_SCALE
+        if self.kind == "linear":
+            return (X @ self.coef + self.intercept) * SCORE_SCALE
+
+        self.model.eval()
+        with torch.no_grad():
+            prediction = self.model(torch.from_numpy(X))
+        return prediction.numpy()[:, 0] * SCORE_SCALE
+
+    def save(self, path: str):
+        """Save the surrogate as a small torch checkpoint"""
+        save_dict = {'kind': self.kind, 'window': self.window}
+        if self.kind == "linear":
+            save_dict['coef'] = torch.from_numpy(np.asarray(self.coef, dtype=np.float32))
+            save_dict['intercept'] = float(self.intercept)
+        else:
+            save_dict['model_state_dict'] = self.model.state_dict()
+            save_dict['model_architecture'] = {
+                'input_size': self.window,
+                'hidden_sizes': [layer.out_features for layer in self.model.network
+                                 if isinstance(layer, nn.Linear)][:-1]
+            }
+        torch.save(save_dict, path)
+        logger.info(f"Surrogate saved to {path} ({os.path.getsize(path)} bytes)")
+
+    @classmethod
+    def load(cls, path: str) -> "DistilledScorePredictor":
+        """Load a surrogate saved with save()"""
+        save_dict = torch.load(path, map_location='cpu')
+        if save_dict['kind'] == "linear":
+            return cls("linear", save_dict['window'], coef=save_dict['coef'].numpy(),
+                       intercept=save_dict['intercept'])
+
+        arch = save_dict['model_architecture']
+        model = StudentScorePredictor(arch['input_size'], arch['hidden_sizes'])
+        model.load_state_dict(save_dict['model_state_dict'])
+        model.eval()
+        return cls("mlp", save_dict['window'], model=model)
+
+def _fit_mlp(X: np.ndarray, y: np.ndarray, hidden_sizes: List[int], epochs: int,
+             batch_size: int, learning_rate: float) -> StudentScorePredictor:
+    """Fit StudentScorePredictor on forest outputs with mini-batch Adam"""
+    X_tensor = torch.FloatTensor(X / SCORE_SCALE)
+    y_tensor = torch.FloatTensor(y / SCORE_SCALE).unsqueeze(1)
+
+    model = StudentScorePredictor(X.shape[1], hidden_sizes)
+    optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+    criterion = nn.MSELoss()
+
+    for epoch in range(epochs):
+        model.train()
+        permutation = torch.randperm(len(X_tensor))
+        epoch_loss = 0.0
+        for start in range(0, len(X_tensor), batch_size):
+            batch = permutation[start:start + batch_size]
+            optimizer.zero_grad()
+            loss = criterion(model(X_tensor[batch]), y_tensor[batch])
+            loss.backward()
+            optimizer.step()
+            epoch_loss += loss.item() * len(batch)
+        if epoch % 10 == 0:
+            logger.info(f"Epoch {epoch}: Distillation Loss: {epoch_loss / len(X_tensor):.6f}")
+
+    model.eval()
+    return model
+
+def distill_forest(forest, data_path: str, window: int = 4, kind: str = "mlp",
+                   n_augmented: int = 50000, hidden_sizes: List[int] = [16, 8],
+                   epochs: int = 30, batch_size: int = 256, learning_rate: float = 0.003,
+                   test_size: float = 0.2, random_state: int = 42) -> Tuple[DistilledScorePredictor, Dict]:
+    """Train a surrogate on forest outputs and report the accuracy gap on held-out windows"""
+    df = pd.read_csv(data_path)
+    X, y = build_windows(df, window)
+    # Same split as the forest's training script, so the test windows are unseen by both
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size,
+                                                        random_state=random_state)
+    check_forest_split(df, X_test, window, test_size, random_state)
+
+    X_distill = np.concatenate([X_train, augment_windows(X_train, n_augmented,
+                                                         random_state=random_state)])
+    y_distill = forest.predict(X_distill)
+    logger.info(f"Distilling on {len(X_distill)} windows ({n_augmented} augmented)")
+
+    torch.manual_seed(random_state)
+    if kind == "linear":
+        design = np.hstack([X_distill / SCORE_SCALE, np.ones((len(X_distill), 1))])
+        solution, *_ = np.linalg.lstsq(design, y_distill / SCORE_SCALE, rcond=None)
+        surrogate = DistilledScorePredictor("linear", window, coef=solution[:-1],
+                                            intercept=float(solution[-1]))
+    elif kind == "mlp":
+        model = _fit_mlp(X_distill, y_distill, hidden_sizes, epochs, batch_size, learning_rate)
+        surrogate = DistilledScorePredictor("mlp", window, model=model)
+    else:
+        raise ValueError(f"Unknown surrogate kind: {kind}")
+
+    forest_pred = forest.predict(X_test)
+    surrogate_pred = surrogate.predict(X_test)
+
+    def _rmse(a, b):
+        return float(np.sqrt(np.mean((a - b) ** 2)))
+
+    report = {
+        "kind": kind,
+        "test_windows": len(X_test),
+        "forest_rmse": _rmse(forest_pred, y_test),
+        "surrogate_rmse": _rmse(surrogate_pred, y_test),
+        "fidelity_rmse": _rmse(surrogate_pred, forest_pred)
+    }
+    report["accuracy_gap"] = report["surrogate_rmse"] - report["forest_rmse"]
+    logger.info(f"Forest RMSE: {report['forest_rmse']:.2f}%, "
+                f"Surrogate RMSE: {report['surrogate_rmse']:.2f}%")
+    return surrogate, report
+
+if __name__ == "__main__":
+    import argparse, json
+
+    parser = argparse.ArgumentParser(description="Distill the random forest into a compact surrogate")
+    parser.add_argument("--forest", required=True, help="Path to student_marks_predictor.pkl")
+    parser.add_argument("--data", required=True, help="students_scores_*.csv used to train the forest")
+    parser.add_argument("--output", default="student_marks_surrogate.pth")
+    parser.add_argument("--kind", choices=["mlp", "linear"], default="mlp")
+    parser.add_argument("--window", type=int, default=4)
+    parser.add_argument("--augmented", type=int, default=50000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    start = time.perf_counter()
+    forest = joblib.load(args.forest)
+    forest_load_ms = (time.perf_counter() - start) * 1000
+
+    surrogate, report = distill_forest(forest, args.data, window=args.window, kind=args.kind,
+                                       n_augmented=args.augmented)
+    surrogate.save(args.output)
+
+    start = time.perf_counter()
+    DistilledScorePredictor.load(args.output)
+    report.update({
+        "forest_bytes": os.path.getsize(args.forest),
+        "surrogate_bytes": os.path.getsize(args.output),
+        "forest_load_ms": forest_load_ms,
+        "surrogate_load_ms": (time.perf_counter() - start) * 1000
+    })
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,216 @@
+import os
+import copy
+import socket
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.optim as optim
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from typing import Dict, List, Optional
+import logging
+
+from model import StudentScorePredictor
+from trainer import ReinforcementLearningTrainer
+
+logger = logging.getLogger(__name__)
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _architecture(model: StudentScorePredictor) -> Dict:
+    linear_layers = [layer for layer in model.network if isinstance(layer, nn.Linear)]
+    return {
+        'input_size': linear_layers[0].in_features,
+        'hidden_sizes': [layer.out_features for layer in linear_layers[:-1]],
+        'output_size': linear_layers[-1].out_features
+    }
+
+def _worker(rank: int, world_size: int, port: int, threads: int, arch: Dict,
+            state_dict: Dict, learning_rate: float, X_train: torch.Tensor, y_train: torch.Tensor,
+            X_val: torch.Tensor, y_val: torch.Tensor, epochs: int, patience: int,
+            result_path: str):
+    """One data-parallel rank: trains on its shard, gradients are all-reduced by DDP"""
+    torch.set_num_threads(threads)
+    dist.init_process_group('gloo', init_method=f'tcp://127.0.0.1:{port}',
+                            rank=rank, world_size=world_size)
+    try:
+        torch.manual_seed(rank)
+        model = StudentScorePredictor(**arch)
+        model.load_state_dict(state_dict)
+        ddp_model = DistributedDataParallel(model)
+        optimizer = optim.Adam(ddp_model.parameters(), lr=learning_rate)
+        criterion = nn.MSELoss()
+
+        # Strided shards keep every rank's share within one row of the others
+        X_shard, y_shard = X_train[rank::world_size], y_train[rank::world_size]
+
+        training_history, validation_history = [], []
+        best_val_loss = float('inf')
+        best_model_state = copy.deepcopy(model.state_dict())
+        patience_counter = 0
+        stop = torch.zeros(1)
+
+        for epoch in range(epochs):
+            ddp_model.train()
+            optimizer.zero_grad()
+            train_loss = criterion(ddp_model(X_shard), y_shard)
+            train_loss.backward()
+            optimizer.step()
+
+            # Average shard losses so history matches a full-batch loss
+            loss_tensor = train_loss.detach().clone()
+            dist.all_reduce(loss_tensor)
+            loss_tensor /= world_size
+
+            if rank == 0:
+                model.eval()
+                with torch.no_grad():
+                    val_loss = criterion(model(X_val), y_val).item()
+                training_history.append(loss_tensor.item())
+                validation_history.append(val_loss)
+
+                if val_loss < best_val_loss:
+                    best_val_loss = val_loss
+                    patience_counter = 0
+                    best_model_state = copy.deepcopy(model.state_dict())
+                else:
+                    patience_counter += 1
+
+                if epoch % 10 == 0:
+                    logger.info(f"Epoch {epoch}: Train Loss: {loss_tensor.item():.4f}, "
+                                f"Val Loss: {val_loss:.4f}")
+                stop.fill_(1.0 if patience_counter >= patience else 0.0)
+
+            # Rank 0 owns early stopping; every rank must leave the loop together
+            dist.broadcast(stop, src=0)
+            if stop.item():
+                if rank == 0:
+                    logger.info(f"Early stopping at epoch {epoch}")
+                break
+
+        if rank == 0:
+            torch.save({
+                'best_model_state': best_model_state,
+                'training_history': training_history,
+                'validation_history': validation_history,
+                'best_val_loss': best_val_loss
+            }, result_path)
+    finally:
+        dist.destroy_process_group()
+
+def train_data_parallel(trainer: ReinforcementLearningTrainer, data_path: str,
+                        num_workers: int = 4, epochs: int = 100,
+                        validation_split: float = 0.2, patience: int = 10,
+                        target_columns: Optional[List[str]] = None,
+                        threads_per_worker: Optional[int] = None) -> Dict:
+    """Data-parallel version of ReinforcementLearningTrainer.initial_training
+
+    Spawns num_workers local processes with the gloo backend, each training on
+    a shard of the data. The best weights are loaded back into trainer.model,
+    so ModelManager.save_model writes the same checkpoint format as the
+    single-process path.
+    """
+    logger.info(f"Starting data-parallel training with {num_workers} workers...")
+
+    # Data is prepared once so every rank shares the parent's fitted scaler
+    X, y = trainer.data_handler.load_and_prepare_data(data_path, target_columns)
+    X_train, X_val, y_train, y_val = trainer.data_handler.split_data(X, y, validation_split)
+    output_size = trainer.model.network[-1].out_features
+    if y.shape[1] != output_size:
+        raise ValueError(f"Model has {output_size} outputs but data has {y.shape[1]} targets")
+
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+    learning_rate = trainer.optimizer.param_groups[0]['lr']
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_path = os.path.join(tmp_dir, 'result.pt')
+        mp.spawn(
+            _worker,
+            args=(num_workers, _free_port(), threads_per_worker, _architecture(trainer.model),
+                  trainer.model.state_dict(), learning_rate, X_train, y_train, X_val, y_val,
+                  epochs, patience, result_path),
+            nprocs=num_workers,
+            join=True
+        )
+        result = torch.load(result_path)
+
+    trainer.model.load_state_dict(result['best_model_state'])
+    trainer.best_model_state = result['best_model_state']
+    trainer.training_history.extend(result['training_history'])
+    trainer.validation_history.extend(result['validation_history'])
+
+    logger.info(f"Data-parallel training completed! Best validation loss: {result['best_val_loss']:.4f}")
+
+    return {
+        "final_train_loss": trainer.training_history[-1],
+        "final_val_loss": trainer.validation_history[-1],
+        "best_val_loss": result['best_val_loss'],
+        "epochs_trained": len(result['training_history']),
+        "num_workers": num_workers
+    }
+
+def make_synthetic_dataset(path: str, rows: int = 200000, assessments: int = 32,
+                           random_state: int = 42):
+    """Write a training_data.csv-shaped file of normalized scores for benchmarking"""
+    rng = np.random.default_rng(random_state)
+    ability = rng.uniform(0.3, 1.0, size=(rows, 1))
+    scores = np.clip(ability + rng.normal(0, 0.1, size=(rows, assessments)), 0, 1)
+    df = pd.DataFrame(scores, columns=[f"Quiz_{i:05d}" for i in range(assessments)])
+    df.insert(0, 'student_id', np.arange(rows))
+    df['weighted_final_grade'] = scores.mean(axis=1)
+    df.to_csv(path, index=False)
+
+def benchmark_scaling(data_path: str, worker_counts: List[int] = [1, 2, 4, 8],
+                      epochs: int = 30, hidden_sizes: List[int] = [64, 32, 16]) -> Dict:
+    """Time a fixed number of epochs for the single-process path and N data-parallel workers"""
+    input_size = len(pd.read_csv(data_path, nrows=0).columns) - 2  # student_id, target
+    results = {}
+
+    torch.manual_seed(0)
+    trainer = ReinforcementLearningTrainer(StudentScorePredictor(input_size, hidden_sizes))
+    start = time.perf_counter()
+    trainer.initial_training(data_path, epochs=epochs, patience=epochs)
+    results['single_process'] = {"seconds": time.perf_counter() - start}
+
+    for num_workers in worker_counts:
+        torch.manual_seed(0)
+        trainer = ReinforcementLearningTrainer(StudentScorePredictor(input_size, hidden_sizes))
+        start = time.perf_counter()
+        summary = train_data_parallel(trainer, data_path, num_workers=num_workers,
+                                      epochs=epochs, patience=epochs)
+        results[f"workers_{num_workers}"] = {
+            "seconds": time.perf_counter() - start,
+            "best_val_loss": summary['best_val_loss']
+        }
+
+    baseline = results['single_process']['seconds']
+    for key, value in results.items():
+        value['speedup'] = baseline / value['seconds']
+    return results
+
+if __name__ == "__main__":
+    import argparse, json
+
+    parser = argparse.ArgumentParser(description="Scaling benchmark for data-parallel training")
+    parser.add_argument("--data", type=str, help="Training CSV; a synthetic one is generated if omitted")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--epochs", type=int, default=30)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_path = args.data
+        if data_path is None:
+            data_path = os.path.join(tmp_dir, 'synthetic_training_data.csv')
+            make_synthetic_dataset(data_path, rows=args.rows)
+        print(json.dumps(benchmark_scaling(data_path, args.workers, args.epochs), indent=2))
@@ -0,0 +1,187 @@
+import math
+import threading
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Optional
+import logging
+
+from data_handler import DataHandler
+
+logger = logging.getLogger(__name__)
+
+# Bin edges in standardized units (scaler output); outer bins are open-ended
+DEFAULT_BIN_EDGES = np.array([-3.0, -2.0, -1.0, -0.5, 0.0, 0.5, 1.0, 2.0, 3.0])
+
+class DriftMonitor:
+    """Streaming input and error drift detection against the fitted scaler
+
+    Prediction inputs are standardized with the data handler's scaler, so the
+    training reference is mean 0 / variance 1 for every feature. Running
+    mean, variance (Welford) and a fixed-bin histogram are kept per feature,
+    which is O(1) memory per feature however many requests are observed.
+    Feedback errors are tracked as an exponentially weighted mean against a
+    baseline. Input signals need min_samples observed requests and the error
+    signal min_samples feedback errors, each counted on its own. When a
+    threshold is crossed, on_retrain is started once on a background thread,
+    until reset(), so the request that tripped it is never held up by it.
+    """
+
+    def __init__(self, data_handler: DataHandler, psi_threshold: float = 0.2,
+                 mean_shift_threshold: float = 0.5, error_ratio_threshold: float = 1.5,
+                 min_samples: int = 200, baseline_error: Optional[float] = None,
+                 error_smoothing: float = 0.05,
+                 on_retrain: Optional[Callable[[Dict], None]] = None,
+                 bin_edges: np.ndarray = DEFAULT_BIN_EDGES):
+        if not data_handler.is_fitted:
+            raise ValueError("DataHandler must be fitted on training data first")
+        self.data_handler = data_handler
+        self.psi_threshold = psi_threshold
+        self.mean_shift_threshold = mean_shift_threshold
+        self.error_ratio_threshold = error_ratio_threshold
+        self.min_samples = min_samples
+        self.error_smoothing = error_smoothing
+        self.on_retrain = on_retrain
+        self.bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        self.baseline_error = baseline_error
+        self.reference_proportions = self._normal_proportions()
+        self.reset()
+
+    def reset(self):
+        """Clear streaming state, e.g. after a retrain has been deployed"""
+        num_features = len(self.data_handler.feature_columns)
+        self.count = 0
+        self.mean = np.zeros(num_features)
+        self.m2 = np.zeros(num_features)
+        self.histogram = np.zeros((num_features, len(self.bin_edges) + 1))
+        self.error_count = 0
+        self.error_ewma = None
+        self._baseline_sum = 0.0
+        self.retrain_scheduled = False
+
+    def set_reference(self, X_scaled: np.ndarray):
+        """Use the training data's own histogram as the PSI reference"""
+        X_scaled = np.asarray(X_scaled, dtype=np.float64)
+        histogram = self._bin_counts(X_scaled)
+        self.reference_proportions = histogram / max(len(X_scaled), 1)
+
+    @classmethod
+    def from_training_data(cls, data_handler: DataHandler, data_path: str, **kwargs) -> "DriftMonitor":
+        """Build a monitor whose reference histogram comes from the training CSV"""
+        monitor = cls(data_handler, **kwargs)
+        df = pd.read_csv(data_path)
+        X = df.reindex(columns=data_handler.feature_columns, fill_value=0.0).values
+        monitor.set_reference(data_handler.scaler.transform(X))
+        return monitor
+
+    def observe(self, features: np.ndarray) -> Optional[Dict]:
+        """Record raw (unscaled) feature rows of incoming prediction requests"""
+        features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        return self.observe_scaled(self.data_handler.scaler.transform(features))
+
+    def observe_scaled(self, X_scaled: np.ndarray) -> Optional[Dict]:
+        """Record already standardized feature rows (the tensor fed to the model)"""
+        X_scaled = np.atleast_2d(np.asarray(X_scaled, dtype=np.float64))
+        batch_count = len(X_scaled)
+        batch_mean = X_scaled.mean(axis=0)
+        batch_m2 = ((X_scaled - batch_mean) ** 2).sum(axis=0)
+
+        # Chan et al. parallel update, exact for any batch size
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * batch_count / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * batch_count / total
+        self.count = total
+        self.histogram += self._bin_counts(X_scaled)
+
+        return self.check()
+
+    def observe_feedback(self, prediction_error: float) -> Optional[Dict]:
+        """Record the absolute error of a prediction reported through FeedbackManager"""
+        self.error_count += 1
+        if self.baseline_error is None:
+            # Without a validation baseline, the first min_samples errors define it
+            self._baseline_sum += prediction_error
+            if self.error_count >= self.min_samples:
+                self.baseline_error = self._baseline_sum / self.error_count
+            return None
+
+        if self.error_ewma is None:
+            self.error_ewma = prediction_error
+        else:
+            self.error_ewma += self.error_smoothing * (prediction_error - self.error_ewma)
+        return self.check()
+
+    def drift_score(self) -> Dict:
+        """Current per-feature drift statistics and the overall score"""
+        proportions = self.histogram / max(self.count, 1)
+        psi = self._psi(proportions, self.reference_proportions)
+        variance = self.m2 / max(self.count - 1, 1)
+        mean_shift = np.abs(self.mean)  # reference mean is 0 in scaled units
+
+        error_ratio = None
+        if self.error_ewma is not None and self.baseline_error:
+            error_ratio = self.error_ewma / self.baseline_error
+
+        return {
+            "samples": self.count,
+            "drift_score": float(psi.max()) if len(psi) else 0.0,
+            "feature_psi": dict(zip(self.data_handler.feature_columns, psi.round(4).tolist())),
+            "feature_mean_shift": dict(zip(self.data_handler.feature_columns, mean_shift.round(4).tolist())),
+            "feature_variance_ratio": dict(zip(self.data_handler.feature_columns, variance.round(4).tolist())),
+            "error_ratio": error_ratio,
+            "retrain_scheduled": self.retrain_scheduled
+        }
+
+    def check(self) -> Optional[Dict]:
+        """Schedule a retrain if any threshold is crossed; returns the report when it fires"""
+        if self.retrain_scheduled:
+            return None
+        input_ready = self.count >= self.min_samples
+        error_ready = self.error_count >= self.min_samples
+        if not (input_ready or error_ready):
+            return None
+
+        report = self.drift_score()
+        reasons = []
+        if input_ready and report["drift_score"] > self.psi_threshold:
+            reasons.append("input_psi")
+        if input_ready and max(report["feature_mean_shift"].values(), default=0.0) > self.mean_shift_threshold:
+            reasons.append("mean_shift")
+        if error_ready and report["error_ratio"] is not None and report["error_ratio"] > self.error_ratio_threshold:
+            reasons.append("feedback_error")
+        if not reasons:
+            return None
+
+        self.retrain_scheduled = True
+        report["retrain_scheduled"] = True
+        report["reasons"] = reasons
+        logger.warning(f"Drift detected ({', '.join(reasons)}), scheduling retrain")
+        if self.on_retrain is not None:
+            threading.Thread(target=self._run_retrain, args=(report,),
+                             name="drift-retrain", daemon=True).start()
+        return report
+
+    def _run_retrain(self, report: Dict):
+        try:
+            self.on_retrain(report)
+        except Exception as e:
+            logger.error(f"Retrain callback failed: {e}")
+
+    def _bin_counts(self, X_scaled: np.ndarray) -> np.ndarray:
+        num_bins = len(self.bin_edges) + 1
+        bins = np.searchsorted(self.bin_edges, X_scaled, side='right')
+        # One bincount over (feature, bin) pairs for all features at once
+        offsets = np.arange(X_scaled.shape[1]) * num_bins
+        counts = np.bincount((bins + offsets).ravel(), minlength=X_scaled.shape[1] * num_bins)
+        return counts.reshape(X_scaled.shape[1], num_bins)
+
+    def _normal_proportions(self) -> np.ndarray:
+        cdf = np.array([0.5 * (1 + math.erf(edge / math.sqrt(2))) for edge in self.bin_edges])
+        proportions = np.diff(np.concatenate([[0.0], cdf, [1.0]]))
+        return np.tile(proportions, (len(self.data_handler.feature_columns), 1))
+
+    @staticmethod
+    def _psi(actual: np.ndarray, expected: np.ndarray, eps: float = 1e-4) -> np.ndarray:
+        actual = np.clip(actual, eps, None)
+        expected = np.clip(expected, eps, None)
+        return ((actual - expected) * np.log(actual / expected)).sum(axis=1)
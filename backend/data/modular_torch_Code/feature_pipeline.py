@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from itertools import repeat
+from sklearn.preprocessing import StandardScaler
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+TRUE_STRINGS = ["true", "1", "1.0", "yes"]
+CATEGORY_SEPARATOR = "\x1f"
+
+def _to_bool(values: np.ndarray) -> np.ndarray:
+    """Vectorized truthiness for bools, 0/1 and "TRUE"/"FALSE" style strings"""
+    return np.isin(np.char.lower(values.astype(str)), TRUE_STRINGS).astype(np.float64)
+
+class FeaturePipeline:
+    """Fitted numeric/boolean/categorical encoding plus standard scaling
+
+    Output columns are numeric columns, then boolean columns as 0/1, then one
+    one-hot column per (categorical column, value) seen at fit time; all are
+    standardized with a StandardScaler. Categorical lookups go through one
+    combined vocabulary, so bulk frames and single request dicts are encoded
+    without looping over columns in Python.
+    """
+
+    def __init__(self, numeric_columns: List[str], boolean_columns: List[str] = [],
+                 categorical_columns: List[str] = []):
+        self.numeric_columns = list(numeric_columns)
+        self.boolean_columns = list(boolean_columns)
+        self.categorical_columns = list(categorical_columns)
+        self.scaler = StandardScaler()
+        self.feature_names = []
+        self.numeric_defaults = []
+        self.is_fitted = False
+
+    @classmethod
+    def for_student_scores(cls, target_column: str, columns: List[str]) -> "FeaturePipeline":
+        """Pipeline for the students_scores_*.csv schema, excluding the target"""
+        score_columns = sorted(col for col in columns
+                               if col.startswith("assessment_score_") and col != target_column)
+        return cls(
+            numeric_columns=["absence_days", "weekly_self_study_hours"] + score_columns,
+            boolean_columns=["part_time_job", "extracurricular_activities"],
+            categorical_columns=["career_aspiration"]
+        )
+
+    @property
+    def input_columns(self) -> List[str]:
+        return self.numeric_columns + self.boolean_columns + self.categorical_columns
+
+    def fit(self, df: pd.DataFrame) -> "FeaturePipeline":
+        """Learn categorical vocabularies, numeric defaults and scaling"""
+        self.numeric_defaults = df[self.numeric_columns].astype(np.float64).mean().tolist()
+
+        vocabulary = []
+        for col in self.categorical_columns:
+            vocabulary.extend(f"{col}{CATEGORY_SEPARATOR}{value}"
+                              for value in sorted(df[col].dropna().astype(str).unique()))
+        self._set_vocabulary(vocabulary)
+
+        self.feature_names = (self.numeric_columns + self.boolean_columns +
+                              [key.replace(CATEGORY_SEPARATOR, "=") for key in vocabulary])
+        self.scaler.fit(self._encode(df))
+        self.is_fitted = True
+        logger.info(f"Feature pipeline fitted: {len(self.feature_names)} output features")
+        return self
+
+    def fit_transform(self, df: pd.DataFrame) -> np.ndarray:
+        return self.fit(df).transform(df)
+
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """Encode and scale a whole frame"""
+        if not self.is_fitted:
+            raise ValueError("FeaturePipeline must be fitted first")
+        return self._scale(self._encode(df))
+
+    def transform_one(self, record: Dict) -> np.ndarray:
+        """Encode and scale a single request dict, shape (1, num_features)"""
+        if not self.is_fitted:
+            raise ValueError("FeaturePipeline must be fitted first")
+
+        row = np.zeros(len(self.feature_names))
+        num_numeric = len(self.numeric_columns)
+        num_dense = num_numeric + len(self.boolean_columns)
+        # map() over (column, default) pairs runs the lookups in C
+        row[:num_numeric] = list(map(record.get, self.numeric_columns, self.numeric_defaults))
+        row[num_numeric:num_dense] = _to_bool(np.array(list(map(record.get, self.boolean_columns))))
+
+        if self.categorical_columns:
+            keys = map(str.__add__, self._category_prefixes,
+                       map(str, map(record.get, self.categorical_columns)))
+            positions = np.fromiter(map(self._category_lookup.get, keys, repeat(-1)), dtype=np.int64)
+            row[num_dense + positions[positions >= 0]] = 1.0
+
+        return self._scale(row.reshape(1, -1))
+
+    def _encode(self, df: pd.DataFrame) -> np.ndarray:
+        df = df.reindex(columns=self.input_columns)
+        numeric = df[self.numeric_columns].astype(np.float64)
+        numeric = numeric.fillna(dict(zip(self.numeric_columns, self.numeric_defaults))).values
+        booleans = _to_bool(df[self.boolean_columns].values)
+
+        one_hot = np.zeros((len(df), len(self._category_index)))
+        if self.categorical_columns:
+            values = df[self.categorical_columns].astype(str).values.astype(object)
+            keys = np.array(self._category_prefixes, dtype=object) + values
+            positions = self._category_index.get_indexer(keys.ravel()).reshape(keys.shape)
+            rows, cols = np.nonzero(positions >= 0)
+            one_hot[rows, positions[rows, cols]] = 1.0
+
+        return np.hstack([numeric, booleans, one_hot])
+
+    def _scale(self, X: np.ndarray) -> np.ndarray:
+        # Plain array math skips sklearn's per-call validation on the request path
+        return ((X - self.scaler.mean_) / self.scaler.scale_).astype(np.float32)
+
+    def _set_vocabulary(self, vocabulary: List[str]):
+        self._category_index = pd.Index(vocabulary)
+        self._category_lookup = {key: i for i, key in enumerate(vocabulary)}
+        self._category_prefixes = [f"{col}{CATEGORY_SEPARATOR}" for col in self.categorical_columns]
+
+    def get_pipeline_info(self) -> Dict:
+        """Get information about the fitted pipeline"""
+        return {
+            "numeric_columns": self.numeric_columns,
+            "boolean_columns": self.boolean_columns,
+            "categorical_columns": self.categorical_columns,
+            "feature_names": self.feature_names,
+            "num_features": len(self.feature_names),
+            "fitted": self.is_fitted
+        }
+
+    def get_config(self) -> Dict:
+        """JSON-serializable encoding state, without the scaler arrays"""
+        if not self.is_fitted:
+            raise ValueError("FeaturePipeline must be fitted first")
+        return {
+            "numeric_columns": self.numeric_columns,
+            "boolean_columns": self.boolean_columns,
+            "categorical_columns": self.categorical_columns,
+            "numeric_defaults": [float(value) for value in self.numeric_defaults],
+            "vocabulary": list(self._category_index),
+            "feature_names": self.feature_names
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict, mean: np.ndarray, scale: np.ndarray) -> "FeaturePipeline":
+        """Fitted pipeline from get_config() plus the scaler's mean and scale arrays"""
+        pipeline = cls(config["numeric_columns"], config["boolean_columns"], config["categorical_columns"])
+        pipeline.numeric_defaults = list(config["numeric_defaults"])
+        pipeline.feature_names = list(config["feature_names"])
+        pipeline._set_vocabulary(list(config["vocabulary"]))
+        pipeline.scaler.mean_ = mean
+        pipeline.scaler.scale_ = scale
+        pipeline.is_fitted = True
+        return pipeline
@@ -1,5 +1,5 @@
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,7 +13,8 @@ class FeedbackManager:
         self.feedback_history = []
         
     def add_feedback(self, student_data: Dict, predicted_score: float, 
-                    actual_score: float, teacher_feedback: str) -> Dict:
+                    actual_score: float, teacher_feedback: str,
+                    target_column: Optional[str] = None) -> Dict:
         """Add teacher feedback for reinforcement learning"""
         
         # Convert feedback to reward signal
@@ -23,6 +24,7 @@ class FeedbackManager:
             'student_data': student_data,
             'predicted_score': predicted_score,
             'actual_score': actual_score,
+            'target_column': target_column,
             'teacher_feedback': teacher_feedback,
             'reward': reward,
             'prediction_error': abs(predicted_score - actual_score),
@@ -0,0 +1,172 @@
+import json
+import itertools
+import numpy as np
+import pandas as pd
+import torch
+from typing import Dict, List, Optional
+import logging
+
+from trainer import ReinforcementLearningTrainer
+
+logger = logging.getLogger(__name__)
+
+class GradePlanner:
+    """What a student must score on remaining assessments to reach a target grade
+
+    Every combination of grid scores for the remaining assessments is graded
+    in one batch and the feasible combination with the lowest total score
+    wins (ties go to the lowest peak score). Two evaluators grade it:
+      - "formula": the weighted_final_grade definition from preprocess.py
+      - "model": the trained model, fed through the data handler's transform
+    Scores are normalized (0-1) and weights come from assessment_metadata.json.
+    """
+
+    def __init__(self, metadata_path: str, trainer: Optional[ReinforcementLearningTrainer] = None,
+                 grid_step: float = 0.1, max_combinations: int = 20000,
+                 chunk_rows: int = 65536):
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        self.columns = list(metadata["assessment_weights"].keys())
+        self.weights = np.array([metadata["assessment_weights"][col] for col in self.columns],
+                                dtype=np.float64)
+        self.trainer = trainer
+        self.grid_step = grid_step
+        self.levels = np.round(np.arange(0.0, 1.0 + grid_step / 2, grid_step), 6)
+        self.max_combinations = max_combinations
+        self.chunk_rows = chunk_rows
+
+    def _grade_matrix(self, students: List[Dict]) -> np.ndarray:
+        """(students, assessments) normalized grades, NaN where not yet graded"""
+        return np.array([[student.get(col, np.nan) for col in self.columns] for student in students],
+                        dtype=np.float64).reshape(len(students), len(self.columns))
+
+    def plan_class(self, student_ids: List[str], students: List[Dict], target: float,
+                   method: str = "formula", remaining: Optional[List[str]] = None) -> List[Dict]:
+        """Minimal plan per student; assessments missing from a student's grades are remaining
+
+        With remaining, only those assessments are planned and any other
+        ungraded assessment counts as zero.
+        """
+        grades = self._grade_matrix(students)
+        if remaining is not None:
+            unknown = [col for col in remaining if col not in self.columns]
+            if unknown:
+                raise ValueError(f"Unknown assessments: {unknown}")
+            is_remaining = np.zeros_like(grades, dtype=bool)
+            is_remaining[:, [self.columns.index(col) for col in remaining]] = True
+            grades = np.where(is_remaining, np.nan, np.nan_to_num(grades))
+        if method == "formula":
+            plans = self._plan_formula(grades, target)
+        elif method == "model":
+            plans = self._plan_model(grades, students, target)
+        else:
+            raise ValueError(f"Unknown planning method: {method}")
+
+        for student_id, plan in zip(student_ids, plans):
+            plan["student_id"] = student_id
+            plan["target"] = target
+            plan["method"] = method
+        return plans
+
+    def plan(self, student_id: str, student_data: Dict, target: float,
+             method: str = "formula", remaining: Optional[List[str]] = None) -> Dict:
+        return self.plan_class([student_id], [student_data], target, method, remaining)[0]
+
+    def _plan_formula(self, grades: np.ndarray, target: float) -> List[Dict]:
+        total_weight = self.weights.sum()
+        earned = np.nansum(grades * self.weights, axis=1)
+
+        # weighted_final_grade of each candidate, in closed form
+        def evaluate(rows: np.ndarray, remaining_cols: List[int], combinations: np.ndarray) -> np.ndarray:
+            added = combinations.astype(np.float64) @ self.weights[remaining_cols]
+            return (earned[rows, None] + added[None, :]) / total_weight
+
+        return self._search(grades, target, evaluate)
+
+    def _plan_model(self, grades: np.ndarray, students: List[Dict], target: float) -> List[Dict]:
+        if self.trainer is None:
+            raise ValueError("Model planning needs a trained trainer")
+        data_handler = self.trainer.data_handler
+        if getattr(data_handler, 'feature_pipeline', None) is not None:
+            model_inputs = set(data_handler.feature_pipeline.input_columns)
+        else:
+            model_inputs = set(data_handler.feature_columns)
+        missing = [col for j, col in enumerate(self.columns)
+                   if np.isnan(grades[:, j]).any() and col not in model_inputs]
+        if missing:
+            raise ValueError(f"Assessments not used by the model: {missing}")
+
+        # Student records with graded assessments filled in and the rest at 0;
+        # other fields (e.g. demographics) go to the data handler untouched
+        base = pd.DataFrame(students, index=range(len(students)))
+        base[self.columns] = np.nan_to_num(grades)
+
+        def evaluate(rows: np.ndarray, remaining_cols: List[int], combinations: np.ndarray) -> np.ndarray:
+            frame = base.iloc[np.repeat(rows, len(combinations))].reset_index(drop=True)
+            remaining_names = [self.columns[j] for j in remaining_cols]
+            if remaining_names:
+                frame[remaining_names] = np.tile(combinations, (len(rows), 1))
+            X = data_handler.prepare_batch_data(frame)
+            output = self.trainer._forward(X)[:, 0].numpy()
+            return output.reshape(len(rows), len(combinations))
+
+        self.trainer.model.eval()
+        with torch.no_grad():
+            return self._search(grades, target, evaluate)
+
+    def _search(self, grades: np.ndarray, target: float, evaluate) -> List[Dict]:
+        """Lowest-total-score grid combination reaching target, per student
+
+        evaluate(rows, remaining_cols, combinations) returns the projected
+        grade of every (row, combination) pair; both methods share this
+        objective so they only differ in how a candidate is graded.
+        """
+        plans = [None] * len(grades)
+        remaining = np.isnan(grades)
+        # Students with the same remaining assessments share one candidate grid
+        groups = {}
+        for i, row in enumerate(remaining):
+            groups.setdefault(tuple(np.flatnonzero(row)), []).append(i)
+
+        for remaining_cols, rows in groups.items():
+            remaining_cols = list(remaining_cols)
+            remaining_names = [self.columns[j] for j in remaining_cols]
+            combinations = self._combinations(len(remaining_cols))
+            rows = np.array(rows)
+
+            predictions = np.empty((len(rows), len(combinations)), dtype=np.float64)
+            per_chunk = max(1, self.chunk_rows // len(combinations))
+            for start in range(0, len(rows), per_chunk):
+                chunk = rows[start:start + per_chunk]
+                predictions[start:start + len(chunk)] = evaluate(chunk, remaining_cols, combinations)
+
+            # Lowest total score among feasible combinations, then the lowest peak score
+            cost = combinations.sum(axis=1) + 1e-3 * combinations.max(axis=1, initial=0.0)
+            # Small tolerance so float noise does not reject an exact hit
+            feasible = predictions >= target - 1e-9
+            masked_cost = np.where(feasible, cost[None, :], np.inf)
+            best = masked_cost.argmin(axis=1)
+            fallback = predictions.argmax(axis=1)
+            for k, i in enumerate(rows):
+                is_feasible = bool(feasible[k].any())
+                choice = best[k] if is_feasible else fallback[k]
+                status = ("already_met" if is_feasible and cost[choice] == 0 else
+                          "feasible" if is_feasible else "infeasible")
+                plans[i] = {
+                    "status": status,
+                    "required_scores": {col: round(float(score), 4)
+                                        for col, score in zip(remaining_names, combinations[choice])},
+                    "projected_grade": round(float(predictions[k, choice]), 4),
+                    "combinations_evaluated": len(combinations)
+                }
+        return plans
+
+    def _combinations(self, num_remaining: int) -> np.ndarray:
+        """Score grid over the remaining assessments, uniform levels only if the full grid is too large"""
+        if num_remaining == 0:
+            return np.zeros((1, 0), dtype=np.float32)
+        if len(self.levels) ** num_remaining > self.max_combinations:
+            logger.info(f"{len(self.levels)}^{num_remaining} combinations exceed "
+                        f"{self.max_combinations}, using uniform scores")
+            return np.repeat(self.levels[:, None], num_remaining, axis=1).astype(np.float32)
+        return np.array(list(itertools.product(self.levels, repeat=num_remaining)), dtype=np.float32)
@@ -5,7 +5,8 @@ from typing import List
 class StudentScorePredictor(nn.Module):
     """Neural network for predicting student scores with reinforcement learning capabilities"""
     
-    def __init__(self, input_size: int, hidden_sizes: List[int] = [64, 32, 16]):
+    def __init__(self, input_size: int, hidden_sizes: List[int] = [64, 32, 16],
+                 output_size: int = 1):
         super(StudentScorePredictor, self).__init__()
         
         layers = []
@@ -19,8 +20,9 @@ class StudentScorePredictor(nn.Module):
             ])
             prev_size = hidden_size
         
-        # Output layer for score prediction
-        layers.append(nn.Linear(prev_size, 1))
+        # Output layer for score prediction; with output_size > 1 every unit is
+        # one assessment's head on top of the shared hidden layers
+        layers.append(nn.Linear(prev_size, output_size))
         
         self.network = nn.Sequential(*layers)
     
@@ -35,5 +37,6 @@ class StudentScorePredictor(nn.Module):
         return {
             "total_parameters": total_params,
             "trainable_parameters": trainable_params,
+            "output_size": self.network[-1].out_features,
             "architecture": str(self.network)
         }
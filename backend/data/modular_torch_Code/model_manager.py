@@ -1,21 +1,28 @@
 import pickle
 import json
+import sqlite3
 import torch
 from typing import Dict, Optional
 import logging
+from contextlib import contextmanager
 from pathlib import Path
 
 from model import StudentScorePredictor
 from trainer import ReinforcementLearningTrainer
+from similarity_index import SimilarityIndex, INDEX_FILE
 
 logger = logging.getLogger(__name__)
 
 class ModelManager:
     """Handles model saving, loading, and version management"""
     
-    def __init__(self, model_dir: str = "models"):
+    def __init__(self, model_dir: str = "models", keep_last: Optional[int] = None):
         self.model_dir = Path(model_dir)
         self.model_dir.mkdir(exist_ok=True)
+        # Versions beyond the newest keep_last are garbage-collected after each save
+        self.keep_last = keep_last
+        self.registry_path = self.model_dir / "registry.db"
+        self._init_registry()
         
     def save_model(self, trainer: ReinforcementLearningTrainer, 
                    model_name: str = "student_predictor", 
@@ -34,7 +41,8 @@ class ModelManager:
                 'model_state_dict': trainer.model.state_dict(),
                 'model_architecture': {
                     'input_size': trainer.model.network[0].in_features,
-                    'hidden_sizes': self._extract_hidden_sizes(trainer.model)
+                    'hidden_sizes': self._extract_hidden_sizes(trainer.model),
+                    'output_size': trainer.model.network[-1].out_features
                 }
             }, model_file)
             
@@ -55,15 +63,23 @@ class ModelManager:
                 'version': version,
                 'model_name': model_name,
                 'feature_columns': trainer.data_handler.feature_columns,
+                'target_columns': getattr(trainer.data_handler, 'target_columns', []),
                 'model_info': trainer.model.get_model_info(),
                 'training_epochs': len(trainer.training_history),
-                'feedback_count': len(trainer.feedback_manager.feedback_history)
+                'feedback_count': len(trainer.feedback_manager.feedback_history),
+                'precision': trainer.precision,
+                'precision_parity': trainer.precision_parity
             }
             
             metadata_file = model_path / "metadata.json"
             with open(metadata_file, 'w') as f:
                 json.dump(metadata, f, indent=2)
             
+            # The version becomes visible only once all files are on disk
+            self._register_version(model_name, version, model_path, metadata)
+            if self.keep_last is not None:
+                self.garbage_collect(model_name)
+            
             logger.info(f"Model saved successfully to {model_path}")
             
             return {
@@ -102,12 +118,14 @@ class ModelManager:
             arch = checkpoint['model_architecture']
             model = StudentScorePredictor(
                 input_size=arch['input_size'],
-                hidden_sizes=arch['hidden_sizes']
+                hidden_sizes=arch['hidden_sizes'],
+                output_size=arch.get('output_size', 1)
             )
             model.load_state_dict(checkpoint['model_state_dict'])
             
-            # Create trainer
-            trainer = ReinforcementLearningTrainer(model)
+            # Create trainer; versions saved before precision was recorded serve in fp32
+            trainer = ReinforcementLearningTrainer(model, precision=metadata.get('precision', 'fp32'))
+            trainer.precision_parity = metadata.get('precision_parity')
             
             # Load training components
             components_file = model_path / "components.pkl"
@@ -127,48 +145,185 @@ class ModelManager:
             logger.error(f"Error loading model: {e}")
             raise
     
+    def save_similarity_index(self, index: SimilarityIndex, model_name: str = "student_predictor",
+                              version: Optional[str] = None) -> Dict:
+        """Store a similarity index in the model version directory it was built for"""
+        try:
+            if version is None:
+                version = self._get_latest_version(model_name)
+            model_path = self.model_dir / f"{model_name}_v{version}"
+            if not model_path.exists():
+                raise FileNotFoundError(f"Model {model_name} version {version} not found")
+            index.save(model_path / INDEX_FILE)
+            return {"status": "success", "path": str(model_path / INDEX_FILE), "version": version}
+        except Exception as e:
+            logger.error(f"Error saving similarity index: {e}")
+            return {"status": "error", "message": str(e)}
+    
+    def load_similarity_index(self, trainer: ReinforcementLearningTrainer,
+                              model_name: str = "student_predictor",
+                              version: Optional[str] = None) -> Optional[SimilarityIndex]:
+        """Load the index saved next to a model version, bound to the trainer's data handler"""
+        if version is None:
+            version = self._get_latest_version(model_name)
+        index_file = self.model_dir / f"{model_name}_v{version}" / INDEX_FILE
+        if not index_file.exists():
+            return None
+        return SimilarityIndex.load(index_file, trainer.data_handler)
+    
+    def fine_tune_latest(self, data_path: str, model_name: str = "student_predictor",
+                         **fine_tune_kwargs) -> Dict:
+        """Fine-tune the latest version on new data and save it as a new version"""
+        try:
+            trainer = self.load_model(model_name)
+            result = trainer.fine_tune(data_path, **fine_tune_kwargs)
+            if result["status"] != "success":
+                return result
+            result["save"] = self.save_model(trainer, model_name)
+            return result
+        except Exception as e:
+            logger.error(f"Error fine-tuning model: {e}")
+            return {"status": "error", "message": str(e)}
+    
     def list_models(self) -> Dict:
         """List all available models and versions"""
         models = {}
-        for model_path in self.model_dir.iterdir():
-            if model_path.is_dir():
-                try:
-                    # Parse model name and version
-                    name_version = model_path.name
-                    if '_v' in name_version:
-                        model_name, version = name_version.rsplit('_v', 1)
-                    else:
-                        continue
-                    # Load metadata
-                    metadata_file = model_path / "metadata.json"
-                    if metadata_file.exists():
-                        with open(metadata_file, 'r') as f:
-                            metadata = json.load(f)
-                        if model_name not in models:
-                            models[model_name] = []
-                        models[model_name].append({
-                            'version': version,
-                            'path': str(model_path),
-                            'training_epochs': metadata.get('training_epochs', 0),
-                            'feedback_count': metadata.get('feedback_count', 0),
-                            'feature_columns': metadata.get('feature_columns', [])
-                        })
-                except Exception as e:
-                    logger.warning(f"Error reading model {model_path}: {e}")
-                    continue
-        # Sort versions for each model
-        for model_name in models:
-            models[model_name].sort(key=lambda x: x['version'], reverse=True)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT model_name, version, path, training_epochs, feedback_count, feature_columns "
+                "FROM versions ORDER BY model_name, version DESC"
+            ).fetchall()
+        for model_name, version, path, training_epochs, feedback_count, feature_columns in rows:
+            models.setdefault(model_name, []).append({
+                'version': version,
+                'path': path,
+                'training_epochs': training_epochs,
+                'feedback_count': feedback_count,
+                'feature_columns': json.loads(feature_columns)
+            })
         return models
     
+    def promote(self, model_name: str, version: str) -> Dict:
+        """Point the production alias of a model at a saved version"""
+        with self._connect() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM versions WHERE model_name = ? AND version = ?", (model_name, version)
+            ).fetchone()
+            if not exists:
+                return {"status": "error", "message": "Model not found"}
+            # Each promotion is pushed on a per-model stack so rollback can pop it
+            conn.execute(
+                "INSERT INTO production (model_name, seq, version) VALUES (?, "
+                "(SELECT COALESCE(MAX(seq), 0) + 1 FROM production WHERE model_name = ?), ?)",
+                (model_name, model_name, version)
+            )
+        logger.info(f"Promoted {model_name} version {version} to production")
+        return {"status": "success", "model_name": model_name, "production_version": version}
+    
+    def rollback(self, model_name: str) -> Dict:
+        """Restore the production alias to the previously promoted version"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, version FROM production WHERE model_name = ? ORDER BY seq DESC LIMIT 2",
+                (model_name,)
+            ).fetchall()
+            if len(rows) < 2:
+                return {"status": "error", "message": "No previous production version"}
+            conn.execute("DELETE FROM production WHERE model_name = ? AND seq = ?",
+                         (model_name, rows[0][0]))
+        logger.info(f"Rolled back {model_name} production from {rows[0][1]} to {rows[1][1]}")
+        return {"status": "success", "model_name": model_name, "production_version": rows[1][1]}
+    
+    def get_production_version(self, model_name: str) -> Optional[str]:
+        """Version currently behind the production alias, if any"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT version FROM production WHERE model_name = ? ORDER BY seq DESC LIMIT 1",
+                (model_name,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def load_production_model(self, model_name: str = "student_predictor") -> ReinforcementLearningTrainer:
+        """Load the promoted version of a model"""
+        version = self.get_production_version(model_name)
+        if version is None:
+            raise ValueError(f"No production version for model {model_name}")
+        return self.load_model(model_name, version)
+    
+    def garbage_collect(self, model_name: Optional[str] = None,
+                        keep_last: Optional[int] = None) -> Dict:
+        """Delete all but the newest keep_last versions, keeping production and its rollback target"""
+        keep_last = self.keep_last if keep_last is None else keep_last
+        if keep_last is None:
+            return {"status": "error", "message": "No retention policy configured"}
+        
+        with self._connect() as conn:
+            names = [model_name] if model_name else [
+                row[0] for row in conn.execute("SELECT DISTINCT model_name FROM versions")]
+            expired = []
+            for name in names:
+                expired.extend(conn.execute(
+                    "SELECT model_name, version FROM versions WHERE model_name = ? "
+                    "AND version NOT IN (SELECT version FROM production WHERE model_name = ? "
+                    "ORDER BY seq DESC LIMIT 2) "
+                    "ORDER BY version DESC LIMIT -1 OFFSET ?",
+                    (name, name, keep_last)
+                ).fetchall())
+        
+        deleted = []
+        for name, version in expired:
+            if self.delete_model(name, version)["status"] == "success":
+                deleted.append(f"{name}_v{version}")
+        if deleted:
+            logger.info(f"Garbage-collected {len(deleted)} model versions")
+        return {"status": "success", "deleted": deleted}
+    
+    def rebuild_registry(self) -> Dict:
+        """Re-index every model directory, e.g. for folders saved before the registry existed"""
+        count = 0
+        for model_path in self.model_dir.iterdir():
+            if not model_path.is_dir() or '_v' not in model_path.name:
+                continue
+            metadata_file = model_path / "metadata.json"
+            if not metadata_file.exists():
+                continue
+            try:
+                model_name, version = model_path.name.rsplit('_v', 1)
+                with open(metadata_file, 'r') as f:
+                    metadata = json.load(f)
+                self._register_version(model_name, version, model_path, metadata)
+                count += 1
+            except Exception as e:
+                logger.warning(f"Error reading model {model_path}: {e}")
+                continue
+        logger.info(f"Registry rebuilt with {count} model versions")
+        return {"status": "success", "versions_indexed": count}
+    
     def delete_model(self, model_name: str, version: str) -> Dict:
-        """Delete a specific model version"""
+        """Delete a specific model version
+        
+        The production version and the version rollback would restore are
+        refused; older promotions of the deleted version are dropped from the
+        production stack so rollback never lands on a missing file.
+        """
         try:
             model_path = self.model_dir / f"{model_name}_v{version}"
             
             if not model_path.exists():
                 return {"status": "error", "message": "Model not found"}
             
+            with self._connect() as conn:
+                protected = [row[0] for row in conn.execute(
+                    "SELECT version FROM production WHERE model_name = ? ORDER BY seq DESC LIMIT 2",
+                    (model_name,))]
+                if version in protected:
+                    return {"status": "error",
+                            "message": "Cannot delete the production version or its rollback target"}
+                conn.execute("DELETE FROM production WHERE model_name = ? AND version = ?",
+                             (model_name, version))
+                conn.execute("DELETE FROM versions WHERE model_name = ? AND version = ?",
+                             (model_name, version))
+            
             # Remove all files in the model directory
             for file_path in model_path.iterdir():
                 file_path.unlink()
@@ -191,11 +346,53 @@ class ModelManager:
     
     def _get_latest_version(self, model_name: str) -> str:
         """Get the latest version of a model"""
-        models = self.list_models()
-        if model_name not in models or not models[model_name]:
+        # Index lookup on the (model_name, version) primary key
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT MAX(version) FROM versions WHERE model_name = ?", (model_name,)
+            ).fetchone()
+        if row[0] is None:
             raise ValueError(f"No versions found for model {model_name}")
         
-        return models[model_name][0]['version']  # Already sorted in descending order
+        return row[0]
+    
+    @contextmanager
+    def _connect(self):
+        """Registry connection that commits on success and rolls back on error"""
+        conn = sqlite3.connect(self.registry_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def _init_registry(self):
+        """Create the registry tables, indexing existing model folders on first use"""
+        is_new = not self.registry_path.exists()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS versions ("
+                "model_name TEXT NOT NULL, version TEXT NOT NULL, path TEXT NOT NULL, "
+                "training_epochs INTEGER, feedback_count INTEGER, feature_columns TEXT, "
+                "PRIMARY KEY (model_name, version))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS production ("
+                "model_name TEXT NOT NULL, seq INTEGER NOT NULL, version TEXT NOT NULL, "
+                "PRIMARY KEY (model_name, seq))"
+            )
+        if is_new:
+            self.rebuild_registry()
+    
+    def _register_version(self, model_name: str, version: str, model_path: Path,
+                          metadata: Dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO versions (model_name, version, path, training_epochs, "
+                "feedback_count, feature_columns) VALUES (?, ?, ?, ?, ?, ?)",
+                (model_name, version, str(model_path), metadata.get('training_epochs', 0),
+                 metadata.get('feedback_count', 0), json.dumps(metadata.get('feature_columns', [])))
+            )
     
     def _extract_hidden_sizes(self, model: StudentScorePredictor) -> list:
         """Extract hidden layer sizes from model architecture"""
@@ -0,0 +1,248 @@
+import sys
+import json
+import threading
+import numpy as np
+import pandas as pd
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+import logging
+
+from model import StudentScorePredictor
+from trainer import ReinforcementLearningTrainer
+from model_manager import ModelManager
+
+logger = logging.getLogger(__name__)
+
+UNASSIGNED_COURSE = "unassigned"
+
+def course_model_name(course_id: str) -> str:
+    """Name under which a course's model versions are stored"""
+    return f"course_{course_id}"
+
+def split_training_data_by_course(training_data_path: str, assessments_path: str,
+                                  courses_path: str, output_dir: str) -> Dict[str, str]:
+    """Write one training CSV per course from the global training_data.csv
+
+    Columns follow preprocess.py ({type}_{id[:5]}). Assessments without a
+    course_id belong to the only course when there is exactly one, otherwise
+    to an "unassigned" shard. weighted_final_grade is recomputed from each
+    course's own weightages.
+    """
+    df = pd.read_csv(training_data_path)
+    with open(assessments_path) as f:
+        assessments = json.load(f)
+    with open(courses_path) as f:
+        courses = json.load(f)
+
+    default_course = courses[0]["_id"] if len(courses) == 1 else UNASSIGNED_COURSE
+    course_columns: Dict[str, List[str]] = {}
+    weights: Dict[str, float] = {}
+    for a in assessments:
+        column = f"{a['type']}_{a['_id'][:5]}"
+        if column not in df.columns:
+            continue
+        course_id = a.get("course_id") or default_course
+        course_columns.setdefault(course_id, []).append(column)
+        weights[column] = int(a.get("weightage", 0)) / 100.0
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    written = {}
+    for course_id, columns in course_columns.items():
+        course_df = df[['student_id'] + columns].copy()
+        w = np.array([weights[col] for col in columns])
+        total_weight = w.sum()
+        course_df['weighted_final_grade'] = (
+            course_df[columns].values @ w / total_weight if total_weight > 0 else 0.0
+        )
+        path = output_path / f"training_data_{course_id}.csv"
+        course_df.to_csv(path, index=False)
+        written[course_id] = str(path)
+        logger.info(f"Course {course_id}: {len(columns)} assessments -> {path}")
+
+    return written
+
+def train_course_models(course_data: Dict[str, str], model_manager: ModelManager,
+                        hidden_sizes: List[int] = [64, 32, 16], epochs: int = 100) -> Dict:
+    """Train and save one StudentScorePredictor per course"""
+    results = {}
+    for course_id, data_path in course_data.items():
+        input_size = len(pd.read_csv(data_path, nrows=0).columns) - 2  # student_id, target
+        trainer = ReinforcementLearningTrainer(StudentScorePredictor(input_size, hidden_sizes))
+        training = trainer.initial_training(data_path, epochs=epochs)
+        saved = model_manager.save_model(trainer, model_name=course_model_name(course_id))
+        results[course_id] = {"training": training, "save": saved}
+    return results
+
+def _deep_size(obj, seen: Optional[set] = None) -> int:
+    """sys.getsizeof over nested dicts, lists and arrays, counting shared objects once"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    return size
+
+class CourseModelPool:
+    """Loads per-course models on demand and keeps them within a memory budget
+
+    Models are kept in LRU order and the least recently used ones are evicted
+    once the estimated footprint exceeds memory_budget_mb. Request counts are
+    persisted so preload() can warm the hottest courses on the next start.
+    """
+
+    def __init__(self, model_manager: ModelManager, memory_budget_mb: float = 256.0,
+                 stats_file: Optional[str] = None):
+        self.model_manager = model_manager
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.stats_file = Path(stats_file) if stats_file else model_manager.model_dir / "pool_stats.json"
+        self.models: "OrderedDict[str, ReinforcementLearningTrainer]" = OrderedDict()
+        self.model_sizes: Dict[str, int] = {}
+        self.memory_used = 0
+        self.request_counts = Counter(self._load_stats())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # course_id -> Event set when an in-flight load finishes
+        self._loading: Dict[str, threading.Event] = {}
+
+    def get(self, course_id: str) -> ReinforcementLearningTrainer:
+        """Return the trainer for a course, loading it if needed"""
+        with self._lock:
+            self.request_counts[course_id] += 1
+        return self._get_or_load(course_id)
+
+    def predict_score(self, course_id: str, student_data: Dict) -> float:
+        """Predict a student's score with the course's model"""
+        return self.get(course_id).predict_score(student_data)
+
+    def preload(self, top_n: int = 10, course_ids: Optional[List[str]] = None) -> List[str]:
+        """Load the most requested courses (or the given ones) until the budget is full"""
+        if course_ids is None:
+            course_ids = [course_id for course_id, _ in self.request_counts.most_common(top_n)]
+        loaded = []
+        for course_id in course_ids:
+            with self._lock:
+                if course_id in self.models:
+                    continue
+            try:
+                self._get_or_load(course_id, allow_evict=False)
+                loaded.append(course_id)
+            except MemoryError:
+                break
+            except Exception as e:
+                logger.warning(f"Could not preload course {course_id}: {e}")
+        logger.info(f"Preloaded {len(loaded)} course models")
+        return loaded
+
+    def evict(self, course_id: str):
+        """Drop a course's model from the pool"""
+        with self._lock:
+            self._evict(course_id)
+
+    def save_stats(self):
+        """Persist request counts used to pick courses for preload()"""
+        with open(self.stats_file, 'w') as f:
+            json.dump(dict(self.request_counts), f, indent=2)
+
+    def get_pool_statistics(self) -> Dict:
+        """Get information about pool usage"""
+        return {
+            "loaded_courses": list(self.models.keys()),
+            "memory_used_mb": self.memory_used / (1024 * 1024),
+            "memory_budget_mb": self.memory_budget / (1024 * 1024),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def _get_or_load(self, course_id: str, allow_evict: bool = True) -> ReinforcementLearningTrainer:
+        """Serve a loaded course, or load it from disk without holding the pool lock
+
+        Only one thread loads a given course; others asking for it wait for
+        that load instead of starting their own, and other courses keep
+        being served meanwhile.
+        """
+        while True:
+            with self._lock:
+                if course_id in self.models:
+                    self.hits += 1
+                    self.models.move_to_end(course_id)
+                    return self.models[course_id]
+                in_flight = self._loading.get(course_id)
+                if in_flight is None:
+                    in_flight = self._loading[course_id] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is loading it; check again once it finishes (or fails)
+            in_flight.wait()
+
+        try:
+            trainer = self.model_manager.load_model(course_model_name(course_id))
+            size = self._estimate_size(trainer)
+            with self._lock:
+                return self._insert(course_id, trainer, size, allow_evict)
+        finally:
+            with self._lock:
+                del self._loading[course_id]
+            in_flight.set()
+
+    def _insert(self, course_id: str, trainer: ReinforcementLearningTrainer, size: int,
+                allow_evict: bool) -> ReinforcementLearningTrainer:
+        if size > self.memory_budget:
+            # Evicting everything would still not make room, so keep the pool as it is
+            raise MemoryError(f"Course {course_id} ({size} bytes) exceeds the whole memory budget "
+                              f"({self.memory_budget} bytes)")
+        if self.memory_used + size > self.memory_budget:
+            if not allow_evict:
+                raise MemoryError(f"Course {course_id} does not fit in the memory budget")
+            while self.models and self.memory_used + size > self.memory_budget:
+                self._evict(next(iter(self.models)))
+
+        self.models[course_id] = trainer
+        self.model_sizes[course_id] = size
+        self.memory_used += size
+        logger.info(f"Loaded course {course_id} ({size} bytes, {len(self.models)} in pool)")
+        return trainer
+
+    def _evict(self, course_id: str):
+        if course_id in self.models:
+            del self.models[course_id]
+            self.memory_used -= self.model_sizes.pop(course_id)
+            self.evictions += 1
+            logger.info(f"Evicted course {course_id}")
+
+    def _estimate_size(self, trainer: ReinforcementLearningTrainer) -> int:
+        """Approximate resident bytes of a loaded trainer"""
+        size = sum(t.numel() * t.element_size() for t in trainer.model.state_dict().values())
+        for state in trainer.optimizer.state.values():
+            size += sum(t.numel() * t.element_size() for t in state.values() if hasattr(t, 'numel'))
+        data_handler = trainer.data_handler
+        scaler = data_handler.scaler
+        for attr in ('mean_', 'var_', 'scale_'):
+            value = getattr(scaler, attr, None)
+            if value is not None:
+                size += value.nbytes
+        # Row hashes for incremental training, plus the pipeline's vocabulary and defaults
+        # (its scaler is data_handler.scaler, counted above)
+        pipeline = getattr(data_handler, 'feature_pipeline', None)
+        size += _deep_size([getattr(data_handler, 'row_hashes', None),
+                            vars(pipeline) if pipeline is not None else None])
+        # Feedback entries are shared between the buffer and the history
+        feedback = trainer.feedback_manager
+        size += _deep_size([feedback.feedback_history, feedback.feedback_buffer])
+        return size
+
+    def _load_stats(self) -> Dict[str, int]:
+        if self.stats_file.exists():
+            with open(self.stats_file) as f:
+                return json.load(f)
+        return {}
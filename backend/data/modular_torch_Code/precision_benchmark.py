@@ -0,0 +1,130 @@
+import os
+import time
+import queue
+import resource
+import numpy as np
+import pandas as pd
+import torch
+import multiprocessing as mp
+from typing import Dict, List, Optional
+import logging
+
+from model import StudentScorePredictor
+from trainer import ReinforcementLearningTrainer
+from data_handler import DataHandler
+from feature_pipeline import FeaturePipeline
+
+logger = logging.getLogger(__name__)
+
+def _load(data_path: str, target_column: Optional[str]) -> DataHandler:
+    if target_column is None:
+        return DataHandler()
+    columns = pd.read_csv(data_path, nrows=0).columns.tolist()
+    return DataHandler(FeaturePipeline.for_student_scores(target_column, columns))
+
+def _run(data_path: str, target_column: Optional[str], precision: str, hidden_sizes: List[int],
+         epochs: int, min_rows: int, results):
+    torch.manual_seed(0)
+    data_handler = _load(data_path, target_column)
+    X, y = data_handler.load_and_prepare_data(data_path, [target_column] if target_column else None)
+    if target_column:
+        y = y / 100.0  # students_scores_* are percentages
+    rows = len(X)
+    # Tile small datasets so epoch times are measurable
+    repeats = max(1, -(-min_rows // rows))
+    X, y = X.repeat(repeats, 1), y.repeat(repeats, 1)
+    X_train, X_val, y_train, y_val = data_handler.split_data(X, y)
+
+    trainer = ReinforcementLearningTrainer(StudentScorePredictor(X.shape[1], hidden_sizes),
+                                           precision=precision)
+    trainer.data_handler = data_handler
+    start = time.perf_counter()
+    trainer._train_epochs(X_train, y_train, X_val, y_val, epochs, patience=epochs)
+    epoch_ms = (time.perf_counter() - start) * 1000 / epochs
+
+    trainer.model.eval()
+    start = time.perf_counter()
+    with torch.no_grad():
+        trainer._forward(X_val)
+    inference_ms = (time.perf_counter() - start) * 1000
+
+    results.put({
+        "status": "success",
+        "dataset": os.path.basename(data_path),
+        "precision": precision,
+        "rows": rows,
+        "training_rows": len(X_train),
+        "features": X.shape[1],
+        "epoch_ms": round(epoch_ms, 2),
+        "inference_ms": round(inference_ms, 2),
+        # ru_maxrss is in KiB on Linux; each run is its own process, so this is its peak
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "parity": trainer.check_precision_parity(X_val, y_val)
+    })
+
+def _collect(process, results, timeout: float) -> Dict:
+    """Wait for a run's result, failing instead of hanging if the child dies or stalls"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return results.get(timeout=1.0)
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            # The child may have put its result just before exiting
+            try:
+                return results.get(timeout=1.0)
+            except queue.Empty:
+                return {"status": "error",
+                        "error": f"Benchmark process exited with code {process.exitcode}"}
+        if time.monotonic() > deadline:
+            process.terminate()
+            return {"status": "error", "error": f"Benchmark timed out after {timeout}s"}
+
+def benchmark_precision(datasets: List[Dict], hidden_sizes: List[int] = [512, 256, 128],
+                        epochs: int = 20, min_rows: int = 50000,
+                        timeout: float = 3600.0) -> List[Dict]:
+    """fp32 vs bf16 epoch time, inference time, peak memory and MAE parity per dataset
+
+    Every configuration runs in a fresh process so peak memory is not
+    shared between runs. A run that crashes or exceeds timeout seconds is
+    reported as an error entry.
+    """
+    context = mp.get_context("spawn")
+    report = []
+    for dataset in datasets:
+        for precision in ("fp32", "bf16"):
+            results = context.Queue()
+            process = context.Process(target=_run, args=(
+                dataset["path"], dataset.get("target"), precision, hidden_sizes, epochs, min_rows, results))
+            process.start()
+            entry = _collect(process, results, timeout)
+            process.join()
+            if entry["status"] == "error":
+                entry.update(dataset=os.path.basename(dataset["path"]), precision=precision)
+                logger.error(f"{entry['dataset']} ({precision}): {entry['error']}")
+            report.append(entry)
+    return report
+
+if __name__ == "__main__":
+    import argparse, json
+
+    DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ROOT_DIR = os.path.dirname(os.path.dirname(DATA_DIR))
+    parser = argparse.ArgumentParser(description="Benchmark bf16 autocast against fp32")
+    parser.add_argument("--training-data", default=os.path.join(DATA_DIR, "training_data.csv"))
+    parser.add_argument("--scores-data", default=os.path.join(ROOT_DIR, "datasets", "students_scores_2k.csv"))
+    parser.add_argument("--scores-target", default="assessment_score_07")
+    parser.add_argument("--hidden-sizes", type=int, nargs="+", default=[512, 256, 128])
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--min-rows", type=int, default=50000)
+    parser.add_argument("--timeout", type=float, default=3600.0,
+                        help="Seconds before a single benchmark run is abandoned")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    datasets = [{"path": args.training_data},
+                {"path": args.scores_data, "target": args.scores_target}]
+    print(json.dumps(benchmark_precision(datasets, args.hidden_sizes, args.epochs, args.min_rows,
+                                         args.timeout), indent=2))
@@ -0,0 +1,315 @@
+import random
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# students_scores_* assessment scores are percentages
+SCORE_SCALE = 100.0
+
+# Type index 0 is reserved for assessment types not seen at training time
+UNKNOWN_TYPE = "<unknown>"
+
+def build_sequences(normalized_grades: Dict[str, Dict[str, float]],
+                    assessments: List[Dict]) -> Dict[str, List[Dict]]:
+    """Per-student assessment steps ordered by assessment date
+
+    Grades must already be 0-1 scores (grade_validation.normalize_grades,
+    with the cohort's column_scales when building a few students'
+    sequences at serving time), keyed by assessment _id or by the training
+    column name ({type}_{id[:5]}).
+    """
+    lookup = {}
+    for assessment in assessments:
+        info = {
+            "type": assessment["type"],
+            "weightage": float(assessment.get("weightage", 0)) / 100.0,
+            "date": assessment.get("date", "")
+        }
+        lookup[assessment["_id"]] = info
+        lookup[f"{assessment['type']}_{assessment['_id'][:5]}"] = info
+
+    sequences = {}
+    for student_id, student_grades in normalized_grades.items():
+        steps = []
+        for key, score in student_grades.items():
+            info = lookup[key]
+            steps.append({"type": info["type"], "weightage": info["weightage"],
+                          "score": score, "date": info["date"]})
+        steps.sort(key=lambda step: step["date"])
+        if steps:
+            sequences[student_id] = steps
+    return sequences
+
+def sequences_from_score_table(df: pd.DataFrame) -> Dict[str, List[Dict]]:
+    """Steps from the assessment_score_* columns of students_scores_*.csv, in column order"""
+    score_cols = sorted(col for col in df.columns if col.startswith("assessment_score_"))
+    scores = df[score_cols].values.astype(np.float64) / SCORE_SCALE
+    ids = df["id"].astype(str).values if "id" in df.columns else np.arange(len(df)).astype(str)
+    weightage = 1.0 / len(score_cols)
+    return {
+        student_id: [{"type": "assessment", "weightage": weightage, "score": score}
+                     for score in row if not np.isnan(score)]
+        for student_id, row in zip(ids, scores)
+    }
+
+def length_buckets(lengths: List[int], batch_size: int, shuffle: bool = False) -> List[List[int]]:
+    """Group sequence indices of similar length so padded batches carry little padding"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    if shuffle:
+        random.shuffle(batches)
+    return batches
+
+class SequenceScorePredictor(nn.Module):
+    """GRU over (type, weightage, score) steps predicting the score of the next assessment
+
+    The head sees the hidden state after step t plus the type and weightage
+    of assessment t+1, so one pass over a sequence yields a prediction for
+    every later step. Nothing depends on how many assessments exist, so new
+    assessments need no change to the architecture.
+    """
+
+    def __init__(self, num_types: int, type_dim: int = 8, hidden_size: int = 32):
+        super(SequenceScorePredictor, self).__init__()
+        self.type_embedding = nn.Embedding(num_types, type_dim)
+        self.gru = nn.GRU(type_dim + 2, hidden_size, batch_first=True)
+        self.head = nn.Sequential(
+            nn.Linear(hidden_size + type_dim + 1, hidden_size),
+            nn.ReLU(),
+            nn.Linear(hidden_size, 1)
+        )
+
+    def forward(self, types: torch.Tensor, weights: torch.Tensor, scores: torch.Tensor,
+                lengths: torch.Tensor, next_types: torch.Tensor,
+                next_weights: torch.Tensor) -> torch.Tensor:
+        """Padded (batch, steps) inputs -> (batch, steps) next-score predictions"""
+        type_emb = self.type_embedding(types)
+        steps = torch.cat([type_emb, weights.unsqueeze(-1), scores.unsqueeze(-1)], dim=-1)
+        # Packing skips the padded positions inside the recurrence
+        packed = pack_padded_sequence(steps, lengths, batch_first=True, enforce_sorted=False)
+        hidden, _ = pad_packed_sequence(self.gru(packed)[0], batch_first=True,
+                                        total_length=types.shape[1])
+        query = torch.cat([hidden, self.type_embedding(next_types), next_weights.unsqueeze(-1)], dim=-1)
+        return self.head(query).squeeze(-1)
+
+class SequenceTrainer:
+    """Trains and serves the sequence model with packed, length-bucketed batches"""
+
+    def __init__(self, type_dim: int = 8, hidden_size: int = 32, learning_rate: float = 0.005):
+        self.type_dim = type_dim
+        self.hidden_size = hidden_size
+        self.learning_rate = learning_rate
+        self.type_vocabulary = [UNKNOWN_TYPE]
+        self.model = None
+        self.training_history = []
+        self.validation_history = []
+
+    def _type_index(self, assessment_type: str) -> int:
+        return self._type_lookup.get(assessment_type, 0)
+
+    def _set_vocabulary(self, vocabulary: List[str]):
+        self.type_vocabulary = vocabulary
+        self._type_lookup = {name: i for i, name in enumerate(vocabulary)}
+
+    def _collate(self, sequences: List[List[Dict]],
+                 next_steps: Optional[List[Optional[Dict]]] = None) -> Dict[str, torch.Tensor]:
+        """Pad one bucket; next_steps supplies the assessment to predict after each history"""
+        lengths = [len(sequence) for sequence in sequences]
+        max_len = max(lengths)
+        shape = (len(sequences), max_len)
+        types = np.zeros(shape, dtype=np.int64)
+        weights = np.zeros(shape, dtype=np.float32)
+        scores = np.zeros(shape, dtype=np.float32)
+        next_types = np.zeros(shape, dtype=np.int64)
+        next_weights = np.zeros(shape, dtype=np.float32)
+        targets = np.zeros(shape, dtype=np.float32)
+        mask = np.zeros(shape, dtype=bool)
+
+        for row, sequence in enumerate(sequences):
+            n = len(sequence)
+            types[row, :n] = [self._type_index(step["type"]) for step in sequence]
+            weights[row, :n] = [step["weightage"] for step in sequence]
+            scores[row, :n] = [step["score"] for step in sequence]
+            # Training: step t predicts the score of step t+1 in the same sequence
+            next_types[row, :n - 1] = types[row, 1:n]
+            next_weights[row, :n - 1] = weights[row, 1:n]
+            targets[row, :n - 1] = scores[row, 1:n]
+            mask[row, :n - 1] = True
+            if next_steps is not None and next_steps[row] is not None:
+                next_types[row, n - 1] = self._type_index(next_steps[row].get("type", UNKNOWN_TYPE))
+                next_weights[row, n - 1] = float(next_steps[row].get("weightage", 0.0))
+
+        return {
+            "types": torch.from_numpy(types), "weights": torch.from_numpy(weights),
+            "scores": torch.from_numpy(scores), "lengths": torch.tensor(lengths),
+            "next_types": torch.from_numpy(next_types), "next_weights": torch.from_numpy(next_weights),
+            "targets": torch.from_numpy(targets), "mask": torch.from_numpy(mask)
+        }
+
+    def _forward(self, batch: Dict[str, torch.Tensor]) -> torch.Tensor:
+        return self.model(batch["types"], batch["weights"], batch["scores"], batch["lengths"],
+                          batch["next_types"], batch["next_weights"])
+
+    def _loss(self, sequences: List[List[Dict]], batch_size: int, train: bool) -> float:
+        criterion = nn.MSELoss(reduction='sum')
+        total_loss, total_steps = 0.0, 0
+        lengths = [len(sequence) for sequence in sequences]
+        for bucket in length_buckets(lengths, batch_size, shuffle=train):
+            batch = self._collate([sequences[i] for i in bucket])
+            if not batch["mask"].any():
+                continue
+            predictions = self._forward(batch)
+            loss = criterion(predictions[batch["mask"]], batch["targets"][batch["mask"]])
+            if train:
+                self.optimizer.zero_grad()
+                (loss / batch["mask"].sum()).backward()
+                self.optimizer.step()
+            total_loss += loss.item()
+            total_steps += int(batch["mask"].sum())
+        return total_loss / max(total_steps, 1)
+
+    def fit(self, sequences: Dict[str, List[Dict]], epochs: int = 30, batch_size: int = 64,
+            validation_split: float = 0.2, patience: int = 5, random_state: int = 42) -> Dict:
+        """Train on every next-step prediction of every student sequence"""
+        types = sorted({step["type"] for sequence in sequences.values() for step in sequence})
+        self._set_vocabulary([UNKNOWN_TYPE] + types)
+        self.model = SequenceScorePredictor(len(self.type_vocabulary), self.type_dim, self.hidden_size)
+        self.optimizer = optim.Adam(self.model.parameters(), lr=self.learning_rate)
+
+        usable = [sequence for sequence in sequences.values() if len(sequence) > 1]
+        rng = np.random.default_rng(random_state)
+        order = rng.permutation(len(usable))
+        n_val = int(len(usable) * validation_split)
+        val_sequences = [usable[i] for i in order[:n_val]]
+        train_sequences = [usable[i] for i in order[n_val:]]
+
+        best_val_loss = float('inf')
+        best_state = None
+        patience_counter = 0
+        for epoch in range(epochs):
+            self.model.train()
+            train_loss = self._loss(train_sequences, batch_size, train=True)
+            self.model.eval()
+            with torch.no_grad():
+                val_loss = self._loss(val_sequences or train_sequences, batch_size, train=False)
+            self.training_history.append(train_loss)
+            self.validation_history.append(val_loss)
+
+            if val_loss < best_val_loss:
+                best_val_loss = val_loss
+                best_state = {k: v.detach().clone() for k, v in self.model.state_dict().items()}
+                patience_counter = 0
+            else:
+                patience_counter += 1
+
+            if epoch % 10 == 0:
+                logger.info(f"Epoch {epoch}: Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}")
+            if patience_counter >= patience:
+                logger.info(f"Early stopping at epoch {epoch}")
+                break
+
+        if best_state is None:
+            self.model = None
+            return {
+                "status": "error",
+                "error": "Validation loss was NaN in every epoch",
+                "epochs_trained": len(self.training_history)
+            }
+
+        self.model.load_state_dict(best_state)
+        return {
+            "status": "success",
+            "train_sequences": len(train_sequences),
+            "val_sequences": len(val_sequences),
+            "best_val_loss": best_val_loss,
+            "epochs_trained": len(self.training_history)
+        }
+
+    def predict_many(self, histories: List[List[Dict]], next_assessments: Optional[List[Optional[Dict]]] = None,
+                     batch_size: int = 256) -> np.ndarray:
+        """Predict the next normalized score after each history, bucketed by length"""
+        if self.model is None:
+            raise ValueError("Sequence model must be trained or loaded first")
+        if next_assessments is None:
+            next_assessments = [None] * len(histories)
+
+        predictions = np.full(len(histories), np.nan, dtype=np.float32)
+        lengths = [len(history) for history in histories]
+        # Students without any graded assessment have nothing to condition on
+        indices = [i for i, n in enumerate(lengths) if n > 0]
+        self.model.eval()
+        with torch.no_grad():
+            for bucket in length_buckets([lengths[i] for i in indices], batch_size):
+                rows = [indices[i] for i in bucket]
+                batch = self._collate([histories[i] for i in rows], [next_assessments[i] for i in rows])
+                output = self._forward(batch)
+                predictions[rows] = output[torch.arange(len(rows)), batch["lengths"] - 1].numpy()
+        return predictions
+
+    def predict_next(self, history: List[Dict], next_assessment: Optional[Dict] = None) -> float:
+        """Predict the next normalized score for one student"""
+        return float(self.predict_many([history], [next_assessment])[0])
+
+    def save(self, path: str):
+        torch.save({
+            "model_state_dict": self.model.state_dict(),
+            "type_vocabulary": self.type_vocabulary,
+            "type_dim": self.type_dim,
+            "hidden_size": self.hidden_size,
+            "training_history": self.training_history,
+            "validation_history": self.validation_history
+        }, path)
+        logger.info(f"Sequence model saved to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "SequenceTrainer":
+        checkpoint = torch.load(path, weights_only=True)
+        trainer = cls(checkpoint["type_dim"], checkpoint["hidden_size"])
+        trainer._set_vocabulary(checkpoint["type_vocabulary"])
+        trainer.model = SequenceScorePredictor(len(trainer.type_vocabulary), trainer.type_dim,
+                                               trainer.hidden_size)
+        trainer.model.load_state_dict(checkpoint["model_state_dict"])
+        trainer.training_history = checkpoint["training_history"]
+        trainer.validation_history = checkpoint["validation_history"]
+        return trainer
+
+if __name__ == "__main__":
+    import argparse, json, os, sys
+
+    parser = argparse.ArgumentParser(description="Train the sequence score model")
+    parser.add_argument("--data", help="students_scores_*.csv with assessment_score_* columns")
+    parser.add_argument("--grades", help="assessmentGrades.json (used with --assessments)")
+    parser.add_argument("--assessments", help="assessments.json")
+    parser.add_argument("--output", default="sequence_predictor.pth")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.data:
+        sequences = sequences_from_score_table(pd.read_csv(args.data))
+    else:
+        with open(args.grades) as f:
+            grades = json.load(f)
+        with open(args.assessments) as f:
+            assessments = json.load(f)
+        # grade_validation lives one level up in backend/data; appended so local modules keep precedence
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from grade_validation import normalize_grades
+        sequences = build_sequences(normalize_grades(grades, assessments), assessments)
+
+    trainer = SequenceTrainer()
+    results = trainer.fit(sequences, epochs=args.epochs, batch_size=args.batch_size)
+    if results["status"] == "success":
+        trainer.save(args.output)
+    print(json.dumps(results, indent=2))
+    if results["status"] != "success":
+        sys.exit(1)
@@ -0,0 +1,226 @@
+import os
+import json
+import warnings
+import numpy as np
+import pandas as pd
+import torch
+import torch.multiprocessing as mp
+from pathlib import Path
+from torch.func import functional_call
+from typing import Dict, List, Optional
+import logging
+
+from model import StudentScorePredictor
+from trainer import ReinforcementLearningTrainer
+from model_manager import ModelManager
+from feature_pipeline import FeaturePipeline
+
+logger = logging.getLogger(__name__)
+
+POINTER_FILE = "current.json"
+# /dev/shm keeps the mapping in RAM on Linux; any directory works elsewhere
+DEFAULT_SHARED_DIR = "/dev/shm/student_predictor" if os.path.isdir("/dev/shm") else "shared_weights"
+
+def publish_weights(trainer: ReinforcementLearningTrainer, version: str,
+                    shared_dir: str = DEFAULT_SHARED_DIR, keep_versions: int = 2) -> Dict:
+    """Write weights and scaler arrays to a flat file and atomically point readers at it
+
+    Only the arrays needed for inference are published; the feedback history
+    and optimizer state stay in the parent. A FeaturePipeline's encoding
+    goes in the pointer header and shares the published scaler arrays.
+    """
+    shared_path = Path(shared_dir)
+    shared_path.mkdir(parents=True, exist_ok=True)
+    pipeline = getattr(trainer.data_handler, 'feature_pipeline', None)
+
+    arrays = {f"model.{name}": tensor.detach().cpu().numpy()
+              for name, tensor in trainer.model.state_dict().items()}
+    arrays["scaler.mean"] = np.asarray(trainer.data_handler.scaler.mean_, dtype=np.float32)
+    arrays["scaler.scale"] = np.asarray(trainer.data_handler.scaler.scale_, dtype=np.float32)
+
+    entries, offset = [], 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        offset = (offset + 63) // 64 * 64  # cache-line aligned views
+        entries.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape),
+                        "offset": offset})
+        offset += array.nbytes
+
+    # A fresh file is renamed into place, so workers mapping an older file are never truncated
+    weights_file = shared_path / f"weights_{version}.bin"
+    tmp_weights = shared_path / f".weights_{version}.bin.{os.getpid()}"
+    buffer = np.memmap(tmp_weights, dtype=np.uint8, mode='w+', shape=(max(offset, 1),))
+    for entry, array in zip(entries, arrays.values()):
+        raw = np.ascontiguousarray(array).view(np.uint8).ravel()
+        buffer[entry["offset"]:entry["offset"] + raw.size] = raw
+    buffer.flush()
+    del buffer
+    os.replace(tmp_weights, weights_file)
+
+    linear_layers = [layer for layer in trainer.model.network if isinstance(layer, torch.nn.Linear)]
+    header = {
+        "version": version,
+        "weights_file": weights_file.name,
+        "arrays": entries,
+        "model_architecture": {
+            "input_size": linear_layers[0].in_features,
+            "hidden_sizes": [layer.out_features for layer in linear_layers[:-1]],
+            "output_size": linear_layers[-1].out_features
+        },
+        "feature_columns": trainer.data_handler.feature_columns,
+        "target_columns": getattr(trainer.data_handler, 'target_columns', []),
+        "feature_pipeline": (pipeline.get_config() if pipeline is not None else None)
+    }
+
+    # Write-then-rename: readers see either the old or the new pointer, never a partial one
+    tmp_pointer = shared_path / f".{POINTER_FILE}.{os.getpid()}"
+    with open(tmp_pointer, 'w') as f:
+        json.dump(header, f)
+    os.replace(tmp_pointer, shared_path / POINTER_FILE)
+
+    # Unlinking is safe for readers that still map an older file
+    old_files = sorted(shared_path.glob("weights_*.bin"), key=lambda p: p.stat().st_mtime)
+    for old_file in old_files[:-keep_versions]:
+        if old_file != weights_file:
+            old_file.unlink()
+
+    logger.info(f"Published weights version {version} to {weights_file}")
+    return {"status": "success", "version": version, "path": str(weights_file), "bytes": offset}
+
+def publish_production(model_manager: ModelManager, model_name: str = "student_predictor",
+                       shared_dir: str = DEFAULT_SHARED_DIR) -> Dict:
+    """Publish the promoted (or else latest) version of a model for serving workers"""
+    version = model_manager.get_production_version(model_name) or model_manager._get_latest_version(model_name)
+    trainer = model_manager.load_model(model_name, version)
+    return publish_weights(trainer, version, shared_dir)
+
+class SharedWeightsReader:
+    """Read-only, zero-copy view of published weights for a serving worker
+
+    Tensors are views over a memory-mapped file, so every worker shares the
+    same physical pages. The pointer file is checked on each call, and a new
+    mapping is attached as soon as a new version has been published.
+    """
+
+    def __init__(self, shared_dir: str = DEFAULT_SHARED_DIR):
+        self.shared_path = Path(shared_dir)
+        self.version = None
+        self._pointer_stat = None
+        self._refresh()
+
+    def _refresh(self, attempts: int = 3):
+        pointer = self.shared_path / POINTER_FILE
+        for _ in range(attempts):
+            stat = pointer.stat()
+            stat_key = (stat.st_ino, stat.st_mtime_ns)
+            if stat_key == self._pointer_stat:
+                return
+            with open(pointer) as f:
+                header = json.load(f)
+            try:
+                mapping = np.memmap(self.shared_path / header["weights_file"], dtype=np.uint8, mode='r')
+                break
+            except FileNotFoundError:
+                # A newer publish unlinked it after we read the pointer: read the pointer again
+                continue
+        else:
+            raise FileNotFoundError(f"Published weights kept changing under {self.shared_path}")
+
+        tensors = {}
+        with warnings.catch_warnings():
+            # The mapping is read-only on purpose; inference never writes to it
+            warnings.simplefilter("ignore", UserWarning)
+            for entry in header["arrays"]:
+                dtype = np.dtype(entry["dtype"])
+                count = int(np.prod(entry["shape"])) if entry["shape"] else 1
+                array = np.frombuffer(mapping, dtype=dtype, count=count, offset=entry["offset"])
+                tensors[entry["name"]] = torch.from_numpy(array.reshape(entry["shape"]))
+
+        # The module only provides the forward structure; its own weights are never used
+        self.model = StudentScorePredictor(**header["model_architecture"])
+        self.model.eval()
+        self.parameters = {name[len("model."):]: tensor for name, tensor in tensors.items()
+                           if name.startswith("model.")}
+        self.scaler_mean = tensors["scaler.mean"]
+        self.scaler_scale = tensors["scaler.scale"]
+        self.feature_pipeline = None
+        if header.get("feature_pipeline") is not None:
+            self.feature_pipeline = FeaturePipeline.from_config(
+                header["feature_pipeline"], self.scaler_mean.numpy(), self.scaler_scale.numpy())
+        self.feature_columns = header["feature_columns"]
+        self.target_columns = header["target_columns"]
+        self._mapping = mapping
+        self.version = header["version"]
+        self._pointer_stat = stat_key
+        logger.info(f"Worker {os.getpid()} attached weights version {self.version}")
+
+    def predict_scores(self, students: List[Dict]) -> np.ndarray:
+        """Predict scores for a batch of students with the current weights"""
+        self._refresh()
+        if self.feature_pipeline is not None:
+            features = torch.from_numpy(self.feature_pipeline.transform(pd.DataFrame(students)))
+        else:
+            features = torch.tensor(
+                [[student.get(col, 0.0) for col in self.feature_columns] for student in students],
+                dtype=torch.float32
+            ).reshape(len(students), len(self.feature_columns))
+            features = (features - self.scaler_mean) / self.scaler_scale
+        with torch.no_grad():
+            predictions = functional_call(self.model, self.parameters, (features,))
+        return predictions[:, 0].numpy()
+
+    def predict_score(self, student_data: Dict) -> float:
+        return float(self.predict_scores([student_data])[0])
+
+def _serve_worker(shared_dir: str, requests, responses):
+    torch.set_num_threads(1)
+    reader = SharedWeightsReader(shared_dir)
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        request_id, student_data = item
+        try:
+            responses.put((request_id, {"predicted_score": reader.predict_score(student_data),
+                                        "version": reader.version, "status": "success"}))
+        except Exception as e:
+            responses.put((request_id, {"error": str(e)}))
+
+class PreforkPredictionServer:
+    """Parent process that publishes weights once and fans requests out to workers"""
+
+    def __init__(self, shared_dir: str = DEFAULT_SHARED_DIR, num_workers: Optional[int] = None):
+        self.shared_dir = shared_dir
+        self.num_workers = num_workers or os.cpu_count() or 1
+        context = mp.get_context("fork" if hasattr(os, "fork") else "spawn")
+        self.requests = context.Queue()
+        self.responses = context.Queue()
+        self.workers = [context.Process(target=_serve_worker,
+                                        args=(shared_dir, self.requests, self.responses),
+                                        daemon=True)
+                        for _ in range(self.num_workers)]
+        self._next_id = 0
+
+    def start(self):
+        """Fork the workers; weights must already be published to shared_dir"""
+        for worker in self.workers:
+            worker.start()
+        logger.info(f"Started {self.num_workers} prediction workers")
+
+    def predict_many(self, students: List[Dict]) -> List[Dict]:
+        """Distribute predictions over the workers and collect them in order (single caller)"""
+        first_id = self._next_id
+        for student_data in students:
+            self.requests.put((self._next_id, student_data))
+            self._next_id += 1
+        results = {}
+        while len(results) < len(students):
+            request_id, result = self.responses.get()
+            results[request_id] = result
+        return [results[first_id + i] for i in range(len(students))]
+
+    def stop(self):
+        for _ in self.workers:
+            self.requests.put(None)
+        for worker in self.workers:
+            worker.join()
@@ -0,0 +1,289 @@
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.neighbors import BallTree, KDTree
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from data_handler import DataHandler
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "similarity_index.pkl"
+# Above this many scaled features, space-partitioning trees degrade towards a full scan
+TREE_MAX_DIMS = 16
+
+class SimilarityIndex:
+    """Top-k nearest students in the data handler's scaled feature space
+
+    Methods:
+      - "tree": KD-tree (up to 10 dims) or ball tree, exact
+      - "rp_tree": tree over a Gaussian random projection, re-ranked exactly
+        on oversampled candidates; for wide feature sets
+      - "ivf": k-means inverted lists, probing the n_probe nearest lists
+    "auto" picks "tree" up to TREE_MAX_DIMS features and "ivf" above.
+
+    Students added after the build go to a small buffer that is scanned
+    exactly (trees) or straight into their nearest inverted list (ivf); the
+    trees are rebuilt once the buffer outgrows rebuild_fraction of the index.
+    Re-adding a student replaces their row: the old one is retired, skipped
+    by searches and dropped at the next rebuild.
+    """
+
+    def __init__(self, data_handler: DataHandler, method: str = "auto", leaf_size: int = 40,
+                 n_lists: Optional[int] = None, n_probe: int = 8,
+                 projection_dim: int = 8, oversample: int = 4,
+                 rebuild_fraction: float = 0.1, random_state: int = 42):
+        if not data_handler.is_fitted:
+            raise ValueError("DataHandler must be fitted on training data first")
+        if method not in ("auto", "tree", "rp_tree", "ivf"):
+            raise ValueError(f"Unknown index method: {method}")
+        self.data_handler = data_handler
+        self.method = method
+        self.leaf_size = leaf_size
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.projection_dim = projection_dim
+        self.oversample = oversample
+        self.rebuild_fraction = rebuild_fraction
+        self.random_state = random_state
+
+        self.student_ids = np.array([], dtype=object)
+        self.vectors = np.zeros((0, len(data_handler.feature_columns)), dtype=np.float32)
+        self.targets = np.zeros(0, dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)  # False for rows replaced by a re-added student
+        self._rows = {}  # student_id -> current row
+        self._indexed = 0  # rows covered by the tree; later rows live in the buffer
+
+    def build(self, data_path: str) -> "SimilarityIndex":
+        """Index every row of a training CSV"""
+        df = pd.read_csv(data_path)
+        target_columns = getattr(self.data_handler, 'target_columns', ['weighted_final_grade'])
+        target = next((col for col in target_columns if col in df.columns), None)
+        X = df.reindex(columns=self.data_handler.feature_columns).fillna(0.0).values
+        self.student_ids = df["student_id"].astype(str).values.astype(object)
+        self.vectors = self.data_handler.scaler.transform(X).astype(np.float32)
+        self.targets = (df[target].values.astype(np.float32) if target
+                        else np.full(len(df), np.nan, dtype=np.float32))
+        self.live = np.ones(len(df), dtype=bool)
+        self._rebuild()
+        return self
+
+    def _rebuild(self):
+        if not self.live.all():
+            self.vectors = self.vectors[self.live]
+            self.student_ids = self.student_ids[self.live]
+            self.targets = self.targets[self.live]
+            self.live = np.ones(len(self.vectors), dtype=bool)
+        self._rows = {student_id: row for row, student_id in enumerate(self.student_ids)}
+
+        num_features = self.vectors.shape[1]
+        method = self.method
+        if method == "auto":
+            method = "tree" if num_features <= TREE_MAX_DIMS else "ivf"
+        self.resolved_method = method
+
+        if method == "ivf":
+            n_lists = self.n_lists or max(1, int(np.sqrt(len(self.vectors))))
+            kmeans = KMeans(n_clusters=min(n_lists, len(self.vectors)), n_init=1,
+                            random_state=self.random_state).fit(self.vectors)
+            self.centroids = kmeans.cluster_centers_.astype(np.float32)
+            self.lists = [np.flatnonzero(kmeans.labels_ == i) for i in range(len(self.centroids))]
+        else:
+            if method == "rp_tree":
+                rng = np.random.default_rng(self.random_state)
+                self.projection = (rng.normal(size=(num_features, self.projection_dim)) /
+                                   np.sqrt(self.projection_dim)).astype(np.float32)
+                tree_input = self.vectors @ self.projection
+            else:
+                self.projection = None
+                tree_input = self.vectors
+            tree_class = KDTree if tree_input.shape[1] <= 10 else BallTree
+            self.tree = tree_class(tree_input, leaf_size=self.leaf_size)
+        self._indexed = len(self.vectors)
+        logger.info(f"Built {method} similarity index over {self._indexed} students")
+
+    def add(self, student_ids: List[str], students: List[Dict],
+            targets: Optional[List[float]] = None):
+        """Index new students, or replace already indexed ones, without a full rebuild"""
+        X = self.data_handler.prepare_batch_data(students).numpy().astype(np.float32)
+        targets = np.asarray(targets if targets is not None else [np.nan] * len(X), dtype=np.float32)
+        # A student listed twice in one call keeps their last entry
+        latest = sorted({student_id: i for i, student_id in enumerate(student_ids)}.values())
+        student_ids = np.array(student_ids, dtype=object)[latest]
+        X, targets = X[latest], targets[latest]
+
+        retired = [self._rows[student_id] for student_id in student_ids if student_id in self._rows]
+        self.live[retired] = False
+        start = len(self.vectors)
+        self.vectors = np.vstack([self.vectors, X])
+        self.student_ids = np.concatenate([self.student_ids, student_ids])
+        self.targets = np.concatenate([self.targets, targets])
+        self.live = np.concatenate([self.live, np.ones(len(X), dtype=bool)])
+        self._rows.update({student_id: start + i for i, student_id in enumerate(student_ids)})
+
+        if self.resolved_method == "ivf":
+            if retired:
+                self.lists = [rows[self.live[rows]] for rows in self.lists]
+            nearest = self._squared_distances(X, self.centroids).argmin(axis=1)
+            for list_id in np.unique(nearest):
+                rows = start + np.flatnonzero(nearest == list_id)
+                self.lists[list_id] = np.concatenate([self.lists[list_id], rows])
+            self._indexed = len(self.vectors)
+        elif (len(self.vectors) - self._indexed + self._retired_in_tree()
+              > self.rebuild_fraction * max(self._indexed, 1)):
+            self._rebuild()
+
+    def _retired_in_tree(self) -> int:
+        return int(self._indexed - self.live[:self._indexed].sum())
+
+    def search(self, X_scaled: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances and row positions of the k nearest indexed students per query row"""
+        X_scaled = np.atleast_2d(np.asarray(X_scaled, dtype=np.float32))
+        k = min(k, int(self.live.sum()))
+        if self.resolved_method == "ivf":
+            return self._search_ivf(X_scaled, k)
+
+        # Retired rows are still in the tree: ask for enough extra neighbours to drop them
+        retired = self._retired_in_tree()
+        if self.projection is not None:
+            candidates = min((k + retired) * self.oversample, self._indexed)
+            _, rows = self.tree.query(X_scaled @ self.projection, k=candidates)
+            distances = np.sqrt(((self.vectors[rows] - X_scaled[:, None, :]) ** 2).sum(axis=-1))
+        else:
+            distances, rows = self.tree.query(X_scaled, k=min(k + retired, self._indexed))
+        if retired:
+            distances = np.where(self.live[rows], distances, np.inf)
+
+        if len(self.vectors) > self._indexed:
+            buffer_rows = self._indexed + np.flatnonzero(self.live[self._indexed:])
+            buffer_distances = np.sqrt(self._squared_distances(X_scaled, self.vectors[buffer_rows]))
+            rows = np.hstack([rows, np.broadcast_to(buffer_rows, (len(X_scaled), len(buffer_rows)))])
+            distances = np.hstack([distances, buffer_distances])
+        return self._top_k(distances, rows, k)
+
+    def _search_ivf(self, X_scaled: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        probes = np.argsort(self._squared_distances(X_scaled, self.centroids), axis=1)[:, :self.n_probe]
+        all_distances = np.full((len(X_scaled), k), np.inf)
+        all_rows = np.full((len(X_scaled), k), -1)
+        for q, lists in enumerate(probes):
+            rows = np.concatenate([self.lists[i] for i in lists])
+            distances = np.sqrt(((self.vectors[rows] - X_scaled[q]) ** 2).sum(axis=1))
+            found = min(k, len(rows))
+            if not found:
+                continue
+            top = np.argpartition(distances, found - 1)[:found]
+            order = top[np.argsort(distances[top])]
+            all_distances[q, :found] = distances[order]
+            all_rows[q, :found] = rows[order]
+        return all_distances, all_rows
+
+    @staticmethod
+    def _squared_distances(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+        return np.maximum((A ** 2).sum(1)[:, None] - 2 * A @ B.T + (B ** 2).sum(1)[None, :], 0.0)
+
+    @staticmethod
+    def _top_k(distances: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(distances, axis=1)[:, :k]
+        return np.take_along_axis(distances, order, 1), np.take_along_axis(rows, order, 1)
+
+    def query(self, student_data: Dict, k: int = 5) -> List[Dict]:
+        """Most similar indexed students to one student's grades"""
+        X = self.data_handler.prepare_student_data(student_data).numpy()
+        distances, rows = self.search(X, k)
+        return [{"student_id": self.student_ids[row], "distance": float(distance)}
+                for distance, row in zip(distances[0], rows[0]) if row >= 0]
+
+    def predict(self, students: List[Dict], k: int = 10) -> np.ndarray:
+        """kNN baseline: mean target of the k nearest students"""
+        X = self.data_handler.prepare_batch_data(students).numpy()
+        _, rows = self.search(X, k)
+        neighbour_targets = np.where(rows >= 0, self.targets[np.maximum(rows, 0)], np.nan)
+        return np.nanmean(neighbour_targets, axis=1)
+
+    def save(self, path: str):
+        # The data handler is already saved with the model; reattach it on load
+        state = {key: value for key, value in self.__dict__.items() if key != "data_handler"}
+        with open(path, 'wb') as f:
+            pickle.dump(state, f)
+        logger.info(f"Similarity index saved to {path}")
+
+    @classmethod
+    def load(cls, path: str, data_handler: DataHandler) -> "SimilarityIndex":
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        index = cls.__new__(cls)
+        index.__dict__.update(state)
+        index.data_handler = data_handler
+        if "live" not in state:
+            # Saved before re-added students replaced their rows
+            index.live = np.ones(len(index.vectors), dtype=bool)
+            index._rows = {student_id: row for row, student_id in enumerate(index.student_ids)}
+        return index
+
+    def get_index_info(self) -> Dict:
+        return {
+            "method": self.resolved_method,
+            "students": int(self.live.sum()),
+            "buffered": len(self.vectors) - self._indexed if self.resolved_method != "ivf" else 0,
+            "retired": int((~self.live).sum()),
+            "num_features": self.vectors.shape[1]
+        }
+
+def benchmark_recall(index: SimilarityIndex, queries: np.ndarray, k: int = 10,
+                     n_probes: List[int] = [1, 2, 4, 8, 16]) -> List[Dict]:
+    """Recall@k and per-query latency against an exact brute-force scan"""
+    start = time.perf_counter()
+    exact = np.argsort(SimilarityIndex._squared_distances(queries, index.vectors), axis=1)[:, :k]
+    brute_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    settings = n_probes if index.resolved_method == "ivf" else [None]
+    results = []
+    for n_probe in settings:
+        if n_probe is not None:
+            index.n_probe = n_probe
+        start = time.perf_counter()
+        for query in queries:
+            _, rows = index.search(query[None, :], k)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        _, rows = index.search(queries, k)
+        recall = np.mean([len(set(found) & set(truth)) / k for found, truth in zip(rows, exact)])
+        results.append({"method": index.resolved_method, "n_probe": n_probe, "recall": float(recall),
+                        "latency_ms": latency_ms, "brute_force_ms": brute_ms})
+    return results
+
+if __name__ == "__main__":
+    import argparse, json
+
+    parser = argparse.ArgumentParser(description="Recall vs latency of the similarity index")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--features", type=int, nargs="+", default=[8, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    rng = np.random.default_rng(0)
+    report = []
+    for num_features in args.features:
+        # Clustered synthetic students, so neighbourhoods are meaningful
+        centers = rng.normal(size=(50, num_features))
+        X = centers[rng.integers(0, 50, args.rows)] + 0.3 * rng.normal(size=(args.rows, num_features))
+        handler = DataHandler()
+        handler.feature_columns = [f"feature_{i}" for i in range(num_features)]
+        handler.scaler.fit(X)
+        handler.is_fitted = True
+        X_scaled = handler.scaler.transform(X).astype(np.float32)
+
+        index = SimilarityIndex(handler)
+        index.student_ids = np.arange(args.rows).astype(str).astype(object)
+        index.vectors = X_scaled
+        index.targets = np.zeros(args.rows, dtype=np.float32)
+        index.live = np.ones(args.rows, dtype=bool)
+        index._rebuild()
+        queries = X_scaled[rng.integers(0, args.rows, args.queries)] + 0.05
+        report.extend(benchmark_recall(index, queries, args.k))
+    print(json.dumps(report, indent=2))
@@ -1,93 +1,312 @@
+import copy
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
 
 from model import StudentScorePredictor
 from data_handler import DataHandler
 from feedback_manager import FeedbackManager
+from checkpointing import CheckpointWriter, capture_rng_state, restore_rng_state, load_checkpoint
+from explanations import gradient_x_input, integrated_gradients, load_assessment_titles
 
 logger = logging.getLogger(__name__)
 
 class ReinforcementLearningTrainer:
     """Handles training and reinforcement learning updates"""
     
-    def __init__(self, model: StudentScorePredictor, learning_rate: float = 0.001):
+    def __init__(self, model: StudentScorePredictor, learning_rate: float = 0.001,
+                 precision: str = "fp32", parity_tolerance: float = 0.05,
+                 parity_atol: float = 0.005):
+        if precision not in ("fp32", "bf16"):
+            raise ValueError(f"Unsupported precision: {precision}")
         self.model = model
+        # bf16 runs forward passes under CPU autocast; weights and optimizer state stay fp32
+        self.precision = precision
+        self.parity_tolerance = parity_tolerance
+        self.parity_atol = parity_atol
+        # Result of the last bf16 parity check, saved with the model
+        self.precision_parity = None
         self.optimizer = optim.Adam(model.parameters(), lr=learning_rate)
         self.data_handler = DataHandler()
         self.feedback_manager = FeedbackManager()
         self.training_history = []
         self.validation_history = []
+        # Optional DriftMonitor fed with prediction inputs and feedback errors
+        self.drift_monitor = None
         
     def initial_training(self, data_path: str, epochs: int = 100, 
-                        validation_split: float = 0.2, patience: int = 10):
-        """Initial training on historical data with early stopping"""
+                        validation_split: float = 0.2, patience: int = 10,
+                        target_columns: Optional[List[str]] = None,
+                        checkpoint_path: Optional[str] = None, checkpoint_every: int = 1,
+                        resume: bool = False):
+        """Initial training on historical data with early stopping
+        
+        With checkpoint_path, a checkpoint is written every checkpoint_every
+        epochs; resume=True continues from it with the same model, optimizer,
+        scaler, RNG and early-stopping state.
+        """
         logger.info("Starting initial training...")
         
-        # Prepare data
-        X, y = self.data_handler.load_and_prepare_data(data_path)
-        X_train, X_val, y_train, y_val = self.data_handler.split_data(X, y, validation_split)
+        resume_state = load_checkpoint(checkpoint_path) if resume and checkpoint_path else None
+        if resume and resume_state is None:
+            logger.info(f"No checkpoint at {checkpoint_path}, starting from scratch")
         
-        criterion = nn.MSELoss()
-        best_val_loss = float('inf')
-        patience_counter = 0
+        # Prepare data; a resumed run scales with the checkpoint's scaler, not a refitted one
+        scaler = resume_state["scaler"] if resume_state is not None else None
+        X, y = self.data_handler.load_and_prepare_data(data_path, target_columns, scaler)
+        output_size = self.model.network[-1].out_features
+        if y.shape[1] != output_size:
+            raise ValueError(f"Model has {output_size} outputs but data has {y.shape[1]} targets")
+        if resume_state is not None and resume_state["feature_columns"] != self.data_handler.feature_columns:
+            raise ValueError("Checkpoint was written for different feature columns")
+        X_train, X_val, y_train, y_val = self.data_handler.split_data(X, y, validation_split)
         
-        for epoch in range(epochs):
-            # Training phase
-            self.model.train()
-            self.optimizer.zero_grad()
-            
-            predictions = self.model(X_train)
-            train_loss = criterion(predictions, y_train)
-            
-            train_loss.backward()
-            self.optimizer.step()
-            
-            # Validation phase
-            self.model.eval()
-            with torch.no_grad():
-                val_predictions = self.model(X_val)
-                val_loss = criterion(val_predictions, y_val)
-            
-            # Record history
-            self.training_history.append(train_loss.item())
-            self.validation_history.append(val_loss.item())
-            
-            # Early stopping check
-            if val_loss.item() < best_val_loss:
-                best_val_loss = val_loss.item()
-                patience_counter = 0
-                # Save best model state
-                self.best_model_state = self.model.state_dict().copy()
-            else:
-                patience_counter += 1
-            
-            # Logging
-            if epoch % 10 == 0:
-                logger.info(f"Epoch {epoch}: Train Loss: {train_loss.item():.4f}, "
-                           f"Val Loss: {val_loss.item():.4f}")
-            
-            # Early stopping
-            if patience_counter >= patience:
-                logger.info(f"Early stopping at epoch {epoch}")
-                # Restore best model
-                self.model.load_state_dict(self.best_model_state)
-                break
+        best_val_loss = self._train_epochs(X_train, y_train, X_val, y_val, epochs, patience,
+                                           checkpoint_path, checkpoint_every, resume_state)
         
         logger.info(f"Initial training completed! Best validation loss: {best_val_loss:.4f}")
         
-        return {
+        results = {
             "final_train_loss": self.training_history[-1],
             "final_val_loss": self.validation_history[-1],
             "best_val_loss": best_val_loss,
             "epochs_trained": len(self.training_history)
         }
+        if self.precision == "bf16":
+            parity = self.check_precision_parity(X_val, y_val)
+            if not parity["passed"]:
+                logger.warning(f"bf16 validation MAE differs from fp32 by {parity['relative_gap']:.2%}, "
+                               f"serving in fp32")
+                self.precision = "fp32"
+            self.precision_parity = parity
+            results["precision_parity"] = parity
+        results["precision"] = self.precision
+        return results
+    
+    def _forward(self, X: torch.Tensor) -> torch.Tensor:
+        """Model forward pass at the configured precision, returned as fp32"""
+        # bf16 keeps fp32's exponent range, so gradients need no loss scaling
+        with torch.autocast("cpu", dtype=torch.bfloat16, enabled=self.precision == "bf16"):
+            return self.model(X).float()
+    
+    def check_precision_parity(self, X: torch.Tensor, y: torch.Tensor) -> Dict:
+        """Compare bf16 and fp32 MAE of the current weights on the same data
+        
+        Passes when the MAE gap is within parity_tolerance of the fp32 MAE or
+        within parity_atol in absolute terms, whichever is looser, so a
+        near-zero fp32 MAE does not fail on rounding noise.
+        """
+        precision = self.precision
+        self.model.eval()
+        maes = {}
+        try:
+            with torch.no_grad():
+                for mode in ("fp32", "bf16"):
+                    self.precision = mode
+                    maes[mode] = nn.L1Loss()(self._forward(X), y).item()
+        finally:
+            self.precision = precision
+        gap = abs(maes["bf16"] - maes["fp32"])
+        relative_gap = gap / max(maes["fp32"], 1e-8)
+        return {
+            "fp32_mae": maes["fp32"],
+            "bf16_mae": maes["bf16"],
+            "relative_gap": relative_gap,
+            "passed": gap <= max(self.parity_tolerance * maes["fp32"], self.parity_atol)
+        }
+    
+    def fine_tune(self, data_path: str, epochs: int = 10, replay_ratio: float = 1.0,
+                  validation_split: float = 0.2, patience: int = 3) -> Dict:
+        """Warm-start training from the current weights on new plus replayed data
+        
+        The first Linear layer is remapped to the current feature columns and
+        compensated for the scaler update, so the loaded model starts from the
+        same predictions it made before. Training then runs for a few epochs
+        on the new rows and a replay sample of previously seen rows.
+        """
+        logger.info("Starting fine-tuning...")
+        
+        old_columns = list(self.data_handler.feature_columns)
+        old_mean = self.data_handler.scaler.mean_.copy()
+        old_scale = self.data_handler.scaler.scale_.copy()
+        
+        data = self.data_handler.prepare_incremental_data(data_path)
+        new_idx = np.flatnonzero(data["is_new"])
+        if len(new_idx) == 0:
+            logger.info("No new training data, skipping fine-tuning")
+            return {"status": "no_new_data", "new_rows": 0}
+        
+        self._remap_input_layer(old_columns, old_mean, old_scale)
+        
+        old_idx = np.flatnonzero(~data["is_new"])
+        n_replay = min(len(old_idx), int(len(new_idx) * replay_ratio))
+        replay_idx = np.random.choice(old_idx, n_replay, replace=False) if n_replay else old_idx[:0]
+        rows = torch.from_numpy(np.concatenate([new_idx, replay_idx]))
+        
+        X, y = data["X"][rows], data["y"][rows]
+        if len(rows) > 1:
+            X_train, X_val, y_train, y_val = self.data_handler.split_data(X, y, validation_split)
+        else:
+            X_train, X_val, y_train, y_val = X, X, y, y
+        
+        epochs_before = len(self.training_history)
+        best_val_loss = self._train_epochs(X_train, y_train, X_val, y_val, epochs, patience)
+        
+        logger.info(f"Fine-tuning completed! Best validation loss: {best_val_loss:.4f}")
+        
+        return {
+            "status": "success",
+            "new_rows": len(new_idx),
+            "replayed_rows": n_replay,
+            "columns_changed": data["columns_changed"],
+            "best_val_loss": best_val_loss,
+            "epochs_trained": len(self.training_history) - epochs_before
+        }
+    
+    def _remap_input_layer(self, old_columns: List[str], old_mean: np.ndarray,
+                           old_scale: np.ndarray):
+        """Rebuild the first Linear layer for the data handler's current columns
+        
+        Kept columns are rescaled so that W' z_new + b' equals W z_old + b for
+        the updated scaler, added columns start at zero weight and removed
+        columns are dropped.
+        """
+        first = self.model.network[0]
+        new_columns = self.data_handler.feature_columns
+        new_mean = self.data_handler.scaler.mean_
+        new_scale = self.data_handler.scaler.scale_
+        old_index = {col: i for i, col in enumerate(old_columns)}
+        
+        weight = torch.zeros(first.out_features, len(new_columns))
+        bias = first.bias.detach().clone()
+        with torch.no_grad():
+            for j, col in enumerate(new_columns):
+                if col not in old_index:
+                    continue
+                i = old_index[col]
+                column_weight = first.weight[:, i]
+                weight[:, j] = column_weight * float(new_scale[j] / old_scale[i])
+                bias += column_weight * float((new_mean[j] - old_mean[i]) / old_scale[i])
+        
+        layer = nn.Linear(len(new_columns), first.out_features)
+        layer.weight.data.copy_(weight)
+        layer.bias.data.copy_(bias)
+        self.model.network[0] = layer
+        
+        # Parameter shapes may have changed, so the optimizer starts fresh
+        learning_rate = self.optimizer.param_groups[0]['lr']
+        self.optimizer = optim.Adam(self.model.parameters(), lr=learning_rate)
+    
+    def _train_epochs(self, X_train: torch.Tensor, y_train: torch.Tensor,
+                      X_val: torch.Tensor, y_val: torch.Tensor,
+                      epochs: int, patience: int,
+                      checkpoint_path: Optional[str] = None, checkpoint_every: int = 1,
+                      resume_state: Optional[Dict] = None) -> float:
+        """Full-batch training loop with early stopping, returns the best validation loss
+        
+        The weights with the best validation loss are restored at the end,
+        whether training stopped early or ran all epochs.
+        """
+        criterion = nn.MSELoss()
+        best_val_loss = float('inf')
+        patience_counter = 0
+        start_epoch = 0
+        finished = False
+        self.best_model_state = None
+        
+        if resume_state is not None:
+            self.model.load_state_dict(resume_state["model_state_dict"])
+            self.optimizer.load_state_dict(resume_state["optimizer_state_dict"])
+            self.best_model_state = resume_state["best_model_state"]
+            best_val_loss = resume_state["best_val_loss"]
+            patience_counter = resume_state["patience_counter"]
+            self.training_history = resume_state["training_history"]
+            self.validation_history = resume_state["validation_history"]
+            restore_rng_state(resume_state["rng_state"])
+            start_epoch = resume_state["epoch"]
+            finished = resume_state["finished"]
+            logger.info(f"Resuming training at epoch {start_epoch}")
+        
+        writer = CheckpointWriter(checkpoint_path) if checkpoint_path else None
+        try:
+            for epoch in range(start_epoch, epochs):
+                if finished:
+                    break
+                
+                # Training phase
+                self.model.train()
+                self.optimizer.zero_grad()
+                
+                predictions = self._forward(X_train)
+                train_loss = criterion(predictions, y_train)
+                
+                train_loss.backward()
+                self.optimizer.step()
+                
+                # Validation phase
+                self.model.eval()
+                with torch.no_grad():
+                    val_predictions = self._forward(X_val)
+                    val_loss = criterion(val_predictions, y_val)
+                
+                # Record history
+                self.training_history.append(train_loss.item())
+                self.validation_history.append(val_loss.item())
+                
+                # Early stopping check
+                if val_loss.item() < best_val_loss:
+                    best_val_loss = val_loss.item()
+                    patience_counter = 0
+                    # Deep copy: state_dict() tensors alias the live parameters
+                    self.best_model_state = copy.deepcopy(self.model.state_dict())
+                else:
+                    patience_counter += 1
+                
+                # Logging
+                if epoch % 10 == 0:
+                    logger.info(f"Epoch {epoch}: Train Loss: {train_loss.item():.4f}, "
+                               f"Val Loss: {val_loss.item():.4f}")
+                
+                # Early stopping
+                if patience_counter >= patience:
+                    logger.info(f"Early stopping at epoch {epoch}")
+                    finished = True
+                
+                if writer is not None and (finished or (epoch + 1) % checkpoint_every == 0
+                                           or epoch + 1 == epochs):
+                    writer.save({
+                        "epoch": epoch + 1,
+                        "finished": finished,
+                        "model_state_dict": self.model.state_dict(),
+                        "optimizer_state_dict": self.optimizer.state_dict(),
+                        "best_model_state": self.best_model_state,
+                        "best_val_loss": best_val_loss,
+                        "patience_counter": patience_counter,
+                        "training_history": self.training_history,
+                        "validation_history": self.validation_history,
+                        "scaler": self.data_handler.scaler,
+                        "feature_columns": self.data_handler.feature_columns,
+                        "rng_state": capture_rng_state()
+                    })
+        finally:
+            if writer is not None:
+                writer.close()
+        
+        # Restore best model
+        if self.best_model_state is not None:
+            self.model.load_state_dict(self.best_model_state)
+        
+        return best_val_loss
     
     def predict_score(self, student_data: Dict) -> float:
-        """Predict score for a student given their previous grades"""
+        """Predict the primary (first) target for a student given their previous grades
+        
+        Multi-target models return their first target column here; use
+        predict_scores for the whole forecast.
+        """
         try:
             # Prepare student data
             features_tensor = self.data_handler.prepare_student_data(student_data)
@@ -95,20 +314,88 @@ class ReinforcementLearningTrainer:
             # Make prediction
             self.model.eval()
             with torch.no_grad():
-                prediction = self.model(features_tensor)
-            
-            return prediction.item()
+                prediction = self._forward(features_tensor)
+            score = prediction[0, 0].item()
             
         except Exception as e:
             logger.error(f"Error making prediction: {e}")
             return 0.0
+        
+        self._observe_drift(features_tensor)
+        return score
+    
+    def _observe_drift(self, features_tensor: torch.Tensor):
+        """Feed a served request to the drift monitor; monitoring never fails a prediction"""
+        if self.drift_monitor is None:
+            return
+        try:
+            self.drift_monitor.observe_scaled(features_tensor.numpy())
+        except Exception as e:
+            logger.error(f"Drift monitoring failed: {e}")
+    
+    def predict_scores(self, student_data: Dict) -> Dict[str, float]:
+        """Predict every target column for a student in one forward pass"""
+        features_tensor = self.data_handler.prepare_student_data(student_data)
+        
+        self.model.eval()
+        with torch.no_grad():
+            predictions = self._forward(features_tensor)[0]
+        
+        return dict(zip(getattr(self.data_handler, 'target_columns', []), predictions.tolist()))
+    
+    def explain(self, students: List[Dict], method: str = "integrated_gradients",
+                steps: int = 32, metadata_path: Optional[str] = None,
+                target_index: int = 0) -> Dict:
+        """Per-feature attributions for a batch of students in one backward pass
+        
+        Attributions are relative to the average training student, so for
+        integrated gradients each row sums to prediction - baseline_prediction.
+        With metadata_path, features are labelled with assessment titles from
+        assessment_metadata.json.
+        """
+        X = self.data_handler.prepare_batch_data(students)
+        
+        if method == "integrated_gradients":
+            attributions = integrated_gradients(self.model, X, steps=steps, target_index=target_index)
+        elif method == "gradient_x_input":
+            attributions = gradient_x_input(self.model, X, target_index=target_index)
+        else:
+            raise ValueError(f"Unknown attribution method: {method}")
+        
+        self.model.eval()
+        with torch.no_grad():
+            predictions = self.model(X)[:, target_index]
+            baseline_prediction = self.model(torch.zeros(1, X.shape[1]))[0, target_index]
+        
+        titles = load_assessment_titles(metadata_path) if metadata_path else {}
+        return {
+            "method": method,
+            "feature_columns": self.data_handler.feature_columns,
+            "feature_titles": [titles.get(col, col) for col in self.data_handler.feature_columns],
+            "baseline_prediction": baseline_prediction.item(),
+            "predictions": predictions.tolist(),
+            "attributions": attributions.tolist()
+        }
     
     def add_feedback(self, student_data: Dict, predicted_score: float, 
-                    actual_score: float, teacher_feedback: str) -> Dict:
-        """Add teacher feedback for reinforcement learning"""
-        return self.feedback_manager.add_feedback(
-            student_data, predicted_score, actual_score, teacher_feedback
+                    actual_score: float, teacher_feedback: str,
+                    target_column: Optional[str] = None) -> Dict:
+        """Add teacher feedback for reinforcement learning
+        
+        target_column names the assessment the score belongs to on
+        multi-target models; without it the feedback is for the primary target.
+        """
+        if target_column is not None and target_column not in self.data_handler.target_columns:
+            raise ValueError(f"Unknown target column: {target_column}")
+        result = self.feedback_manager.add_feedback(
+            student_data, predicted_score, actual_score, teacher_feedback, target_column
         )
+        if self.drift_monitor is not None:
+            try:
+                self.drift_monitor.observe_feedback(result["prediction_error"])
+            except Exception as e:
+                logger.error(f"Drift monitoring failed: {e}")
+        return result
     
     def reinforcement_update(self, batch_size: int = 32, update_threshold: int = 10) -> Dict:
         """Update model based on accumulated feedback using policy gradient"""
@@ -133,11 +420,14 @@ class ReinforcementLearningTrainer:
                 
                 # Forward pass
                 self.optimizer.zero_grad()
-                prediction = self.model(features_tensor)
+                prediction = self._forward(features_tensor)
                 
-                # Calculate loss with reward weighting
-                target = torch.FloatTensor([[feedback['actual_score']]])
-                base_loss = nn.MSELoss()(prediction, target)
+                # Only the output the feedback refers to is trained on it
+                target_column = feedback.get('target_column')
+                column = (self.data_handler.target_columns.index(target_column)
+                          if target_column is not None else 0)
+                target = torch.FloatTensor([feedback['actual_score']])
+                base_loss = nn.MSELoss()(prediction[:, column], target)
                 
                 # Weight loss by reward (higher reward = lower loss weight for punishment)
                 # Reward ranges from 0-2, so we invert it for loss weighting
@@ -196,7 +486,7 @@ class ReinforcementLearningTrainer:
         # Evaluate on test data
         self.model.eval()
         with torch.no_grad():
-            predictions = self.model(X_test)
+            predictions = self._forward(X_test)
             mse_loss = nn.MSELoss()(predictions, y_test)
             mae_loss = nn.L1Loss()(predictions, y_test)
         
@@ -214,4 +504,49 @@ class ReinforcementLearningTrainer:
             "feedback_stats": self.feedback_manager.get_feedback_statistics(),
             "model_info": self.model.get_model_info(),
             "data_info": self.data_handler.get_feature_info()
-        }
\ No newline at end of file
+        }
+
+
+if __name__ == "__main__":
+    import argparse, json
+    import pandas as pd
+    from model_manager import ModelManager
+    from feature_pipeline import FeaturePipeline
+
+    parser = argparse.ArgumentParser(description="Initial training with resumable checkpoints")
+    parser.add_argument("--data", required=True, help="Training CSV")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--patience", type=int, default=10)
+    parser.add_argument("--hidden-sizes", type=int, nargs="+", default=[64, 32, 16])
+    parser.add_argument("--checkpoint", default="checkpoints/initial_training.pt")
+    parser.add_argument("--checkpoint-every", type=int, default=1)
+    parser.add_argument("--resume", action="store_true", help="Continue from --checkpoint")
+    parser.add_argument("--model-name", default="student_predictor")
+    parser.add_argument("--precision", choices=["fp32", "bf16"], default="fp32")
+    parser.add_argument("--features", choices=["grades", "student_scores"], default="grades",
+                        help="grades: training_data.csv columns as they are; student_scores: "
+                             "FeaturePipeline over the students_scores_*.csv schema, saved with the model")
+    parser.add_argument("--targets", nargs="+", help="Target columns, one model output each")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.features == "student_scores":
+        if not args.targets:
+            parser.error("--features student_scores needs --targets, e.g. assessment_score_07")
+        # Every target is left out of the features, not only the first
+        columns = [col for col in pd.read_csv(args.data, nrows=0).columns if col not in args.targets[1:]]
+        data_handler = DataHandler(FeaturePipeline.for_student_scores(args.targets[0], columns))
+    else:
+        data_handler = DataHandler()
+    X, y = data_handler.load_and_prepare_data(args.data, args.targets)
+    trainer = ReinforcementLearningTrainer(StudentScorePredictor(X.shape[1], args.hidden_sizes, y.shape[1]),
+                                           precision=args.precision)
+    trainer.data_handler = data_handler
+    results = trainer.initial_training(args.data, args.epochs, patience=args.patience,
+                                       target_columns=args.targets,
+                                       checkpoint_path=args.checkpoint,
+                                       checkpoint_every=args.checkpoint_every,
+                                       resume=args.resume)
+    results["save"] = ModelManager().save_model(trainer, args.model_name)
+    print(json.dumps(results, indent=2))
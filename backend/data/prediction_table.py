@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_FILE = "predictions.db"
+
+def model_version(model_path: str) -> str:
+    """Content hash of a saved model; any retrain or feedback save gives a new version"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def grades_hash(grades: Dict) -> str:
+    """Order-independent hash of a student's grades, as sent in previous_grades"""
+    if isinstance(grades, dict):
+        # JSON from the browser writes 0.0 as 0; hash every number as a float
+        grades = {key: float(value) if isinstance(value, (int, float)) and not isinstance(value, bool)
+                  else value for key, value in grades.items()}
+    canonical = json.dumps(grades, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+def request_payloads(student_grades: Dict, assessments: List[Dict]) -> List[Dict]:
+    """The previous_grades the predict endpoint receives for a student, one per graded assessment
+
+    Mirrors frontend/src/components/AiCorner.js: the selected assessment's
+    stored grade under its column name, as rawScore / totalMarks * weightage / 100.
+    """
+    payloads = []
+    for assessment in assessments:
+        column = f"{assessment['type']}_{assessment['_id'][:5]}"
+        raw_score = student_grades.get(column)
+        if raw_score is None:
+            continue
+        norm_score = raw_score / float(assessment["totalMarks"])
+        payloads.append({column: norm_score * (float(assessment["weightage"]) / 100.0)})
+    return payloads
+
+class PredictionTable:
+    """Precomputed predictions keyed by (student_id, model_version, grades_hash)
+
+    A student has one entry per request payload the predict endpoint can
+    receive for them (see request_payloads). An entry is served only for the
+    same model version and the same payload hash, so a lookup never returns
+    a prediction for inputs that have changed since the last materialization.
+    """
+
+    def __init__(self, path: str = os.path.join(DATA_DIR, TABLE_FILE)):
+        self.path = path
+        self._init_table()
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits on success and rolls back on error"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_table(self):
+        with self._connect() as conn:
+            # WAL lets predictions keep reading while the nightly job writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            key_columns = [row[1] for row in conn.execute("PRAGMA table_info(predictions)") if row[5]]
+            if key_columns and "grades_hash" not in key_columns:
+                # Tables keyed by student only; the next materialize run refills it
+                conn.execute("DROP TABLE predictions")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "student_id TEXT NOT NULL, model_version TEXT NOT NULL, grades_hash TEXT NOT NULL, "
+                "predicted_score REAL NOT NULL, computed_at REAL NOT NULL, "
+                "PRIMARY KEY (student_id, model_version, grades_hash)) WITHOUT ROWID"
+            )
+
+    def lookup(self, student_id: str, version: str, grades: Dict) -> Optional[float]:
+        """The precomputed score if fresh for these grades, else None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT predicted_score FROM predictions "
+                "WHERE student_id = ? AND model_version = ? AND grades_hash = ?",
+                (student_id, version, grades_hash(grades))
+            ).fetchone()
+        return row[0] if row else None
+
+    def lookup_many(self, version: str, requests: List[tuple]) -> List[Optional[float]]:
+        """lookup() for (student_id, grades) pairs over one connection"""
+        with self._connect() as conn:
+            scores = []
+            for student_id, grades in requests:
+                row = conn.execute(
+                    "SELECT predicted_score FROM predictions "
+                    "WHERE student_id = ? AND model_version = ? AND grades_hash = ?",
+                    (student_id, version, grades_hash(grades))
+                ).fetchone()
+                scores.append(row[0] if row else None)
+        return scores
+
+    def hashes(self, version: str) -> Dict[str, Set[str]]:
+        """Stored payload hashes per student for one model version"""
+        stored = {}
+        with self._connect() as conn:
+            for student_id, h in conn.execute(
+                    "SELECT student_id, grades_hash FROM predictions WHERE model_version = ?", (version,)):
+                stored.setdefault(student_id, set()).add(h)
+        return stored
+
+    def upsert(self, version: str, rows: List[tuple]):
+        """Write (student_id, grades_hash, predicted_score) rows in one transaction"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions (student_id, model_version, grades_hash, "
+                "predicted_score, computed_at) VALUES (?, ?, ?, ?, ?)",
+                [(student_id, version, h, float(score), now) for student_id, h, score in rows]
+            )
+
+    def prune(self, keep_version: str, current: Optional[Dict[str, Set[str]]] = None) -> int:
+        """Drop entries of other model versions, and payloads no longer current for their student
+
+        current maps each enrolled student to their current payload hashes;
+        students missing from it are dropped entirely.
+        """
+        with self._connect() as conn:
+            deleted = conn.execute("DELETE FROM predictions WHERE model_version != ?",
+                                   (keep_version,)).rowcount
+            if current is not None:
+                stored = conn.execute("SELECT student_id, grades_hash FROM predictions").fetchall()
+                gone = [(sid, keep_version, h) for sid, h in stored if h not in current.get(sid, ())]
+                conn.executemany("DELETE FROM predictions WHERE student_id = ? AND model_version = ? "
+                                 "AND grades_hash = ?", gone)
+                deleted += len(gone)
+        return deleted
+
+    def get_table_info(self) -> Dict:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT model_version, COUNT(*), MAX(computed_at) FROM predictions GROUP BY model_version"
+            ).fetchall()
+        return {"path": self.path,
+                "versions": {version: {"students": count, "last_computed": last}
+                             for version, count, last in rows}}
+
+def check_hit(model_path: str, table_path: str, student_id: str, payload: Dict) -> bool:
+    """Whether a materialized payload is served from the table by predict_student_score"""
+    from model import StudentScorePredictorAPI
+
+    api = StudentScorePredictorAPI(model_path, table_path, load_on_demand=True)
+    # The endpoint gets previous_grades through JSON, as index.js passes it on
+    request = json.loads(json.dumps(payload))
+    return api.predict_student_score(student_id, request).get("source") == "precomputed"
+
+def materialize(model_path: str = os.path.join(DATA_DIR, "student_predictor.pkl"),
+                table_path: str = os.path.join(DATA_DIR, TABLE_FILE),
+                students_path: str = os.path.join(DATA_DIR, "students.json"),
+                grades_path: str = os.path.join(DATA_DIR, "assessmentGrades.json"),
+                assessments_path: str = os.path.join(DATA_DIR, "assessments.json"),
+                force: bool = False) -> Dict:
+    """Score every request payload that changed since the last run, in one batch
+
+    Payloads are built by request_payloads from each enrolled student's
+    stored grades, so entries hit for exactly what the predict endpoint
+    receives. With force, everything is recomputed. The run ends by checking
+    that one materialized payload is served through predict_student_score.
+    """
+    from model import StudentScorePredictorAPI
+
+    start = time.perf_counter()
+    with open(students_path) as f:
+        student_ids = [student["_id"] for student in json.load(f)]
+    with open(grades_path) as f:
+        all_grades = json.load(f)
+    with open(assessments_path) as f:
+        assessments = json.load(f)
+
+    version = model_version(model_path)
+    table = PredictionTable(table_path)
+    stored = {} if force else table.hashes(version)
+    current = {sid: {grades_hash(payload): payload
+                     for payload in request_payloads(all_grades.get(sid, {}), assessments)}
+               for sid in student_ids}
+    stale = [(sid, h, payload) for sid, payloads in current.items()
+             for h, payload in payloads.items() if h not in stored.get(sid, ())]
+
+    if stale:
+        api = StudentScorePredictorAPI(model_path)
+        if api.trainer is None:
+            return {"status": "error", "message": f"Could not load model from {model_path}"}
+        scores = api.trainer.predict_scores([payload for _, _, payload in stale])
+        table.upsert(version, [(sid, h, round(float(score), 4))
+                               for (sid, h, _), score in zip(stale, scores)])
+    pruned = table.prune(version, {sid: set(payloads) for sid, payloads in current.items()})
+
+    entries = sum(len(payloads) for payloads in current.values())
+    result = {
+        "status": "success",
+        "model_version": version,
+        "students": len(student_ids),
+        "entries": entries,
+        "recomputed": len(stale),
+        "reused": entries - len(stale),
+        "pruned": pruned
+    }
+    sample = next(((sid, payload) for sid, payloads in current.items() for payload in payloads.values()), None)
+    if sample is not None:
+        result["hit_check"] = "passed" if check_hit(model_path, table_path, *sample) else "failed"
+        if result["hit_check"] == "failed":
+            result["status"] = "error"
+            logger.error(f"Materialized prediction for {sample[0]} was not served from the table")
+    result["duration_s"] = round(time.perf_counter() - start, 3)
+    logger.info(f"Materialized predictions: {result}")
+    return result
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompute predictions for every enrolled student (run nightly)")
+    parser.add_argument("--model", default=os.path.join(DATA_DIR, "student_predictor.pkl"))
+    parser.add_argument("--table", default=os.path.join(DATA_DIR, TABLE_FILE))
+    parser.add_argument("--force", action="store_true", help="Recompute every student")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = materialize(args.model, args.table, force=args.force)
+    print(json.dumps(result, indent=2))
+    if result["status"] != "success":
+        raise SystemExit(1)
@@ -1,7 +1,10 @@
 import os
 import json
+import numpy as np
 import pandas as pd
 
+from grade_validation import validate_grades, write_quarantine
+
 # Utility to get absolute path to data files
 DATA_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -18,6 +21,14 @@ with open(data_path('assessments.json')) as f:
 with open(data_path('students.json')) as f:
     students = json.load(f)
 
+# Validate all grades in bulk; quarantined grades are left out of the training data
+validation = validate_grades(grades, assessments, student_ids=[s["_id"] for s in students])
+write_quarantine(validation, data_path('grades_quarantine.json'))
+grades = validation["clean"]
+print(f"Grade validation: {validation['summary']['clean_grades']} clean, "
+      f"{validation['summary']['quarantined_grades']} quarantined "
+      f"(see {data_path('grades_quarantine.json')})")
+
 # Create mapping
 assessment_map = {
     a["_id"]: {
@@ -104,6 +115,36 @@ output_path = data_path('training_data.csv')
 df.to_csv(output_path, index=False)
 print(f"\nTraining data saved to: {output_path}")
 
+# Save a sparse grade history alongside the dense CSV: per student, only the
+# assessments actually graded, in CSR form (offsets into index/score arrays)
+columns = [f"{assessment_map[a_id]['type']}_{a_id[:5]}" for a_id in all_assessment_ids]
+column_index = {a_id: i for i, a_id in enumerate(all_assessment_ids)}
+offsets = [0]
+assessment_indices = []
+scores = []
+for student in students:
+    for a_id, score in grades.get(student["_id"], {}).items():
+        if a_id not in column_index:
+            continue
+        total = assessment_map[a_id]["total"]
+        assessment_indices.append(column_index[a_id])
+        scores.append((score / total) if total else 0)
+    offsets.append(len(assessment_indices))
+
+histories_path = data_path('grade_histories.npz')
+np.savez_compressed(
+    histories_path,
+    offsets=np.array(offsets, dtype=np.int64),
+    assessment_indices=np.array(assessment_indices, dtype=np.int32),
+    scores=np.array(scores, dtype=np.float32),
+    student_ids=np.array([student["_id"] for student in students]),
+    columns=np.array(columns),
+    targets=df[['weighted_final_grade']].values.astype(np.float32),
+    target_names=np.array(['weighted_final_grade'])
+)
+density = len(scores) / max(len(students) * len(columns), 1)
+print(f"Sparse grade histories saved to: {histories_path} ({len(scores)} grades, {density:.1%} dense)")
+
 # Also save assessment metadata for the model to use
 assessment_metadata = {
     "assessment_weights": {
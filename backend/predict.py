@@ -1,10 +1,12 @@
 import os
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import RandomForestRegressor
 import joblib
 
+from flat_forest import FlatForest, predict_routed
+from student_index import StudentIndex
+
 # For RL, we will use a simple Q-learning-like update for demonstration
 # In production, consider using a proper RL library (e.g., stable-baselines3)
 
@@ -14,7 +16,8 @@ MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'student_ma
 class StudentScorePredictor:
     def __init__(self):
         self.model = None
-        self.label_encoder = None
+        self.flat_model = None
+        self.student_index = None
         self.feature_cols = None
         self.target_col = None
 
@@ -23,55 +26,109 @@ class StudentScorePredictor:
         return df
 
     def preprocess(self, df, target_col):
-        # Encode student_id
-        le = LabelEncoder()
-        df['student_id_enc'] = le.fit_transform(df['student_id'])
-        feature_cols = [col for col in df.columns if col not in ['student_id', target_col]]
+        # target_col may be a list of assessment columns to forecast together
+        # Encode student_id with the persistent index so existing slots never shift
+        if self.student_index is None:
+            self.student_index = self._load_student_index()
+        self.student_index.extend(df['student_id'])
+        df['student_id_enc'] = self.student_index.transform(df['student_id'])
+        target_cols = target_col if isinstance(target_col, list) else [target_col]
+        feature_cols = [col for col in df.columns if col not in ['student_id'] + target_cols]
         X = df[feature_cols]
         y = df[target_col]
-        self.label_encoder = le
         self.feature_cols = feature_cols
         self.target_col = target_col
         return X, y
 
     def train(self, target_col):
+        # A list of target columns trains one multi-output forest whose
+        # predict returns the whole forecast vector
         df = self.load_data()
         X, y = self.preprocess(df, target_col)
         model = RandomForestRegressor()
         model.fit(X, y)
         self.model = model
-        # Save model and encoder
-        joblib.dump({'model': model, 'label_encoder': self.label_encoder, 'feature_cols': self.feature_cols, 'target_col': self.target_col}, MODEL_PATH)
+        self.flat_model = FlatForest.from_sklearn(model)
+        self.student_index.mark_trained()
+        self._save()
         print(f"Model trained and saved to {MODEL_PATH}")
 
     def predict(self, student_id, features):
         # features: dict of previous grades, keys must match feature_cols
         if self.model is None:
-            data = joblib.load(MODEL_PATH)
-            self.model = data['model']
-            self.label_encoder = data['label_encoder']
-            self.feature_cols = data['feature_cols']
+            self._load()
         features = features.copy()
-        features['student_id_enc'] = self.label_encoder.transform([student_id])[0]
+        # Students enrolled after training fall back to the cold-start slot
+        features['student_id_enc'] = self.student_index.lookup(student_id)
         X_pred = np.array([features[col] for col in self.feature_cols]).reshape(1, -1)
-        return self.model.predict(X_pred)[0]
+        return self.flat_model.predict(X_pred)[0]
+
+    def predict_many(self, student_ids, features_list):
+        # Batch version of predict; large batches go to sklearn's compiled traversal
+        if self.model is None:
+            self._load()
+        X_pred = np.array([
+            [self.student_index.lookup(student_id) if col == 'student_id_enc' else features[col]
+             for col in self.feature_cols]
+            for student_id, features in zip(student_ids, features_list)
+        ]).reshape(len(features_list), -1)
+        return predict_routed(self.model, self.flat_model, X_pred)
+
+    def register_students(self, student_ids):
+        # Add newly enrolled students to the index without refitting the forest
+        if self.model is None:
+            self._load()
+        if self.student_index.extend(student_ids):
+            self._save()
 
     def reinforce(self, student_id, features, true_score, alpha=0.1):
         # Simple RL: after getting feedback, update the model with the new data point
         # features: dict of previous grades, keys must match feature_cols
         # true_score: actual score given by teacher
+        if self.model is None:
+            self._load()
         df = self.load_data()
-        features = features.copy()
-        features['student_id_enc'] = self.label_encoder.transform([student_id])[0]
-        new_row = {col: features[col] for col in self.feature_cols}
-        new_row[self.target_col] = true_score
-        df = df.append(new_row, ignore_index=True)
+        new_row = {col: features[col] for col in self.feature_cols if col != 'student_id_enc'}
+        new_row['student_id'] = student_id
+        if isinstance(self.target_col, list):
+            # true_score: one actual score per target column
+            new_row.update(zip(self.target_col, true_score))
+        else:
+            new_row[self.target_col] = true_score
+        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
         # Retrain model with new data
         X, y = self.preprocess(df, self.target_col)
         self.model.fit(X, y)
-        joblib.dump({'model': self.model, 'label_encoder': self.label_encoder, 'feature_cols': self.feature_cols, 'target_col': self.target_col}, MODEL_PATH)
+        self.flat_model = FlatForest.from_sklearn(self.model)
+        self.student_index.mark_trained()
+        self._save()
         print("Model updated with new feedback.")
 
+    def _save(self):
+        joblib.dump({'model': self.model, 'flat_model': self.flat_model, 'student_index': self.student_index, 'feature_cols': self.feature_cols, 'target_col': self.target_col}, MODEL_PATH)
+
+    def _load(self):
+        data = joblib.load(MODEL_PATH)
+        self.model = data['model']
+        self.feature_cols = data['feature_cols']
+        self.target_col = data.get('target_col')
+        # Older model files predate the flattened forest and the student index
+        self.flat_model = data.get('flat_model')
+        if self.flat_model is None:
+            self.flat_model = FlatForest.from_sklearn(self.model)
+        # An empty index is falsy (len 0), so test for absence explicitly
+        self.student_index = data.get('student_index')
+        if self.student_index is None:
+            self.student_index = StudentIndex.from_label_encoder(data['label_encoder'])
+
+    def _load_student_index(self):
+        if not os.path.exists(MODEL_PATH):
+            return StudentIndex()
+        data = joblib.load(MODEL_PATH)
+        if 'student_index' in data:
+            return data['student_index']
+        return StudentIndex.from_label_encoder(data['label_encoder'])
+
 if __name__ == "__main__":
     # Example usage
     predictor = StudentScorePredictor()
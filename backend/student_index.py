@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sorts below every real slot, so trees route unseen students down the
+# "lowest id" side of any student_id_enc split
+COLD_START_SLOT = -1
+
+class StudentIndex:
+    """Persistent student_id -> slot map stored with the model
+
+    Slots are append-only, so a student keeps the same encoding across
+    retrains. Students added after the last fit are known to the index but
+    served through the cold-start slot until the forest has seen them.
+    """
+
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        self.trained_size = 0
+
+    @classmethod
+    def from_label_encoder(cls, label_encoder) -> "StudentIndex":
+        """Build an index with the same encoding as a fitted LabelEncoder"""
+        index = cls()
+        index.extend(label_encoder.classes_)
+        index.mark_trained()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, student_id) -> bool:
+        return student_id in self.slots
+
+    def extend(self, student_ids: Iterable) -> int:
+        """Assign slots to unseen students without touching existing ones"""
+        added = 0
+        for student_id in pd.unique(pd.Series(list(student_ids), dtype=object)):
+            if student_id not in self.slots:
+                self.slots[student_id] = len(self.slots)
+                added += 1
+        if added:
+            logger.info(f"Added {added} students to index ({len(self.slots)} total)")
+        return added
+
+    def mark_trained(self):
+        """Record that the model has been fit on every slot assigned so far"""
+        self.trained_size = len(self.slots)
+
+    def lookup(self, student_id) -> int:
+        """Slot to use at prediction time, falling back to the cold-start slot"""
+        slot = self.slots.get(student_id, COLD_START_SLOT)
+        return slot if slot < self.trained_size else COLD_START_SLOT
+
+    def transform(self, student_ids) -> np.ndarray:
+        """Vectorized slot lookup for training frames; unknown ids get the cold-start slot"""
+        return (pd.Series(student_ids, dtype=object).map(self.slots)
+                .fillna(COLD_START_SLOT).astype(np.int64).values)